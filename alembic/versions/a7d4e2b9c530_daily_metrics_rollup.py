@@ -0,0 +1,65 @@
+"""daily_metrics rollup for the dashboard
+
+Revision ID: a7d4e2b9c530
+Revises: f3a9d6c20b14
+Create Date: 2026-10-18 18:40:00.000000+00:00
+
+"""
+import os
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d4e2b9c530'
+down_revision: Union[str, None] = 'f3a9d6c20b14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# el día del rollup es el día local del negocio. Igual que Settings.TIMEZONE, pero sin
+# importar la app (la migración no depende de ella). Si TIMEZONE solo está en .env y
+# difiere del default: python -m app.tools.rebuild_daily_metrics después de migrar.
+TZ = os.environ.get("TIMEZONE", "America/Santo_Domingo")
+
+
+def upgrade() -> None:
+    op.create_table(
+        "daily_metrics",
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("method", sa.String(length=20), nullable=False, server_default=""),
+        sa.Column("status", sa.String(length=20), nullable=False, server_default=""),
+        sa.Column("service_id", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("employee_user_id", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("revenue", sa.Numeric(14, 2), nullable=False, server_default="0"),
+        sa.Column("tickets", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("appointments", sa.Integer(), nullable=False, server_default="0"),
+        sa.PrimaryKeyConstraint("day", "method", "status", "service_id", "employee_user_id"),
+    )
+
+    # backfill (lo mismo que app.tools.rebuild_daily_metrics)
+    op.execute(
+        f"""
+        INSERT INTO daily_metrics (day, method, status, service_id, employee_user_id, revenue, tickets, appointments)
+        SELECT timezone('{TZ}', c.created_at)::date, c.method::text, '',
+               COALESCE(a.service_id, 0), COALESCE(a.employee_user_id, 0),
+               SUM(c.amount), COUNT(c.id), 0
+        FROM cash_entries c
+        LEFT JOIN appointments a ON a.id = c.appointment_id
+        GROUP BY 1, 2, 4, 5
+        """
+    )
+    op.execute(
+        f"""
+        INSERT INTO daily_metrics (day, method, status, service_id, employee_user_id, revenue, tickets, appointments)
+        SELECT timezone('{TZ}', start_at)::date, '', status::text, service_id, employee_user_id,
+               0, 0, COUNT(id)
+        FROM appointments
+        GROUP BY 1, 3, 4, 5
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("daily_metrics")
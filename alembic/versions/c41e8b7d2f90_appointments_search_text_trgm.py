@@ -0,0 +1,63 @@
+"""appointments search_text + pg_trgm index
+
+Revision ID: c41e8b7d2f90
+Revises: 98a753db4da8
+Create Date: 2026-10-18 15:20:00.000000+00:00
+
+"""
+import unicodedata
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41e8b7d2f90'
+down_revision: Union[str, None] = '98a753db4da8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _normalize(text: str) -> str:
+    # misma regla que app.core.search.normalize_search (copiada: la migración no depende de la app)
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join(stripped.lower().split())
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.add_column('appointments', sa.Column('search_text', sa.Text(), nullable=False, server_default=''))
+
+    # backfill (se normaliza en Python para que coincida con lo que escribe la app)
+    conn = op.get_bind()
+    rows = conn.execute(sa.text(
+        """
+        SELECT a.id, s.name, c.first_name, c.last_name, e.first_name, e.last_name
+        FROM appointments a
+        JOIN services s ON s.id = a.service_id
+        JOIN users c ON c.id = a.customer_user_id
+        JOIN users e ON e.id = a.employee_user_id
+        """
+    )).all()
+    if rows:
+        conn.execute(
+            sa.text("UPDATE appointments SET search_text = :text WHERE id = :id"),
+            [{"id": r[0], "text": _normalize(" ".join(p or "" for p in r[1:]))} for r in rows],
+        )
+
+    op.create_index(
+        'ix_appointments_search_text_trgm',
+        'appointments',
+        ['search_text'],
+        unique=False,
+        postgresql_using='gin',
+        postgresql_ops={'search_text': 'gin_trgm_ops'},
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_appointments_search_text_trgm', table_name='appointments')
+    op.drop_column('appointments', 'search_text')
+    # pg_trgm se deja instalada (otras tablas podrían usarla)
@@ -0,0 +1,54 @@
+"""appointments composite / partial indexes for hot queries
+
+Revision ID: d5a2f7c81e36
+Revises: c41e8b7d2f90
+Create Date: 2026-10-18 16:05:00.000000+00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5a2f7c81e36'
+down_revision: Union[str, None] = 'c41e8b7d2f90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ACTIVE_WHERE = "status IN ('REQUESTED', 'VALIDATED', 'CONFIRMED')"
+
+
+def upgrade() -> None:
+    # CONCURRENTLY: no bloquea escrituras en appointments (requiere ir fuera de la transacción)
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_appt_employee_active_time',
+            'appointments',
+            ['employee_user_id', 'start_at', 'end_at'],
+            unique=False,
+            postgresql_where=sa.text(ACTIVE_WHERE),
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_appt_customer_start',
+            'appointments',
+            ['customer_user_id', 'start_at'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_appt_status_start',
+            'appointments',
+            ['status', 'start_at'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_appt_status_start', table_name='appointments', postgresql_concurrently=True)
+        op.drop_index('ix_appt_customer_start', table_name='appointments', postgresql_concurrently=True)
+        op.drop_index('ix_appt_employee_active_time', table_name='appointments', postgresql_concurrently=True)
@@ -0,0 +1,60 @@
+"""appointments: exclusion constraint against double booking
+
+Revision ID: e8c3b1f4a627
+Revises: d5a2f7c81e36
+Create Date: 2026-10-18 17:10:00.000000+00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8c3b1f4a627'
+down_revision: Union[str, None] = 'd5a2f7c81e36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ACTIVE_WHERE = "status IN ('REQUESTED', 'VALIDATED', 'CONFIRMED')"
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+
+    # si ya hay dobles bookings la constraint no se puede crear: avisar cuáles son
+    conn = op.get_bind()
+    clashes = conn.execute(sa.text(
+        """
+        SELECT a.id, b.id
+        FROM appointments a
+        JOIN appointments b
+          ON a.employee_user_id = b.employee_user_id
+         AND a.id < b.id
+         AND tstzrange(a.start_at, a.end_at, '[)') && tstzrange(b.start_at, b.end_at, '[)')
+        WHERE a.status IN ('REQUESTED', 'VALIDATED', 'CONFIRMED')
+          AND b.status IN ('REQUESTED', 'VALIDATED', 'CONFIRMED')
+        LIMIT 20
+        """
+    )).all()
+    if clashes:
+        pairs = ", ".join(f"{a}/{b}" for a, b in clashes)
+        raise RuntimeError(f"Citas activas solapadas (cancelar o mover antes de migrar): {pairs}")
+
+    op.execute(
+        f"""
+        ALTER TABLE appointments
+        ADD CONSTRAINT ex_appt_employee_no_overlap
+        EXCLUDE USING gist (
+            employee_user_id WITH =,
+            tstzrange(start_at, end_at, '[)') WITH &&
+        )
+        WHERE ({ACTIVE_WHERE})
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint('ex_appt_employee_no_overlap', 'appointments', type_='exclude')
+    # btree_gist se deja instalada
@@ -0,0 +1,53 @@
+"""appointment_series table and appointments.series_id
+
+Revision ID: f3a9d6c20b14
+Revises: e8c3b1f4a627
+Create Date: 2026-10-18 18:05:00.000000+00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a9d6c20b14'
+down_revision: Union[str, None] = 'e8c3b1f4a627'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "appointment_series",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("customer_user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("employee_user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("service_id", sa.Integer(), sa.ForeignKey("services.id"), nullable=False),
+        sa.Column("rrule", sa.String(length=200), nullable=False),
+        sa.Column("dtstart", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("occurrences_requested", sa.Integer(), nullable=False),
+        sa.Column("occurrences_booked", sa.Integer(), nullable=False),
+        sa.Column("notes", sa.Text(), nullable=True),
+        sa.Column("created_by_user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+    )
+    op.create_index("ix_appointment_series_customer_user_id", "appointment_series", ["customer_user_id"])
+    op.create_index("ix_appointment_series_employee_user_id", "appointment_series", ["employee_user_id"])
+
+    op.add_column("appointments", sa.Column("series_id", sa.Integer(), nullable=True))
+    op.create_foreign_key(
+        "appointments_series_id_fkey", "appointments", "appointment_series", ["series_id"], ["id"]
+    )
+    op.create_index("ix_appointments_series_id", "appointments", ["series_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_appointments_series_id", table_name="appointments")
+    op.drop_constraint("appointments_series_id_fkey", "appointments", type_="foreignkey")
+    op.drop_column("appointments", "series_id")
+
+    op.drop_index("ix_appointment_series_employee_user_id", table_name="appointment_series")
+    op.drop_index("ix_appointment_series_customer_user_id", table_name="appointment_series")
+    op.drop_table("appointment_series")
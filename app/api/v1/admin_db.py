@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Depends
+
+from app.core.db import engine, async_engine, read_engine
+from app.core.db_metrics import pool_metrics, async_pool_metrics
+from app.core.deps import require_roles
+
+router = APIRouter(prefix="/admin/db", tags=["admin-db"])
+
+@router.get("/pool", dependencies=[Depends(require_roles("ADMIN"))])
+def pool_stats():
+    """
+    Estado del pool de este worker: conexiones en uso / libres / overflow
+    y tiempos de espera de checkout (para dimensionar DB_POOL_SIZE).
+    """
+    out = {
+        "sync": pool_metrics.snapshot(engine.pool),
+        "async": async_pool_metrics.snapshot(async_engine.pool),
+    }
+    if read_engine is not engine:
+        # las métricas de espera se acumulan junto con el primario; aquí solo el estado del pool
+        out["read_pool"] = read_engine.pool.status()
+    return out
+
+@router.post("/pool/reset", dependencies=[Depends(require_roles("ADMIN"))])
+def pool_stats_reset():
+    pool_metrics.reset()
+    async_pool_metrics.reset()
+    return {"ok": True}
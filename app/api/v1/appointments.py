@@ -1,22 +1,32 @@
 
-from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks
-from app.core.deps import get_current_user, require_roles
-from app.core.pagination import paginate
+from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks, Response
+from app.core.deps import get_current_user, get_current_user_async, require_roles
+from app.core.pagination import paginate_page, apaginate_page, keyset_paginate, TotalMode
 from app.crud.scheduling_rules import assert_slot_is_valid
 from app.models import PaymentMethod, CashEntry
 from app.schemas.appointment import AppointmentCreate, AppointmentOut, AppointmentReschedule
-from app.crud.appointments import create_appointment
-from app.core.public_cache import public_cache
+from app.crud.appointments import (
+    create_appointment,
+    create_appointment_series,
+    create_appointments_bulk,
+    commit_booking,
+    db_enforces_no_overlap,
+)
+from app.crud.availability_index import availability_index
+from app.core.search import normalize_search
 from app.schemas.appointment_done import AppointmentDoneOut
+from app.schemas.appointment_bulk import AppointmentBulkCreate, AppointmentBulkOut
+from app.schemas.appointment_series import AppointmentSeriesCreate, AppointmentSeriesOut
 from app.schemas.appointment_stats import (
     AppointmentStatsOut, StatusCountOut, ServiceRevenueOut
 )
 from datetime import date, datetime, time, timedelta
 from zoneinfo import ZoneInfo
-from sqlalchemy import select, func, or_
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, aliased
 from app.core.config import settings
-from app.core.db import get_db
+from app.core.db import get_db, get_async_db, mark_read_your_writes
 from app.schemas.pagination import Page
 from app.schemas.appointment_list import AppointmentListItemOut
 from app.models.appointment import Appointment, AppointmentStatus
@@ -27,7 +37,12 @@ from app.integrations.whatsapp import whatsapp
 router = APIRouter(prefix="/appointments")
 
 @router.post("", response_model=AppointmentOut, dependencies=[Depends(require_roles("CUSTOMER"))])
-def request_appointment(payload: AppointmentCreate, db: Session = Depends(get_db), user=Depends(get_current_user)):
+def request_appointment(
+    payload: AppointmentCreate,
+    response: Response,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+):
     try:
         appt = create_appointment(
             db=db,
@@ -39,12 +54,93 @@ def request_appointment(payload: AppointmentCreate, db: Session = Depends(get_db
             step_minutes=payload.step_minutes or 15,
         )
 
-        public_cache.delete_prefix("pub:avail:")
+        availability_index.apply(appt)
+        mark_read_your_writes(response)
 
         return appt
     except ValueError as e:
         raise HTTPException(400, str(e))
 
+@router.post("/bulk", response_model=AppointmentBulkOut, dependencies=[Depends(require_roles("RECEPTIONIST", "ADMIN"))])
+def request_appointments_bulk(payload: AppointmentBulkCreate, response: Response, db: Session = Depends(get_db)):
+    """
+    Importación / paquetes: valida todo el lote en memoria e inserta las filas válidas
+    en una sola transacción. Devuelve el resultado por fila (mismo orden que `items`).
+    """
+    try:
+        results, created = create_appointments_bulk(
+            db,
+            [it.model_dump() for it in payload.items],
+            step_minutes=payload.step_minutes,
+            all_or_nothing=payload.all_or_nothing,
+        )
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+    for appt in created:
+        availability_index.apply(appt)
+    if created:
+        mark_read_your_writes(response)
+
+    return AppointmentBulkOut(
+        created=len(created),
+        failed=sum(1 for r in results if not r["ok"]),
+        results=results,
+    )
+
+@router.post(
+    "/series",
+    response_model=AppointmentSeriesOut,
+    dependencies=[Depends(require_roles("CUSTOMER", "RECEPTIONIST", "ADMIN"))],
+)
+def request_appointment_series(
+    payload: AppointmentSeriesCreate,
+    response: Response,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    """
+    Cita recurrente ("todos los martes a las 10 por 12 semanas").
+    Todas las ocurrencias se validan juntas; devuelve cuáles se reservaron (o se pueden
+    reservar, con dry_run) y por qué no las demás.
+    """
+    if user.role == Role.CUSTOMER:
+        customer_user_id = user.id
+    elif payload.customer_user_id is None:
+        raise HTTPException(400, "customer_user_id is required")
+    else:
+        customer_user_id = payload.customer_user_id
+
+    try:
+        series, results, created = create_appointment_series(
+            db,
+            customer_user_id=customer_user_id,
+            service_id=payload.service_id,
+            employee_user_id=payload.employee_user_id,
+            rrule=payload.rrule,
+            dtstart=payload.start_at,
+            notes=payload.notes,
+            created_by_user_id=user.id,
+            step_minutes=payload.step_minutes,
+            skip_conflicts=payload.skip_conflicts,
+            dry_run=payload.dry_run,
+        )
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+    for appt in created:
+        availability_index.apply(appt)
+    if created:
+        mark_read_your_writes(response)
+
+    return AppointmentSeriesOut(
+        series_id=series.id if series else None,
+        rrule=series.rrule if series else payload.rrule,
+        requested=len(results),
+        created=len(created),
+        occurrences=results,
+    )
+
 @router.post("/{appointment_id}/validate", response_model=AppointmentOut, dependencies=[Depends(require_roles("RECEPTIONIST","ADMIN"))])
 def validate_appointment(appointment_id: int, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     appt = db.get(Appointment, appointment_id)
@@ -57,7 +153,7 @@ def validate_appointment(appointment_id: int, background_tasks: BackgroundTasks,
     db.commit()
     db.refresh(appt)
 
-    public_cache.delete_prefix("pub:avail:")
+    availability_index.apply(appt)
 
     customer = db.get(User, appt.customer_user_id)
     employee = db.get(User, appt.employee_user_id)
@@ -126,7 +222,7 @@ def confirm_appointment(
     db.commit()
     db.refresh(appt)
 
-    public_cache.delete_prefix("pub:avail:")
+    availability_index.apply(appt)
 
     return appt
 
@@ -135,6 +231,8 @@ def confirm_appointment(
 def list_appointments(
     page: int = Query(1, ge=1),
     size: int = Query(20, ge=1, le=100),
+    total_mode: TotalMode = Query("exact", alias="total", description="exact | estimate (planner) | none"),
+    cursor: str | None = Query(default=None, description="Paginación por cursor: \"\" para la primera página, luego next_cursor (ignora page)"),
 
     day: date | None = Query(default=None, description="YYYY-MM-DD (zona America/Santo_Domingo)"),
     status: AppointmentStatus | None = None,
@@ -174,15 +272,19 @@ def list_appointments(
         end_day = datetime.combine(day, time(23, 59, 59), tzinfo=tz)
         stmt = stmt.where(Appointment.start_at >= start_day).where(Appointment.start_at <= end_day)
 
+    if cursor is not None:
+        items, next_cursor = keyset_paginate(db, stmt, [Appointment.start_at, Appointment.id], cursor, size)
+        return Page[AppointmentOut](items=items, size=size, has_next=next_cursor is not None, next_cursor=next_cursor)
+
     stmt = stmt.order_by(Appointment.start_at.asc())
 
-    items, total = paginate(db, stmt, page, size)
-    return Page[AppointmentOut](items=items, page=page, size=size, total=total)
+    return Page[AppointmentOut](**paginate_page(db, stmt, page, size, total_mode))
 
 @router.get("/list", response_model=Page[AppointmentListItemOut])
-def list_appointments_view(
+async def list_appointments_view(
     page: int = Query(1, ge=1),
     size: int = Query(20, ge=1, le=100),
+    total_mode: TotalMode = Query("exact", alias="total", description="exact | estimate (planner) | none"),
 
     # filtros de fecha
     day: date | None = Query(default=None, description="YYYY-MM-DD (si lo usas, ignora from/to)"),
@@ -197,8 +299,8 @@ def list_appointments_view(
     # búsqueda
     q: str | None = Query(default=None, min_length=1, max_length=80),
 
-    db: Session = Depends(get_db),
-    user = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    user = Depends(get_current_user_async),
 ):
     tz = ZoneInfo(settings.TIMEZONE)
 
@@ -263,39 +365,23 @@ def list_appointments_view(
         if from_date and to_date and from_date > to_date:
             raise HTTPException(400, "`from` cannot be after `to`")
 
-    # Search q (cliente/empleado/servicio)
+    # Search q (cliente/empleado/servicio) sobre search_text (índice trigram, sin acentos)
+    # cada palabra tiene que aparecer: "ana nunez" encuentra "Ana Núñez"
     if q:
-        term = f"%{q.strip()}%"
-        base = base.where(
-            or_(
-                Service.name.ilike(term),
-
-                Customer.first_name.ilike(term),
-                Customer.last_name.ilike(term),
-
-                Employee.first_name.ilike(term),
-                Employee.last_name.ilike(term),
-            )
-        )
+        for word in normalize_search(q).split():
+            base = base.where(Appointment.search_text.contains(word, autoescape=True))
 
     base = base.order_by(Appointment.start_at.asc())
 
-    # Count total
-    count_stmt = select(func.count()).select_from(base.subquery())
-    total = db.execute(count_stmt).scalar_one()
-
-    # Page
-    rows = db.execute(
-        base.offset((page - 1) * size).limit(size)
-    ).mappings().all()
-
-    items = [AppointmentListItemOut(**r) for r in rows]
-    return {"items": items, "page": page, "size": size, "total": total}
+    out = await apaginate_page(db, base, page, size, total_mode, mappings=True)
+    out["items"] = [AppointmentListItemOut(**r) for r in out["items"]]
+    return out
 
 
 @router.post("/{appointment_id}/cancel", response_model=AppointmentOut, dependencies=[Depends(require_roles("CUSTOMER", "RECEPTIONIST", "ADMIN"))])
 def cancel_appointment(
     appointment_id: int,
+    response: Response,
     db: Session = Depends(get_db),
     user = Depends(get_current_user),
 ):
@@ -326,7 +412,8 @@ def cancel_appointment(
     db.commit()
     db.refresh(appt)
 
-    public_cache.delete_prefix("pub:avail:")
+    availability_index.apply(appt)
+    mark_read_your_writes(response)
 
     return appt
 
@@ -354,7 +441,7 @@ def mark_no_show(
     db.commit()
     db.refresh(appt)
 
-    public_cache.delete_prefix("pub:avail:")
+    availability_index.apply(appt)
     return appt
 
 @router.post(
@@ -393,7 +480,7 @@ def mark_done_hybrid(
         "concept": f"Pago servicio: {svc.name}",
     }
 
-    public_cache.delete_prefix("pub:avail:")
+    availability_index.apply(appt)
 
     return {"appointment": appt, "payment_suggestion": suggestion}
 
@@ -518,6 +605,7 @@ def my_appointments(
 def reschedule_appointment(
     appointment_id: int,
     payload: AppointmentReschedule,
+    response: Response,
     db: Session = Depends(get_db),
     user=Depends(get_current_user),
 ):
@@ -534,28 +622,34 @@ def reschedule_appointment(
     if not service:
         raise HTTPException(400, "Service not found")
 
+    old_start = appt.start_at
     new_start = payload.start_at
     new_end = new_start + timedelta(minutes=service.duration_minutes)
 
     # Validación completa (horario + breaks + step + overlap)
-    assert_slot_is_valid(
-        db=db,
-        employee_user_id=appt.employee_user_id,
-        start_at=new_start,
-        end_at=new_end,
-        step_minutes=payload.step_minutes or 15,
-        ignore_appointment_id=appt.id,  # importante para no chocar con sí misma
-    )
+    try:
+        assert_slot_is_valid(
+            db=db,
+            employee_user_id=appt.employee_user_id,
+            start_at=new_start,
+            end_at=new_end,
+            step_minutes=payload.step_minutes or 15,
+            ignore_appointment_id=appt.id,  # importante para no chocar con sí misma
+            check_overlap=not db_enforces_no_overlap(db),
+        )
 
-    appt.start_at = new_start
-    appt.end_at = new_end
+        appt.start_at = new_start
+        appt.end_at = new_end
 
-    # opcional: si ya estaba VALIDATED/CONFIRMED, lo devuelves a REQUESTED
-    # appt.status = AppointmentStatus.REQUESTED
+        # opcional: si ya estaba VALIDATED/CONFIRMED, lo devuelves a REQUESTED
+        # appt.status = AppointmentStatus.REQUESTED
 
-    db.commit()
+        commit_booking(db)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
     db.refresh(appt)
 
-    public_cache.delete_prefix("pub:avail:")
+    availability_index.apply(appt, old_start)
+    mark_read_your_writes(response)
 
     return appt
\ No newline at end of file
@@ -1,14 +1,21 @@
-from datetime import datetime, time, date
+import json
+from datetime import datetime, time, date, timedelta
+from typing import Iterator
 from zoneinfo import ZoneInfo
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import select, func
-from app.core.db import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import select, func, cast, Date
+from app.core.db import get_db, SessionLocal, ReadSessionLocal, wants_primary
+from app.core.export import export_response, full_name
+from app.core.streaming import iter_rows
 from app.core.deps import get_current_user, require_roles
 from app.core.config import settings
-from app.core.pagination import paginate
-from app.models.cash import CashEntry
+from app.core.pagination import paginate_page, keyset_paginate, TotalMode
+from app.models.cash import CashEntry, PaymentMethod
 from app.models.appointment import Appointment, AppointmentStatus
+from app.models.service import Service
+from app.models.user import User
 from app.schemas.cash import CashEntryCreate, CashEntryOut, CashStatsOut
 from app.schemas.pagination import Page
 
@@ -45,6 +52,8 @@ def create_cash_entry(
 def list_cash_entries(
     page: int = Query(1, ge=1),
     size: int = Query(20, ge=1, le=100),
+    total_mode: TotalMode = Query("exact", alias="total", description="exact | estimate (planner) | none"),
+    cursor: str | None = Query(default=None, description="Paginación por cursor: \"\" para la primera página, luego next_cursor (ignora page)"),
     date_from: datetime | None = Query(default=None, description="ISO datetime"),
     date_to: datetime | None = Query(default=None, description="ISO datetime"),
     db: Session = Depends(get_db),
@@ -55,26 +64,197 @@ def list_cash_entries(
     if date_to:
         query = query.where(CashEntry.created_at <= date_to)
 
-    items, total = paginate(db, query, page, size)
-    return {"items": items, "page": page, "size": size, "total": total}
+    if cursor is not None:
+        items, next_cursor = keyset_paginate(
+            db, query, [CashEntry.created_at, CashEntry.id], cursor, size, descending=True
+        )
+        return {"items": items, "size": size, "has_next": next_cursor is not None, "next_cursor": next_cursor}
+
+    return paginate_page(db, query, page, size, total_mode)
+
+def _cash_range(stmt, date_from: datetime | None, date_to: datetime | None):
+    if date_from:
+        stmt = stmt.where(CashEntry.created_at >= date_from)
+    if date_to:
+        stmt = stmt.where(CashEntry.created_at <= date_to)
+    return stmt
 
 @router.get("/summary")
 def cash_summary(
     date_from: datetime | None = Query(default=None),
     date_to: datetime | None = Query(default=None),
+    breakdown: str | None = Query(default=None, pattern="^(method|day|method_day)$"),
     db: Session = Depends(get_db),
     _=Depends(require_roles("ADMIN","RECEPTIONIST")),
 ):
-    # resumen simple (sin group-by para mantenerlo corto)
-    query = select(CashEntry)
-    if date_from:
-        query = query.where(CashEntry.created_at >= date_from)
-    if date_to:
-        query = query.where(CashEntry.created_at <= date_to)
+    """
+    Total y cantidad calculados en SQL.
+    `breakdown`: además, el detalle por método, por día local o por método y día
+    (los totales salen de sumar los grupos: sigue siendo una sola query).
+    """
+    count = func.count(CashEntry.id).label("count")
+    total = func.coalesce(func.sum(CashEntry.amount), 0).label("total")
+
+    if breakdown is None:
+        row = db.execute(_cash_range(select(count, total), date_from, date_to)).one()
+        return {"currency": settings.CURRENCY, "count": int(row.count), "total": float(row.total)}
+
+    keys = []
+    if breakdown in ("method", "method_day"):
+        keys.append(CashEntry.method.label("method"))
+    if breakdown in ("day", "method_day"):
+        keys.append(cast(func.timezone(settings.TIMEZONE, CashEntry.created_at), Date).label("day"))
+
+    rows = db.execute(
+        _cash_range(select(*keys, count, total), date_from, date_to)
+        .group_by(*keys)
+        .order_by(*keys)
+    ).all()
+
+    items = []
+    for r in rows:
+        item = {"count": int(r.count), "total": float(r.total)}
+        if "method" in r._fields:
+            item["method"] = r.method.value
+        if "day" in r._fields:
+            item["day"] = r.day.isoformat()
+        items.append(item)
+
+    return {
+        "currency": settings.CURRENCY,
+        "count": sum(i["count"] for i in items),
+        "total": float(sum(r.total for r in rows)),
+        "breakdown": breakdown,
+        "items": items,
+    }
+
+def _ndjson_lines(batches) -> Iterator[bytes]:
+    for batch in batches:
+        yield b"".join(
+            json.dumps({
+                "id": r.id,
+                "created_at": r.created_at.isoformat(),
+                "method": r.method.value,
+                "amount": float(r.amount),
+                "concept": r.concept,
+                "appointment_id": r.appointment_id,
+                "created_by_user_id": r.created_by_user_id,
+            }, ensure_ascii=False).encode() + b"\n"
+            for r in batch
+        )
+
+@router.get("/stream", dependencies=[Depends(require_roles("ADMIN","RECEPTIONIST"))])
+def cash_stream(
+    request: Request,
+    date_from: datetime | None = Query(default=None),
+    date_to: datetime | None = Query(default=None),
+):
+    """
+    Movimientos fila por fila como NDJSON (una línea JSON por movimiento), en orden
+    cronológico. Cursor del lado del servidor: memoria constante sin importar el rango.
+    """
+    stmt = _cash_range(
+        select(
+            CashEntry.id,
+            CashEntry.created_at,
+            CashEntry.method,
+            CashEntry.amount,
+            CashEntry.concept,
+            CashEntry.appointment_id,
+            CashEntry.created_by_user_id,
+        ),
+        date_from,
+        date_to,
+    ).order_by(CashEntry.created_at, CashEntry.id)
+
+    factory = SessionLocal if wants_primary(request) else ReadSessionLocal
+    return StreamingResponse(_ndjson_lines(iter_rows(stmt, session_factory=factory)), media_type="application/x-ndjson")
+
+def _local_range(from_day: date | None, to_day: date | None) -> tuple[datetime | None, datetime | None]:
+    """Días locales [from_day, to_day] -> [start, end) con TZ del negocio."""
+    tz = ZoneInfo(settings.TIMEZONE)
+    start = datetime.combine(from_day, time.min, tzinfo=tz) if from_day else None
+    end = datetime.combine(to_day + timedelta(days=1), time.min, tzinfo=tz) if to_day else None
+    return start, end
 
-    rows = db.execute(query).scalars().all()
-    total = float(sum(r.amount for r in rows))
-    return {"currency": settings.CURRENCY, "count": len(rows), "total": total}
+CASH_EXPORT_HEADER = (
+    "id", "fecha", "metodo", "monto", "concepto", "cita_id", "servicio", "cliente", "empleada", "registrado_por",
+)
+
+def cash_export_stmt(start: datetime | None, end: datetime | None):
+    Customer = aliased(User)
+    Employee = aliased(User)
+    Cashier = aliased(User)
+    stmt = (
+        select(
+            CashEntry.id,
+            CashEntry.created_at,
+            CashEntry.method,
+            CashEntry.amount,
+            CashEntry.concept,
+            CashEntry.appointment_id,
+            Service.name.label("service_name"),
+            Customer.first_name.label("customer_first"),
+            Customer.last_name.label("customer_last"),
+            Employee.first_name.label("employee_first"),
+            Employee.last_name.label("employee_last"),
+            Cashier.first_name.label("cashier_first"),
+            Cashier.last_name.label("cashier_last"),
+        )
+        .select_from(CashEntry)
+        .join(Appointment, Appointment.id == CashEntry.appointment_id, isouter=True)
+        .join(Service, Service.id == Appointment.service_id, isouter=True)
+        .join(Customer, Customer.id == Appointment.customer_user_id, isouter=True)
+        .join(Employee, Employee.id == Appointment.employee_user_id, isouter=True)
+        .join(Cashier, Cashier.id == CashEntry.created_by_user_id, isouter=True)
+        .order_by(CashEntry.created_at, CashEntry.id)
+    )
+    if start:
+        stmt = stmt.where(CashEntry.created_at >= start)
+    if end:
+        stmt = stmt.where(CashEntry.created_at < end)
+    return stmt
+
+def _cash_export_rows(batches) -> Iterator[list[tuple]]:
+    tz = ZoneInfo(settings.TIMEZONE)
+    for batch in batches:
+        yield [
+            (
+                r.id,
+                r.created_at.astimezone(tz).strftime("%Y-%m-%d %H:%M"),
+                r.method.value,
+                float(r.amount),
+                r.concept,
+                r.appointment_id,
+                r.service_name,
+                full_name(r.customer_first, r.customer_last),
+                full_name(r.employee_first, r.employee_last),
+                full_name(r.cashier_first, r.cashier_last),
+            )
+            for r in batch
+        ]
+
+@router.get("/export", dependencies=[Depends(require_roles("ADMIN","RECEPTIONIST"))])
+def cash_export(
+    request: Request,
+    from_day: date | None = Query(default=None, alias="from"),
+    to_day: date | None = Query(default=None, alias="to"),
+    format: str = Query("csv", pattern="^(csv|xlsx)$"),
+):
+    """
+    Movimientos de caja (con cita, servicio, cliente y empleada) en CSV o XLSX.
+    Se genera por lotes desde un cursor del lado del servidor: memoria constante
+    aunque el rango sea de años.
+    """
+    if from_day and to_day and from_day > to_day:
+        raise HTTPException(400, "`from` cannot be after `to`")
+
+    start, end = _local_range(from_day, to_day)
+    factory = SessionLocal if wants_primary(request) else ReadSessionLocal
+    batches = iter_rows(cash_export_stmt(start, end), session_factory=factory)
+
+    filename = f"caja_{from_day or 'inicio'}_{to_day or 'hoy'}"
+    return export_response(format, filename, CASH_EXPORT_HEADER, _cash_export_rows(batches))
 
 @router.post(
     "/entries",
@@ -115,6 +295,19 @@ def create_cash_entry(
     db.refresh(entry)
     return entry
 
+def cash_stats_stmt(start_dt: datetime | None, end_dt: datetime | None):
+    """total, count y total por método en UN statement (agregados con FILTER)."""
+    stmt = select(
+        func.coalesce(func.sum(CashEntry.amount), 0).label("total"),
+        func.count(CashEntry.id).label("count"),
+        *[func.sum(CashEntry.amount).filter(CashEntry.method == m).label(m.value) for m in PaymentMethod],
+    )
+    if start_dt:
+        stmt = stmt.where(CashEntry.created_at >= start_dt)
+    if end_dt:
+        stmt = stmt.where(CashEntry.created_at <= end_dt)
+    return stmt
+
 @router.get(
     "/stats",
     response_model=CashStatsOut,
@@ -137,22 +330,11 @@ def cash_stats(
         start_dt = datetime.combine(from_date, time(0, 0), tzinfo=tz) if from_date else None
         end_dt = datetime.combine(to_date, time(23, 59, 59), tzinfo=tz) if to_date else None
 
-    stmt = select(CashEntry)
-    if start_dt:
-        stmt = stmt.where(CashEntry.created_at >= start_dt)
-    if end_dt:
-        stmt = stmt.where(CashEntry.created_at <= end_dt)
-
-    # total y count
-    total_stmt = select(func.coalesce(func.sum(CashEntry.amount), 0)).select_from(stmt.subquery())
-    total = float(db.execute(total_stmt).scalar_one() or 0)
-
-    count_stmt = select(func.count()).select_from(stmt.subquery())
-    count = int(db.execute(count_stmt).scalar_one())
+    row = db.execute(cash_stats_stmt(start_dt, end_dt)).one()
 
-    # by_method
-    by_method_stmt = select(CashEntry.method, func.coalesce(func.sum(CashEntry.amount), 0)).select_from(stmt.subquery()).group_by(CashEntry.method)
-    rows = db.execute(by_method_stmt).all()
-    by_method = {str(m): float(v) for m, v in rows}
+    total = float(row.total)
+    count = int(row.count)
+    # solo los métodos con movimientos en el rango
+    by_method = {m.value: float(row._mapping[m.value]) for m in PaymentMethod if row._mapping[m.value] is not None}
 
     return CashStatsOut(total=total, by_method=by_method, count=count)
\ No newline at end of file
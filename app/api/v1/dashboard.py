@@ -2,18 +2,23 @@ from __future__ import annotations
 
 from datetime import date, datetime, time, timezone, timedelta
 from zoneinfo import ZoneInfo
-from typing import Optional
+from typing import Iterator, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import select, func, and_, or_, desc
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from sqlalchemy import select, func, and_, or_, desc, case, cast, literal, union_all, Date, String
 
-from app.core.db import get_db
-from app.core.deps import require_roles
+from app.core.db import get_async_read_db, SessionLocal, ReadSessionLocal, wants_primary
+from app.core.export import export_response, full_name
+from app.core.streaming import iter_rows
+from app.core.deps import require_roles_async
 from app.core.config import settings
+from app.core.dashboard_cache import dashboard_cached
 
 from app.models.cash import CashEntry
 from app.models.appointment import Appointment, AppointmentStatus
+from app.models.daily_metric import DailyMetric, NO_METHOD, NO_STATUS
 from app.models.service import Service
 from app.models.user import User
 
@@ -37,124 +42,229 @@ def _pg_local_ts(col):
     """
     return func.timezone(settings.TIMEZONE, col)
 
-# ---------------------------
-# 1) Summary: KPIs del rango
-# ---------------------------
-@router.get("/summary", dependencies=[Depends(require_roles("ADMIN"))])
-def dashboard_summary(
-    db: Session = Depends(get_db),
-    from_day: date = Query(..., alias="from"),
-    to_day: date = Query(..., alias="to"),
-):
-    if to_day < from_day:
-        raise HTTPException(400, "to must be >= from")
-
-    start_utc, end_utc = _local_date_range_to_utc(from_day, to_day)
-
-    # Total ingresos (cash_entries)
-    total_revenue = db.execute(
-        select(func.coalesce(func.sum(CashEntry.amount), 0.0))
-        .where(CashEntry.created_at >= start_utc, CashEntry.created_at < end_utc)
-    ).scalar_one()
+def _pg_local_day(col):
+    return cast(_pg_local_ts(col), Date)
 
-    # Cantidad de pagos (tickets)
-    tickets = db.execute(
-        select(func.count(CashEntry.id))
-        .where(CashEntry.created_at >= start_utc, CashEntry.created_at < end_utc)
-    ).scalar_one()
+def _split_range(from_day: date, to_day: date) -> tuple[tuple[date, date] | None, tuple[date, date] | None]:
+    """
+    Parte [from_day, to_day] en (días cerrados, desde hoy):
+    - días cerrados (< hoy) se leen del rollup daily_metrics
+    - hoy en adelante (citas futuras incluidas) de las tablas crudas
+    """
+    today = datetime.now(TZ).date()
+    past = (from_day, min(to_day, today - timedelta(days=1))) if from_day < today else None
+    live = (max(from_day, today), to_day) if to_day >= today else None
+    return past, live
 
-    avg_ticket = float(total_revenue) / tickets if tickets else 0.0
+def _cash_rollup(past: tuple[date, date]):
+    return (DailyMetric.method != NO_METHOD, DailyMetric.day >= past[0], DailyMetric.day <= past[1])
 
-    # Citas por estado
-    status_rows = db.execute(
-        select(Appointment.status, func.count(Appointment.id))
-        .where(Appointment.start_at >= start_utc, Appointment.start_at < end_utc)
-        .group_by(Appointment.status)
-    ).all()
+def _appt_rollup(past: tuple[date, date]):
+    return (DailyMetric.status != NO_STATUS, DailyMetric.day >= past[0], DailyMetric.day <= past[1])
 
-    appt_by_status = {s.value if hasattr(s, "value") else str(s): c for (s, c) in status_rows}
+def _combined(parts: list):
+    """
+    rollup UNION ALL crudo, como subquery. Los nombres salen del primer SELECT, que puede
+    ser el crudo (rango solo desde hoy): todos los SELECT llevan las mismas etiquetas.
+    """
+    return (parts[0] if len(parts) == 1 else union_all(*parts)).subquery()
 
-    # Total citas en rango
-    total_appts = sum(appt_by_status.values()) if appt_by_status else 0
+# ---------------------------
+# 1) Summary: KPIs del rango
+# ---------------------------
+def summary_stmt(from_day: date, to_day: date):
+    """
+    Todos los KPIs del summary en UN statement:
+    CTE `facts` (rollup de días cerrados UNION ALL crudo desde hoy) + agregados con FILTER.
+    """
+    start_utc, end_utc = _local_date_range_to_utc(from_day, to_day)
+    past, live = _split_range(from_day, to_day)
+
+    # (status, revenue, tickets, appointments); las filas de caja van con status ''
+    parts = []
+    if past:
+        parts.append(
+            select(
+                DailyMetric.status.label("status"),
+                DailyMetric.revenue.label("revenue"),
+                DailyMetric.tickets.label("tickets"),
+                DailyMetric.appointments.label("appointments"),
+            )
+            .where(DailyMetric.day >= past[0], DailyMetric.day <= past[1])
+        )
+    if live:
+        live_start, live_end = _local_date_range_to_utc(*live)
+        parts.append(
+            select(
+                literal(NO_STATUS).label("status"),
+                func.sum(CashEntry.amount).label("revenue"),
+                func.count(CashEntry.id).label("tickets"),
+                literal(0).label("appointments"),
+            )
+            .where(CashEntry.created_at >= live_start, CashEntry.created_at < live_end)
+        )
+        parts.append(
+            select(
+                cast(Appointment.status, String).label("status"),
+                literal(0).label("revenue"),
+                literal(0).label("tickets"),
+                func.count(Appointment.id).label("appointments"),
+            )
+            .where(Appointment.start_at >= live_start, Appointment.start_at < live_end)
+            .group_by(Appointment.status)
+        )
+    facts = (parts[0] if len(parts) == 1 else union_all(*parts)).cte("facts")
 
-    # Clientes nuevos en rango (solo CUSTOMER)
-    new_customers = db.execute(
+    new_customers = (
         select(func.count(User.id))
         .where(
             User.role == "CUSTOMER",
             User.created_at >= start_utc,
             User.created_at < end_utc,
         )
-    ).scalar_one()
+        .scalar_subquery()
+    )
+
+    return select(
+        func.coalesce(func.sum(facts.c.revenue), 0).label("revenue_total"),
+        func.coalesce(func.sum(facts.c.tickets), 0).label("tickets_count"),
+        *[
+            func.coalesce(func.sum(facts.c.appointments).filter(facts.c.status == s.value), 0).label(s.value)
+            for s in AppointmentStatus
+        ],
+        new_customers.label("new_customers"),
+    )
+
+@router.get("/summary", dependencies=[Depends(require_roles_async("ADMIN"))])
+@dashboard_cached("summary")
+async def dashboard_summary(
+    db: AsyncSession = Depends(get_async_read_db),
+    from_day: date = Query(..., alias="from"),
+    to_day: date = Query(..., alias="to"),
+):
+    if to_day < from_day:
+        raise HTTPException(400, "to must be >= from")
+
+    row = (await db.execute(summary_stmt(from_day, to_day))).one()
+
+    total_revenue = float(row.revenue_total)
+    tickets = int(row.tickets_count)
+    avg_ticket = total_revenue / tickets if tickets else 0.0
+
+    # Citas por estado (solo los que tienen citas)
+    appt_by_status = {s.value: int(row._mapping[s.value]) for s in AppointmentStatus if row._mapping[s.value]}
+    total_appts = sum(appt_by_status.values())
 
     return {
         "range": {"from": str(from_day), "to": str(to_day), "timezone": settings.TIMEZONE},
-        "revenue_total": float(total_revenue),
-        "tickets_count": int(tickets),
+        "revenue_total": total_revenue,
+        "tickets_count": tickets,
         "avg_ticket": float(avg_ticket),
         "appointments_total": int(total_appts),
         "appointments_by_status": appt_by_status,
-        "new_customers": int(new_customers),
+        "new_customers": int(row.new_customers),
         "currency": settings.CURRENCY,
     }
 
+# ---------------------------
 # ---------------------------
 # 2) Revenue daily
 # ---------------------------
-@router.get("/revenue/daily", dependencies=[Depends(require_roles("ADMIN"))])
-def revenue_daily(
-    db: Session = Depends(get_db),
+@router.get("/revenue/daily", dependencies=[Depends(require_roles_async("ADMIN"))])
+@dashboard_cached("revenue_daily")
+async def revenue_daily(
+    db: AsyncSession = Depends(get_async_read_db),
     from_day: date = Query(..., alias="from"),
     to_day: date = Query(..., alias="to"),
 ):
     if to_day < from_day:
         raise HTTPException(400, "to must be >= from")
 
-    start_utc, end_utc = _local_date_range_to_utc(from_day, to_day)
-
-    day_key = func.date_trunc("day", _pg_local_ts(CashEntry.created_at))
-
-    rows = db.execute(
-        select(day_key.label("day"), func.coalesce(func.sum(CashEntry.amount), 0.0).label("total"))
-        .where(CashEntry.created_at >= start_utc, CashEntry.created_at < end_utc)
-        .group_by(day_key)
-        .order_by(day_key.asc())
-    ).all()
+    past, live = _split_range(from_day, to_day)
+
+    parts = []
+    if past:
+        parts.append(
+            select(
+                DailyMetric.day.label("day"),
+                func.sum(DailyMetric.revenue).label("total"),
+                func.sum(DailyMetric.tickets).label("tickets"),
+            )
+            .where(*_cash_rollup(past))
+            .group_by(DailyMetric.day)
+        )
+    if live:
+        live_start, live_end = _local_date_range_to_utc(*live)
+        day_key = _pg_local_day(CashEntry.created_at)
+        parts.append(
+            select(
+                day_key.label("day"),
+                func.sum(CashEntry.amount).label("total"),
+                func.count(CashEntry.id).label("tickets"),
+            )
+            .where(CashEntry.created_at >= live_start, CashEntry.created_at < live_end)
+            .group_by(day_key)
+        )
+    daily = _combined(parts)
+    rows = (await db.execute(select(daily.c.day, daily.c.total).where(daily.c.tickets > 0).order_by(daily.c.day.asc()))).all()
 
-    items = [{"day": r.day.date().isoformat(), "total": float(r.total)} for r in rows]
+    items = [{"day": r.day.isoformat(), "total": float(r.total)} for r in rows]
     return {"from": str(from_day), "to": str(to_day), "items": items, "currency": settings.CURRENCY}
 
 # ---------------------------
 # 3) Revenue monthly (por año o rango)
 # ---------------------------
-@router.get("/revenue/monthly", dependencies=[Depends(require_roles("ADMIN"))])
-def revenue_monthly(
-    db: Session = Depends(get_db),
+@router.get("/revenue/monthly", dependencies=[Depends(require_roles_async("ADMIN"))])
+@dashboard_cached("revenue_monthly", day_range=lambda kw: (date(kw["year"], 1, 1), date(kw["year"], 12, 31)))
+async def revenue_monthly(
+    db: AsyncSession = Depends(get_async_read_db),
     year: int = Query(..., ge=2000, le=2100),
 ):
-    # rango del año completo, en zona local
-    start_local = datetime(year, 1, 1, tzinfo=TZ)
-    end_local = datetime(year + 1, 1, 1, tzinfo=TZ)
-    start_utc, end_utc = start_local.astimezone(timezone.utc), end_local.astimezone(timezone.utc)
-
-    month_key = func.date_trunc("month", _pg_local_ts(CashEntry.created_at))
-
-    rows = db.execute(
-        select(month_key.label("month"), func.coalesce(func.sum(CashEntry.amount), 0.0).label("total"))
-        .where(CashEntry.created_at >= start_utc, CashEntry.created_at < end_utc)
-        .group_by(month_key)
-        .order_by(month_key.asc())
-    ).all()
-
-    items = [{"month": r.month.date().isoformat()[:7], "total": float(r.total)} for r in rows]  # YYYY-MM
+    # año completo, en días locales
+    past, live = _split_range(date(year, 1, 1), date(year, 12, 31))
+
+    parts = []
+    if past:
+        month_key = func.to_char(DailyMetric.day, "YYYY-MM")
+        parts.append(
+            select(
+                month_key.label("month"),
+                func.sum(DailyMetric.revenue).label("total"),
+                func.sum(DailyMetric.tickets).label("tickets"),
+            )
+            .where(*_cash_rollup(past))
+            .group_by(month_key)
+        )
+    if live:
+        live_start, live_end = _local_date_range_to_utc(*live)
+        month_key = func.to_char(_pg_local_ts(CashEntry.created_at), "YYYY-MM")
+        parts.append(
+            select(
+                month_key.label("month"),
+                func.sum(CashEntry.amount).label("total"),
+                func.count(CashEntry.id).label("tickets"),
+            )
+            .where(CashEntry.created_at >= live_start, CashEntry.created_at < live_end)
+            .group_by(month_key)
+        )
+    monthly = _combined(parts)
+    rows = (await db.execute(
+        select(monthly.c.month, func.sum(monthly.c.total).label("total"))
+        .group_by(monthly.c.month)
+        .having(func.sum(monthly.c.tickets) > 0)
+        .order_by(monthly.c.month.asc())
+    )).all()
+
+    items = [{"month": r.month, "total": float(r.total)} for r in rows]  # YYYY-MM
     return {"year": year, "items": items, "currency": settings.CURRENCY}
 
 # ---------------------------
 # 4) Top services (por citas DONE o por pagos asociados a appointment)
 # ---------------------------
-@router.get("/top-services", dependencies=[Depends(require_roles("ADMIN"))])
-def top_services(
-    db: Session = Depends(get_db),
+@router.get("/top-services", dependencies=[Depends(require_roles_async("ADMIN"))])
+@dashboard_cached("top_services")
+async def top_services(
+    db: AsyncSession = Depends(get_async_read_db),
     from_day: date = Query(..., alias="from"),
     to_day: date = Query(..., alias="to"),
     limit: int = Query(10, ge=1, le=50),
@@ -162,21 +272,38 @@ def top_services(
     if to_day < from_day:
         raise HTTPException(400, "to must be >= from")
 
-    start_utc, end_utc = _local_date_range_to_utc(from_day, to_day)
+    past, live = _split_range(from_day, to_day)
 
     # TOP por cantidad de citas DONE en rango (más consistente que pagos)
-    rows = db.execute(
-        select(Service.id, Service.name, func.count(Appointment.id).label("count"))
-        .join(Appointment, Appointment.service_id == Service.id)
-        .where(
-            Appointment.start_at >= start_utc,
-            Appointment.start_at < end_utc,
-            Appointment.status == AppointmentStatus.DONE,
+    parts = []
+    if past:
+        parts.append(
+            select(DailyMetric.service_id.label("service_id"), func.sum(DailyMetric.appointments).label("count"))
+            .where(*_appt_rollup(past), DailyMetric.status == AppointmentStatus.DONE.value)
+            .group_by(DailyMetric.service_id)
+        )
+    if live:
+        live_start, live_end = _local_date_range_to_utc(*live)
+        parts.append(
+            select(Appointment.service_id.label("service_id"), func.count(Appointment.id).label("count"))
+            .where(
+                Appointment.start_at >= live_start,
+                Appointment.start_at < live_end,
+                Appointment.status == AppointmentStatus.DONE,
+            )
+            .group_by(Appointment.service_id)
         )
+    done = _combined(parts)
+    count = func.sum(done.c.count)
+
+    rows = (await db.execute(
+        select(Service.id, Service.name, count.label("count"))
+        .join(done, done.c.service_id == Service.id)
         .group_by(Service.id, Service.name)
-        .order_by(desc(func.count(Appointment.id)))
+        .having(count > 0)
+        .order_by(desc(count))
         .limit(limit)
-    ).all()
+    )).all()
 
     items = [{"service_id": r.id, "service_name": r.name, "count": int(r.count)} for r in rows]
     return {"from": str(from_day), "to": str(to_day), "items": items}
@@ -184,9 +311,10 @@ def top_services(
 # ---------------------------
 # 5) Employee workload (citas DONE / total por empleado)
 # ---------------------------
-@router.get("/employees/workload", dependencies=[Depends(require_roles("ADMIN"))])
-def employees_workload(
-    db: Session = Depends(get_db),
+@router.get("/employees/workload", dependencies=[Depends(require_roles_async("ADMIN"))])
+@dashboard_cached("workload")
+async def employees_workload(
+    db: AsyncSession = Depends(get_async_read_db),
     from_day: date = Query(..., alias="from"),
     to_day: date = Query(..., alias="to"),
     limit: int = Query(50, ge=1, le=200),
@@ -194,26 +322,50 @@ def employees_workload(
     if to_day < from_day:
         raise HTTPException(400, "to must be >= from")
 
-    start_utc, end_utc = _local_date_range_to_utc(from_day, to_day)
+    past, live = _split_range(from_day, to_day)
+
+    parts = []
+    if past:
+        parts.append(
+            select(
+                DailyMetric.employee_user_id.label("employee_user_id"),
+                func.sum(DailyMetric.appointments).label("appointments"),
+                func.sum(
+                    case((DailyMetric.status == AppointmentStatus.DONE.value, DailyMetric.appointments), else_=0)
+                ).label("done"),
+            )
+            .where(*_appt_rollup(past))
+            .group_by(DailyMetric.employee_user_id)
+        )
+    if live:
+        live_start, live_end = _local_date_range_to_utc(*live)
+        parts.append(
+            select(
+                Appointment.employee_user_id.label("employee_user_id"),
+                func.count(Appointment.id).label("appointments"),
+                func.sum(case((Appointment.status == AppointmentStatus.DONE, 1), else_=0)).label("done"),
+            )
+            .where(Appointment.start_at >= live_start, Appointment.start_at < live_end)
+            .group_by(Appointment.employee_user_id)
+        )
+    work = _combined(parts)
+    appointments = func.sum(work.c.appointments)
 
-    rows = db.execute(
+    rows = (await db.execute(
         select(
             User.id,
             User.first_name,
             User.last_name,
-            func.count(Appointment.id).label("appointments"),
-            func.sum(func.case((Appointment.status == AppointmentStatus.DONE, 1), else_=0)).label("done"),
-        )
-        .join(Appointment, Appointment.employee_user_id == User.id)
-        .where(
-            User.role == "EMPLOYEE",
-            Appointment.start_at >= start_utc,
-            Appointment.start_at < end_utc,
+            appointments.label("appointments"),
+            func.sum(work.c.done).label("done"),
         )
+        .join(work, work.c.employee_user_id == User.id)
+        .where(User.role == "EMPLOYEE")
         .group_by(User.id, User.first_name, User.last_name)
-        .order_by(desc(func.count(Appointment.id)))
+        .having(appointments > 0)
+        .order_by(desc(appointments))
         .limit(limit)
-    ).all()
+    )).all()
 
     items = []
     for r in rows:
@@ -229,59 +381,94 @@ def employees_workload(
 # ---------------------------
 # 6) Appointments time-series (por día) opcional para chart
 # ---------------------------
-@router.get("/appointments/daily", dependencies=[Depends(require_roles("ADMIN"))])
-def appointments_daily(
-    db: Session = Depends(get_db),
+@router.get("/appointments/daily", dependencies=[Depends(require_roles_async("ADMIN"))])
+@dashboard_cached("appointments_daily")
+async def appointments_daily(
+    db: AsyncSession = Depends(get_async_read_db),
     from_day: date = Query(..., alias="from"),
     to_day: date = Query(..., alias="to"),
 ):
     if to_day < from_day:
         raise HTTPException(400, "to must be >= from")
 
-    start_utc, end_utc = _local_date_range_to_utc(from_day, to_day)
-
-    day_key = func.date_trunc("day", func.timezone(settings.TIMEZONE, Appointment.start_at))
+    past, live = _split_range(from_day, to_day)
 
-    rows = db.execute(
-        select(day_key.label("day"), func.count(Appointment.id).label("count"))
-        .where(Appointment.start_at >= start_utc, Appointment.start_at < end_utc)
-        .group_by(day_key)
-        .order_by(day_key.asc())
-    ).all()
+    parts = []
+    if past:
+        parts.append(
+            select(DailyMetric.day.label("day"), func.sum(DailyMetric.appointments).label("count"))
+            .where(*_appt_rollup(past))
+            .group_by(DailyMetric.day)
+        )
+    if live:
+        live_start, live_end = _local_date_range_to_utc(*live)
+        day_key = _pg_local_day(Appointment.start_at)
+        parts.append(
+            select(day_key.label("day"), func.count(Appointment.id).label("count"))
+            .where(Appointment.start_at >= live_start, Appointment.start_at < live_end)
+            .group_by(day_key)
+        )
+    daily = _combined(parts)
+    rows = (await db.execute(select(daily).where(daily.c.count > 0).order_by(daily.c.day.asc()))).all()
 
-    items = [{"day": r.day.date().isoformat(), "count": int(r.count)} for r in rows]
+    items = [{"day": r.day.isoformat(), "count": int(r.count)} for r in rows]
     return {"from": str(from_day), "to": str(to_day), "items": items}
 
-@router.get("/revenue/by-method", dependencies=[Depends(require_roles("ADMIN"))])
-def revenue_by_method(
-    db: Session = Depends(get_db),
+@router.get("/revenue/by-method", dependencies=[Depends(require_roles_async("ADMIN"))])
+@dashboard_cached("revenue_by_method")
+async def revenue_by_method(
+    db: AsyncSession = Depends(get_async_read_db),
     from_day: date = Query(..., alias="from"),
     to_day: date = Query(..., alias="to"),
 ):
     if to_day < from_day:
         raise HTTPException(400, "to must be >= from")
 
-    start_utc, end_utc = _local_date_range_to_utc(from_day, to_day)
+    past, live = _split_range(from_day, to_day)
+
+    parts = []
+    if past:
+        parts.append(
+            select(
+                DailyMetric.method.label("method"),
+                func.sum(DailyMetric.revenue).label("total"),
+                func.sum(DailyMetric.tickets).label("count"),
+            )
+            .where(*_cash_rollup(past))
+            .group_by(DailyMetric.method)
+        )
+    if live:
+        live_start, live_end = _local_date_range_to_utc(*live)
+        parts.append(
+            select(
+                cast(CashEntry.method, String).label("method"),
+                func.sum(CashEntry.amount).label("total"),
+                func.count(CashEntry.id).label("count"),
+            )
+            .where(CashEntry.created_at >= live_start, CashEntry.created_at < live_end)
+            .group_by(CashEntry.method)
+        )
+    by_method = _combined(parts)
+    count = func.sum(by_method.c.count)
 
-    rows = db.execute(
+    rows = (await db.execute(
         select(
-            CashEntry.method,
-            func.coalesce(func.sum(CashEntry.amount), 0.0).label("total"),
-            func.count(CashEntry.id).label("count"),
+            by_method.c.method,
+            func.coalesce(func.sum(by_method.c.total), 0.0).label("total"),
+            count.label("count"),
         )
-        .where(CashEntry.created_at >= start_utc, CashEntry.created_at < end_utc)
-        .group_by(CashEntry.method)
-        .order_by(CashEntry.method.asc())
-    ).all()
+        .group_by(by_method.c.method)
+        .having(count > 0)
+        .order_by(by_method.c.method.asc())
+    )).all()
 
     grand_total = sum(float(r.total) for r in rows) if rows else 0.0
 
     items = []
     for r in rows:
-        method = r.method.value if hasattr(r.method, "value") else str(r.method)
         total = float(r.total)
         items.append({
-            "method": method,                  # CASH | TRANSFER | CARD
+            "method": r.method,                # CASH | TRANSFER | CARD
             "total": total,
             "count": int(r.count),
             "share": (total / grand_total) if grand_total > 0 else 0.0,  # 0..1
@@ -295,6 +482,86 @@ def revenue_by_method(
         "items": items,
     }
 
+# ---------------------------
+# 7) Export (CSV / XLSX) de citas con su pago
+# ---------------------------
+APPOINTMENTS_EXPORT_HEADER = (
+    "cita_id", "inicio", "fin", "estado", "servicio", "precio", "cliente", "empleada",
+    "pago_id", "pagado", "metodo_pago", "fecha_pago",
+)
+
+def appointments_export_stmt(from_day: date, to_day: date):
+    start_utc, end_utc = _local_date_range_to_utc(from_day, to_day)
+    Customer = aliased(User)
+    Employee = aliased(User)
+    return (
+        select(
+            Appointment.id,
+            Appointment.start_at,
+            Appointment.end_at,
+            Appointment.status,
+            Service.name.label("service_name"),
+            Service.price,
+            Customer.first_name.label("customer_first"),
+            Customer.last_name.label("customer_last"),
+            Employee.first_name.label("employee_first"),
+            Employee.last_name.label("employee_last"),
+            CashEntry.id.label("cash_id"),
+            CashEntry.amount,
+            CashEntry.method,
+            CashEntry.created_at.label("paid_at"),
+        )
+        .select_from(Appointment)
+        .join(Service, Service.id == Appointment.service_id)
+        .join(Customer, Customer.id == Appointment.customer_user_id)
+        .join(Employee, Employee.id == Appointment.employee_user_id)
+        .join(CashEntry, CashEntry.appointment_id == Appointment.id, isouter=True)
+        .where(Appointment.start_at >= start_utc, Appointment.start_at < end_utc)
+        .order_by(Appointment.start_at, Appointment.id, CashEntry.id)
+    )
+
+def _appointments_export_rows(batches) -> Iterator[list[tuple]]:
+    fmt = "%Y-%m-%d %H:%M"
+    for batch in batches:
+        yield [
+            (
+                r.id,
+                r.start_at.astimezone(TZ).strftime(fmt),
+                r.end_at.astimezone(TZ).strftime(fmt),
+                r.status.value,
+                r.service_name,
+                float(r.price),
+                full_name(r.customer_first, r.customer_last),
+                full_name(r.employee_first, r.employee_last),
+                r.cash_id,
+                float(r.amount) if r.amount is not None else None,
+                r.method.value if r.method is not None else None,
+                r.paid_at.astimezone(TZ).strftime(fmt) if r.paid_at is not None else None,
+            )
+            for r in batch
+        ]
+
+@router.get("/export", dependencies=[Depends(require_roles_async("ADMIN"))])
+async def dashboard_export(
+    request: Request,
+    from_day: date = Query(..., alias="from"),
+    to_day: date = Query(..., alias="to"),
+    format: str = Query("csv", pattern="^(csv|xlsx)$"),
+):
+    """
+    Citas del rango (servicio, cliente, empleada, estado) con su pago, en CSV o XLSX.
+    Cursor del lado del servidor + StreamingResponse: memoria constante; el
+    generador (sync) lo consume Starlette en el threadpool con su propia sesión.
+    """
+    if to_day < from_day:
+        raise HTTPException(400, "to must be >= from")
+
+    factory = SessionLocal if wants_primary(request) else ReadSessionLocal
+    batches = iter_rows(appointments_export_stmt(from_day, to_day), session_factory=factory)
+    return export_response(
+        format, f"citas_{from_day}_{to_day}", APPOINTMENTS_EXPORT_HEADER, _appointments_export_rows(batches)
+    )
+
 def _range_to_datetimes(from_day: date, to_day: date) -> tuple[datetime, datetime]:
     tz = ZoneInfo(settings.TIMEZONE)
     start = datetime.combine(from_day, time.min).replace(tzinfo=tz)
@@ -307,12 +574,14 @@ def _range_to_datetimes(from_day: date, to_day: date) -> tuple[datetime, datetim
     end_exclusive = end_exclusive + (datetime.combine(date(2000,1,2), time.min) - datetime.combine(date(2000,1,1), time.min))
     return start, end_exclusive
 
+# sin dashboard_cached: agrupa pagos por el estado ACTUAL de la cita, y un cambio
+# de estado invalida el día de la cita, no el de los pagos
 @router.get(
     "/revenue-by-method",
-    dependencies=[Depends(require_roles("ADMIN", "RECEPTIONIST"))],
+    dependencies=[Depends(require_roles_async("ADMIN", "RECEPTIONIST"))],
 )
-def revenue_by_method(
-    db: Session = Depends(get_db),
+async def revenue_by_method(
+    db: AsyncSession = Depends(get_async_read_db),
     from_day: date = Query(..., alias="from"),
     to_day: date = Query(..., alias="to"),
     group_by: str = Query("day", pattern="^(day|month)$"),
@@ -340,7 +609,7 @@ def revenue_by_method(
         .order_by(bucket.asc())
     )
 
-    rows = db.execute(stmt).all()
+    rows = (await db.execute(stmt)).all()
 
     # build a clean JSON
     series: dict[str, dict] = {}
@@ -367,7 +636,7 @@ def revenue_by_method(
         .group_by(CashEntry.method, Appointment.status)
         .order_by(CashEntry.method.asc())
     )
-    totals_rows = db.execute(totals_stmt).all()
+    totals_rows = (await db.execute(totals_stmt)).all()
 
     totals: dict[str, dict] = {}
     for method, appt_status, total, count in totals_rows:
@@ -4,7 +4,7 @@ from sqlalchemy import select
 from app.core.db import get_db
 from app.core.deps import require_roles
 from app.core.media import save_image_replace_and_thumb
-from app.core.pagination import paginate
+from app.core.pagination import paginate_page, TotalMode
 from app.models.product import Product
 from app.schemas.pagination import Page
 from app.schemas.product import ProductCreate, ProductUpdate, ProductOut
@@ -15,6 +15,7 @@ router = APIRouter(prefix="/products")
 def list_products(
         page: int = Query(1, ge=1),
         size: int = Query(20, ge=1, le=100),
+        total_mode: TotalMode = Query("exact", alias="total", description="exact | estimate (planner) | none"),
         include_inactive: bool = False,
         db: Session = Depends(get_db)
 ):
@@ -22,8 +23,7 @@ def list_products(
     if not include_inactive:
         query = query.where(Product.is_active == True)  # noqa: E712
 
-    items, total = paginate(db, query, page, size)
-    return {"items": items, "page": page, "size": size, "total": total}
+    return paginate_page(db, query, page, size, total_mode)
 
 @router.post("", response_model=ProductOut, dependencies=[Depends(require_roles("ADMIN"))])
 def create_product(payload: ProductCreate, db: Session = Depends(get_db)):
@@ -1,10 +1,14 @@
 from datetime import date, datetime, timezone
+from zoneinfo import ZoneInfo
 from fastapi import APIRouter, Query, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from sqlalchemy import select, or_
 
-from app.core.db import get_db
-from app.core.pagination import paginate
+from app.core.config import settings
+from app.core.db import get_read_db, get_async_read_db, SessionLocal
+from app.core.pagination import apaginate_page, TotalMode
 from app.models import Slide, GalleryImage, Testimonial, Product, SiteSettings, SiteSocialLink
 from app.schemas.gallery import GalleryImageOut
 from app.schemas.pagination import Page
@@ -12,23 +16,41 @@ from app.schemas.service import ServiceOut
 from app.models.service import Service
 from app.schemas.public import EmployeePublicOut
 from app.models.user import User, Role
-from app.crud.availability import get_employee_availability
+from app.crud.availability import (
+    get_employee_availability,
+    get_availability_for_employees,
+    iter_availability_range,
+    find_next_available,
+)
 from app.schemas.public_availability import AvailabilityByServiceOut, EmployeeSlotsOut
+from app.schemas.public_next_availability import NextAvailabilityOut, NextSlotOut
 from app.schemas.public_availability_summary import (
     AvailabilitySummaryOut,
     EmployeeAvailabilitySummaryOut,
 )
-from app.core.public_cache import public_cache
+from app.core.cache import NOT_FOUND
+from app.core.public_cache import public_cache, availability_tag, availability_tags, NEGATIVE_TTL_SECONDS
 from app.schemas.slide import SlideOut
 from app.schemas.testimonial import TestimonialOut
 
 router = APIRouter(prefix="/public", tags=["public"])
 
+def _in_new_session(fn):
+    """Para refresh en segundo plano (stale-while-revalidate): sesión propia, no la del request."""
+    def run():
+        session = SessionLocal()
+        try:
+            return fn(session)
+        finally:
+            session.close()
+    return run
+
 @router.get("/services", response_model=Page[ServiceOut])
-def public_services(
+async def public_services(
     page: int = Query(1, ge=1),
     size: int = Query(20, ge=1, le=100),
-    db: Session = Depends(get_db),
+    total_mode: TotalMode = Query("exact", alias="total", description="exact | estimate (planner) | none"),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
     """
     Endpoint público para la web:
@@ -42,14 +64,14 @@ def public_services(
         .order_by(Service.name)
     )
 
-    items, total = paginate(db, stmt, page, size)
-    return Page[ServiceOut](items=items, page=page, size=size, total=total)
+    return Page[ServiceOut](**await apaginate_page(db, stmt, page, size, total_mode))
 
 @router.get("/employees", response_model=Page[EmployeePublicOut])
-def public_employees(
+async def public_employees(
     page: int = Query(1, ge=1),
     size: int = Query(20, ge=1, le=100),
-    db: Session = Depends(get_db),
+    total_mode: TotalMode = Query("exact", alias="total", description="exact | estimate (planner) | none"),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
     """
     Público:
@@ -64,16 +86,17 @@ def public_employees(
         .order_by(User.first_name, User.last_name)
     )
 
-    items, total = paginate(db, stmt, page, size)
-    return Page[EmployeePublicOut](items=items, page=page, size=size, total=total)
+    return Page[EmployeePublicOut](**await apaginate_page(db, stmt, page, size, total_mode))
 
+# Disponibilidad: lee de la réplica (get_read_db). Un slot recién reservado puede verse
+# libre unos segundos para otros clientes; al reservar se valida otra vez contra el primario.
 @router.get("/availability/employees/{employee_user_id}")
 def public_availability_for_employee(
     employee_user_id: int,
     day: date = Query(..., description="YYYY-MM-DD"),
     service_id: int = Query(...),
     step_minutes: int = Query(15, ge=5, le=60),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     """
     Público:
@@ -84,8 +107,13 @@ def public_availability_for_employee(
     if not employee or not employee.is_active or employee.role != Role.EMPLOYEE:
         raise HTTPException(404, "Employee not found")
 
-    try:
-        slots = get_employee_availability(db, employee_user_id, day, service_id, step_minutes)
+    cache_key = f"pub:avail:employee:day={day}:emp={employee_user_id}:service={service_id}:step={step_minutes}"
+
+    def compute():
+        try:
+            slots = get_employee_availability(db, employee_user_id, day, service_id, step_minutes)
+        except ValueError:
+            return NOT_FOUND
         return {
             "employee_user_id": employee_user_id,
             "day": str(day),
@@ -93,38 +121,50 @@ def public_availability_for_employee(
             "step_minutes": step_minutes,
             "slots": slots,
         }
-    except ValueError as e:
-        raise HTTPException(400, str(e))
+
+    result = public_cache.get_or_set(
+        cache_key,
+        compute,
+        ttl_seconds=60,
+        tags=[availability_tag(day, employee_user_id)],
+        negative_ttl_seconds=NEGATIVE_TTL_SECONDS,
+    )
+    if result is NOT_FOUND:
+        raise HTTPException(400, "Service not found/active")
+    return result
 
 @router.get("/availability", response_model=AvailabilityByServiceOut)
 def public_availability_by_service(
     day: date = Query(..., description="YYYY-MM-DD"),
     service_id: int = Query(...),
     step_minutes: int = Query(15, ge=5, le=60),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     cache_key = f"pub:avail:detail:day={day}:service={service_id}:step={step_minutes}"
 
-    def compute():
-        service = db.get(Service, service_id)
+    def compute(session: Session):
+        service = session.get(Service, service_id)
         if not service or not service.is_active:
-            raise HTTPException(404, "Service not found")
+            return NOT_FOUND
 
-        employees = db.execute(
+        employees = session.execute(
             select(User)
             .where(User.role == Role.EMPLOYEE)
             .where(User.is_active == True)  # noqa: E712
             .order_by(User.first_name, User.last_name)
         ).scalars().all()
 
+        slots_by_employee = get_availability_for_employees(
+            session, [e.id for e in employees], day, service_id, step_minutes
+        )
+
         result = []
         for e in employees:
-            slots = get_employee_availability(db, e.id, day, service_id, step_minutes)
             result.append(EmployeeSlotsOut(
                 employee_user_id=e.id,
                 first_name=e.first_name,
                 last_name=e.last_name,
-                slots=slots,
+                slots=slots_by_employee[e.id],
             ))
 
         return AvailabilityByServiceOut(
@@ -134,7 +174,18 @@ def public_availability_by_service(
             employees=result,
         )
 
-    return public_cache.get_or_set(cache_key, compute, ttl_seconds=60)
+    result = public_cache.get_or_set(
+        cache_key,
+        lambda: compute(db),
+        ttl_seconds=60,
+        tags=lambda out: availability_tags(day, [e.employee_user_id for e in out.employees]),
+        stale_ttl_seconds=30,
+        refresh=_in_new_session(compute),
+        negative_ttl_seconds=NEGATIVE_TTL_SECONDS,
+    )
+    if result is NOT_FOUND:
+        raise HTTPException(404, "Service not found")
+    return result
 
 @router.get("/availability/summary", response_model=AvailabilitySummaryOut)
 def public_availability_summary(
@@ -142,26 +193,30 @@ def public_availability_summary(
     service_id: int = Query(...),
     step_minutes: int = Query(15, ge=5, le=60),
     preview_limit: int = Query(5, ge=0, le=20),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     cache_key = f"pub:avail:summary:day={day}:service={service_id}:step={step_minutes}:preview={preview_limit}"
 
-    def compute():
-        service = db.get(Service, service_id)
+    def compute(session: Session):
+        service = session.get(Service, service_id)
         if not service or not service.is_active:
-            # en cache no queremos guardar excepciones; lanzamos igual
-            raise HTTPException(404, "Service not found")
+            # cache negativo (TTL corto): un crawler con service_id inválidos no pega a la DB
+            return NOT_FOUND
 
-        employees = db.execute(
+        employees = session.execute(
             select(User)
             .where(User.role == Role.EMPLOYEE)
             .where(User.is_active == True)  # noqa: E712
             .order_by(User.first_name, User.last_name)
         ).scalars().all()
 
+        slots_by_employee = get_availability_for_employees(
+            session, [e.id for e in employees], day, service_id, step_minutes
+        )
+
         out = []
         for e in employees:
-            slots = get_employee_availability(db, e.id, day, service_id, step_minutes)
+            slots = slots_by_employee[e.id]
             out.append(EmployeeAvailabilitySummaryOut(
                 employee_user_id=e.id,
                 first_name=e.first_name,
@@ -179,10 +234,131 @@ def public_availability_summary(
         )
 
     # cache TTL 60s (o cambia aquí a 30 si prefieres)
-    return public_cache.get_or_set(cache_key, compute, ttl_seconds=60)
+    result = public_cache.get_or_set(
+        cache_key,
+        lambda: compute(db),
+        ttl_seconds=60,
+        tags=lambda out: availability_tags(day, [e.employee_user_id for e in out.employees]),
+        stale_ttl_seconds=30,
+        refresh=_in_new_session(compute),
+        negative_ttl_seconds=NEGATIVE_TTL_SECONDS,
+    )
+    if result is NOT_FOUND:
+        raise HTTPException(404, "Service not found")
+    return result
+
+MAX_RANGE_DAYS = 31
+
+@router.get("/availability/range")
+def public_availability_range(
+    from_day: date = Query(..., alias="from", description="YYYY-MM-DD"),
+    to_day: date = Query(..., alias="to", description="YYYY-MM-DD"),
+    service_id: int = Query(...),
+    step_minutes: int = Query(15, ge=5, le=60),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Público:
+    - disponibilidad de todos los empleados para un rango de días
+    - una sola carga de citas para todo el rango
+    - respuesta NDJSON (una línea por día, mismo formato que /availability)
+    """
+    if to_day < from_day:
+        raise HTTPException(400, "to must be >= from")
+    if (to_day - from_day).days + 1 > MAX_RANGE_DAYS:
+        raise HTTPException(400, f"Range cannot exceed {MAX_RANGE_DAYS} days")
+
+    employees = db.execute(
+        select(User)
+        .where(User.role == Role.EMPLOYEE)
+        .where(User.is_active == True)  # noqa: E712
+        .order_by(User.first_name, User.last_name)
+    ).scalars().all()
+    names = [(e.id, e.first_name, e.last_name) for e in employees]
+
+    try:
+        days = iter_availability_range(db, [eid for eid, _, _ in names], from_day, to_day, service_id, step_minutes)
+    except ValueError:
+        raise HTTPException(404, "Service not found")
+
+    def stream():
+        for day, slots_by_employee in days:
+            out = AvailabilityByServiceOut(
+                day=str(day),
+                service_id=service_id,
+                step_minutes=step_minutes,
+                employees=[
+                    EmployeeSlotsOut(
+                        employee_user_id=eid,
+                        first_name=first_name,
+                        last_name=last_name,
+                        slots=slots_by_employee[eid],
+                    )
+                    for eid, first_name, last_name in names
+                ],
+            )
+            yield out.model_dump_json() + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@router.get("/availability/next", response_model=NextAvailabilityOut)
+def public_next_availability(
+    service_id: int = Query(...),
+    after: datetime | None = Query(default=None, description="ISO datetime (default: ahora)"),
+    employee_user_id: int | None = Query(default=None),
+    limit: int = Query(5, ge=1, le=50),
+    step_minutes: int = Query(15, ge=5, le=60),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Público:
+    - próximos slots libres para un servicio (todos los empleados o uno)
+    - ordenados por hora
+    """
+    tz = ZoneInfo(settings.TIMEZONE)
+    after = after or datetime.now(tz)
+
+    stmt = (
+        select(User)
+        .where(User.role == Role.EMPLOYEE)
+        .where(User.is_active == True)  # noqa: E712
+    )
+    if employee_user_id is not None:
+        stmt = stmt.where(User.id == employee_user_id)
+    employees = {e.id: e for e in db.execute(stmt).scalars().all()}
+    if employee_user_id is not None and not employees:
+        raise HTTPException(404, "Employee not found")
+
+    try:
+        found = find_next_available(
+            db,
+            service_id,
+            after,
+            employee_user_ids=list(employees.keys()),
+            limit=limit,
+            step_minutes=step_minutes,
+        )
+    except ValueError:
+        raise HTTPException(404, "Service not found")
+
+    return NextAvailabilityOut(
+        service_id=service_id,
+        step_minutes=step_minutes,
+        after=after.isoformat(),
+        slots=[
+            NextSlotOut(
+                employee_user_id=eid,
+                first_name=employees[eid].first_name,
+                last_name=employees[eid].last_name,
+                start_at=start_at.isoformat(),
+                end_at=end_at.isoformat(),
+            )
+            for eid, start_at, end_at in found
+        ],
+    )
 
 @router.get("/slides", response_model=list[SlideOut])
-def public_slides(db: Session = Depends(get_db)):
+async def public_slides(db: AsyncSession = Depends(get_async_read_db)):
     now = datetime.now(timezone.utc)
 
     stmt = (
@@ -193,66 +369,66 @@ def public_slides(db: Session = Depends(get_db)):
         .order_by(Slide.sort_order.asc(), Slide.id.asc())
     )
 
-    return db.execute(stmt).scalars().all()
+    return (await db.execute(stmt)).scalars().all()
 
 @router.get("/gallery", response_model=list[GalleryImageOut])
-def public_gallery(db: Session = Depends(get_db)):
+async def public_gallery(db: AsyncSession = Depends(get_async_read_db)):
     stmt = select(GalleryImage).order_by(GalleryImage.created_at.desc())
-    return db.execute(stmt).scalars().all()
+    return (await db.execute(stmt)).scalars().all()
 
 @router.get("/testimonials", response_model=list[TestimonialOut])
-def public_testimonials(db: Session = Depends(get_db)):
+async def public_testimonials(db: AsyncSession = Depends(get_async_read_db)):
     stmt = select(Testimonial).order_by(Testimonial.sort_order.asc(), Testimonial.id.asc())
-    return db.execute(stmt).scalars().all()
+    return (await db.execute(stmt)).scalars().all()
 
 @router.get("/home")
-def public_home(db: Session = Depends(get_db)):
-    settings = db.execute(select(SiteSettings)).scalars().first()
+async def public_home(db: AsyncSession = Depends(get_async_read_db)):
+    settings = (await db.execute(select(SiteSettings))).scalars().first()
 
-    slides = db.execute(
+    slides = (await db.execute(
         select(Slide)
         .where(Slide.is_active == True)
         .order_by(Slide.sort_order.asc(), Slide.id.asc())
         .limit(10)
-    ).scalars().all()
+    )).scalars().all()
 
-    services = db.execute(
+    services = (await db.execute(
         select(Service)
         .where(Service.is_active == True)
         .order_by(Service.id.desc())
-    ).scalars().all()
+    )).scalars().all()
 
-    employees = db.execute(
+    employees = (await db.execute(
         select(User)
         .where(User.is_active == True)
         .where(User.role == Role.EMPLOYEE)
         .order_by(User.sort_order.asc(), User.id.asc())
-    ).scalars().all()
+    )).scalars().all()
 
-    products = db.execute(
+    products = (await db.execute(
         select(Product)
         .where(Product.is_active == True)
         .order_by(Product.id.asc())
         .limit(12)
-    ).scalars().all()
+    )).scalars().all()
 
-    gallery = db.execute(
+    gallery = (await db.execute(
         select(GalleryImage)
         .order_by(GalleryImage.sort_order.asc(), GalleryImage.id.desc())
         .limit(18)
-    ).scalars().all()
+    )).scalars().all()
 
-    testimonials = db.execute(
+    testimonials = (await db.execute(
         select(Testimonial)
         .order_by(Testimonial.testimonial_date.desc(), Testimonial.id.desc())
         .limit(10)
-    ).scalars().all()
+    )).scalars().all()
 
-    site_socials = db.execute(
+    site_socials = (await db.execute(
         select(SiteSocialLink)
         .where(SiteSocialLink.is_active == True)
         .order_by(SiteSocialLink.id.asc())
-    ).scalars().all()
+    )).scalars().all()
 
     return {
         "settings": settings,
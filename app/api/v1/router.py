@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.v1 import auth, services, appointments, products, cash, users, availability, public, admin_whatsapp_debug, slides, gallery, testimonials, dashboard, site_settings
+from app.api.v1 import auth, services, appointments, products, cash, users, availability, public, admin_whatsapp_debug, admin_db, slides, gallery, testimonials, dashboard, site_settings
 
 router = APIRouter(prefix="/api/v1")
 router.include_router(auth.router, tags=["auth"])
@@ -16,3 +16,4 @@ router.include_router(dashboard.router, tags=["dashboard"])
 router.include_router(site_settings.router, tags=["site-settings"])
 router.include_router(public.router)
 router.include_router(admin_whatsapp_debug.router)
+router.include_router(admin_db.router)
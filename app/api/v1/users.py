@@ -8,7 +8,7 @@ from app.core.security import hash_password
 from app.models.user import User, Role
 from app.schemas.pagination import Page
 from app.schemas.user import UserCreate, UserUpdate, UserOut
-from app.core.pagination import paginate
+from app.core.pagination import paginate_page, keyset_paginate, TotalMode
 
 router = APIRouter(prefix="/users")
 
@@ -26,6 +26,8 @@ def me(user: User = Depends(get_current_user)):
 def list_users(
     page: int = Query(1, ge=1),
     size: int = Query(20, ge=1, le=100),
+    total_mode: TotalMode = Query("exact", alias="total", description="exact | estimate (planner) | none"),
+    cursor: str | None = Query(default=None, description="Paginación por cursor: \"\" para la primera página, luego next_cursor (ignora page)"),
     role: str | None = None,
     is_active: bool | None = None,
     db: Session = Depends(get_db),
@@ -36,8 +38,11 @@ def list_users(
     if is_active is not None:
         q = q.where(User.is_active == is_active)
 
-    items, total = paginate(db, q, page, size)
-    return {"items": items, "page": page, "size": size, "total": total}
+    if cursor is not None:
+        items, next_cursor = keyset_paginate(db, q, [User.id], cursor, size, descending=True)
+        return {"items": items, "size": size, "has_next": next_cursor is not None, "next_cursor": next_cursor}
+
+    return paginate_page(db, q, page, size, total_mode)
 
 @router.post("", response_model=UserOut, dependencies=[Depends(require_roles("ADMIN"))])
 def create_user(payload: UserCreate, db: Session = Depends(get_db)):
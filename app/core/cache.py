@@ -2,64 +2,221 @@ from __future__ import annotations
 
 import time
 import threading
-from dataclasses import dataclass
-from typing import Any, Callable
+from typing import Any, Callable, Iterable
 
-@dataclass
-class CacheItem:
-    value: Any
-    expires_at: float
+from app.core.cache_backends import CacheBackend, CacheItem, MemoryBackend
+
+class _NotFound:
+    """Sentinel para cachear un resultado negativo ("no existe")."""
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __repr__(self) -> str:
+        return "NOT_FOUND"
+
+    def __reduce__(self):
+        # al (de)serializar sigue siendo el mismo objeto
+        return "NOT_FOUND"
+
+NOT_FOUND = _NotFound()
+
+class _Flight:
+    """Cálculo en curso de una key (single-flight)."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: BaseException | None = None
+        self.since: int | None = None  # tag_seq() antes de factory()
+        self.tags: tuple[str, ...] = ()  # tags de lo calculado (ya resueltos)
 
 class TTLCache:
-    def __init__(self, ttl_seconds: int = 60, max_items: int = 2000):
+    """
+    Cache con TTL sobre un backend de almacenamiento (ver cache_backends):
+    - MemoryBackend (default): dict del proceso con LRU + heap de expiración
+    - SQLiteBackend: archivo compartido por los workers (invalidación para todos)
+    - get_or_set con single-flight: por key solo un caller ejecuta factory(),
+      los demás esperan su resultado; opcionalmente stale-while-revalidate
+    - lo calculado no se guarda si sus tags se invalidaron mientras corría
+      factory() (generaciones de tags en el backend: vale entre workers)
+    """
+
+    def __init__(self, ttl_seconds: int = 60, max_items: int = 2000, backend: CacheBackend | None = None):
         self.ttl_seconds = ttl_seconds
         self.max_items = max_items
-        self._data: dict[str, CacheItem] = {}
+        self.backend = backend or MemoryBackend(max_items=max_items)
+        self._inflight: dict[str, _Flight] = {}
         self._lock = threading.Lock()
 
     def _now(self) -> float:
         return time.time()
 
-    def _cleanup(self) -> None:
-        now = self._now()
-        # remove expired
-        expired = [k for k, v in self._data.items() if v.expires_at <= now]
-        for k in expired:
-            self._data.pop(k, None)
-
-        # cap size (simple eviction: remove oldest expiry first)
-        if len(self._data) > self.max_items:
-            keys_by_exp = sorted(self._data.items(), key=lambda kv: kv[1].expires_at)
-            for k, _ in keys_by_exp[: len(self._data) - self.max_items]:
-                self._data.pop(k, None)
+    def sweep(self) -> None:
+        """Saca lo vencido (se puede llamar desde un job periódico)."""
+        self.backend.sweep()
 
     def get(self, key: str):
-        with self._lock:
-            item = self._data.get(key)
-            if not item:
-                return None
-            if item.expires_at <= self._now():
-                self._data.pop(key, None)
-                return None
-            return item.value
+        item = self.backend.get(key)
+        if not item or item.expires_at <= self._now():
+            return None
+        return item.value
 
-    def set(self, key: str, value: Any, ttl_seconds: int | None = None):
+    def set(
+        self,
+        key: str,
+        value: Any,
+        ttl_seconds: int | None = None,
+        tags: Iterable[str] | None = None,
+        stale_ttl_seconds: int | None = None,
+        since: int | None = None,
+    ) -> bool:
+        """
+        `since`: tag_seq() tomado antes de calcular `value`. Si alguno de `tags` se
+        invalidó después, no se guarda (devuelve False).
+        """
         ttl = ttl_seconds if ttl_seconds is not None else self.ttl_seconds
+        expires_at = self._now() + ttl
+        return self.backend.set(
+            key,
+            CacheItem(
+                value=value,
+                expires_at=expires_at,
+                tags=tuple(tags or ()),
+                stale_until=expires_at + (stale_ttl_seconds or 0),
+            ),
+            since=since,
+        )
+
+    def tag_seq(self) -> int:
+        return self.backend.tag_seq()
+
+    def _compute(
+        self,
+        key: str,
+        flight: _Flight,
+        factory: Callable[[], Any],
+        ttl_seconds,
+        tags,
+        stale_ttl_seconds,
+        negative_ttl_seconds,
+    ):
+        try:
+            since = flight.since = self.tag_seq()
+            value = factory()
+            if value is NOT_FOUND:
+                # negativo: TTL propio (corto), sin tags ni stale
+                self.set(
+                    key,
+                    value,
+                    ttl_seconds=negative_ttl_seconds if negative_ttl_seconds is not None else ttl_seconds,
+                )
+            else:
+                if callable(tags):
+                    tags = tags(value)
+                flight.tags = tuple(tags or ())
+                self.set(
+                    key, value, ttl_seconds=ttl_seconds, tags=tags, stale_ttl_seconds=stale_ttl_seconds, since=since
+                )
+            flight.value = value
+            return value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._inflight.get(key) is flight:
+                    self._inflight.pop(key, None)
+            flight.done.set()
+
+    def _revalidate(self, key: str, flight: _Flight, factory: Callable[[], Any], *args):
+        try:
+            self._compute(key, flight, factory, *args)
+        except Exception:
+            # se sigue sirviendo el valor vencido hasta stale_until
+            pass
+
+    def get_or_set(
+        self,
+        key: str,
+        factory: Callable[[], Any],
+        ttl_seconds: int | None = None,
+        tags: Iterable[str] | Callable[[Any], Iterable[str]] | None = None,
+        stale_ttl_seconds: int | None = None,
+        refresh: Callable[[], Any] | None = None,
+        negative_ttl_seconds: int | None = None,
+    ):
+        """
+        `tags` puede ser una lista fija o una función value -> tags
+        (útil cuando los tags dependen de lo calculado, p.ej. los empleados).
+
+        Single-flight: si otro hilo ya está calculando la key, se espera su resultado
+        (o su excepción) en vez de recalcular.
+
+        `stale_ttl_seconds`: durante ese tiempo después de vencer se devuelve el valor
+        viejo y se lanza UN refresh en segundo plano con `refresh` (o `factory`).
+        El refresh corre en otro hilo: no debe usar recursos del request (p.ej. su Session).
+
+        Si algún tag se invalida mientras corre factory(), el valor se devuelve
+        pero no se guarda (el próximo get recalcula con lo escrito); los que
+        esperaban ese vuelo recalculan en vez de recibir el valor viejo.
+
+        Cache negativo: si factory() devuelve NOT_FOUND se guarda con
+        `negative_ttl_seconds` y se devuelve NOT_FOUND (el caller decide el 404).
+        """
+        item = self.backend.get(key)
+        now = self._now()
+        if item is not None and item.expires_at > now:
+            return item.value
+
         with self._lock:
-            self._cleanup()
-            self._data[key] = CacheItem(value=value, expires_at=self._now() + ttl)
+            flight = self._inflight.get(key)
+            if item is not None and item.stale_until > now:
+                if flight is None:
+                    flight = _Flight()
+                    self._inflight[key] = flight
+                    threading.Thread(
+                        target=self._revalidate,
+                        args=(
+                            key, flight, refresh or factory,
+                            ttl_seconds, tags, stale_ttl_seconds, negative_ttl_seconds,
+                        ),
+                        daemon=True,
+                    ).start()
+                return item.value
+
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._inflight[key] = flight
 
-    def get_or_set(self, key: str, factory: Callable[[], Any], ttl_seconds: int | None = None):
-        cached = self.get(key)
-        if cached is not None:
-            return cached
-        value = factory()
-        self.set(key, value, ttl_seconds=ttl_seconds)
-        return value
+        if leader:
+            return self._compute(
+                key, flight, factory, ttl_seconds, tags, stale_ttl_seconds, negative_ttl_seconds
+            )
+
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        if self._invalidated_during(flight):
+            # el valor es de antes de la escritura: se recalcula (sin registrar el vuelo)
+            return self._compute(
+                key, _Flight(), factory, ttl_seconds, tags, stale_ttl_seconds, negative_ttl_seconds
+            )
+        return flight.value
+
+    def _invalidated_during(self, flight: _Flight) -> bool:
+        if not flight.tags or flight.since is None:
+            return False
+        return any(seq > flight.since for seq in self.backend.tag_seqs(flight.tags).values())
 
     def delete_prefix(self, prefix: str):
-        with self._lock:
-            keys = [k for k in self._data.keys() if k.startswith(prefix)]
-            for k in keys:
-                self._data.pop(k, None)
+        self.backend.delete_prefix(prefix)
 
+    def delete_tags(self, *tags: str) -> tuple[int, dict[str, int]]:
+        """Devuelve (nueva generación, generación anterior de cada tag); ver CacheBackend.delete_tags."""
+        return self.backend.delete_tags(tags)
@@ -0,0 +1,373 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Iterable
+
+@dataclass
+class CacheItem:
+    value: Any
+    expires_at: float
+    tags: tuple[str, ...] = ()
+    seq: int = 0
+    stale_until: float = 0.0  # > expires_at si se permite servir vencido (stale-while-revalidate)
+
+    @property
+    def evict_at(self) -> float:
+        return max(self.expires_at, self.stale_until)
+
+# generaciones de tags que se recuerdan (un cálculo en curso no abarca tantas invalidaciones)
+TAG_SEQ_WINDOW = 10_000
+
+class CacheBackend:
+    """
+    Almacenamiento detrás de TTLCache.
+    get() devuelve el item aunque esté vencido (puede estar en ventana stale);
+    lo que pasó `evict_at` no se devuelve.
+
+    Generaciones de tags: cada delete_tags() sube un contador global y marca los
+    tags con ese valor. Quien empieza a calcular toma tag_seq() y al guardar pasa
+    `since`: si algún tag del item se invalidó después, set() no guarda (el
+    resultado puede ser de antes de la escritura).
+    """
+
+    def get(self, key: str) -> CacheItem | None:
+        raise NotImplementedError
+
+    def set(self, key: str, item: CacheItem, since: int | None = None) -> bool:
+        """Guarda el item; con `since`, solo si ninguno de sus tags cambió después. True si guardó."""
+        raise NotImplementedError
+
+    def tag_seq(self) -> int:
+        """Contador global de invalidaciones por tag."""
+        raise NotImplementedError
+
+    def tag_seqs(self, tags: Iterable[str]) -> dict[str, int]:
+        """Última invalidación de cada tag (los que no aparecen: nunca o hace mucho)."""
+        raise NotImplementedError
+
+    def delete_prefix(self, prefix: str) -> None:
+        raise NotImplementedError
+
+    def delete_tags(self, tags: Iterable[str]) -> tuple[int, dict[str, int]]:
+        """
+        Borra las keys de `tags` y sube su generación.
+        Devuelve (nueva generación, generación anterior de cada tag; 0 si no había).
+        """
+        raise NotImplementedError
+
+    def sweep(self) -> None:
+        raise NotImplementedError
+
+class MemoryBackend(CacheBackend):
+    """
+    Dict del proceso con TTL + LRU.
+    - get/set/evict en O(1) (OrderedDict en orden de uso)
+    - expiración con un heap (evict_at, seq, key): en cada escritura solo se
+      sacan las entradas ya vencidas, así que el costo es amortizado O(log n)
+    - índice secundario tag -> keys
+    """
+
+    def __init__(self, max_items: int = 2000):
+        self.max_items = max_items
+        self._data: OrderedDict[str, CacheItem] = OrderedDict()
+        self._expiry: list[tuple[float, int, str]] = []
+        self._seq = itertools.count()
+        self._tags: dict[str, set[str]] = {}
+        self._seq_now = 0
+        self._tag_seq: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _now(self) -> float:
+        return time.time()
+
+    def _remove(self, key: str) -> None:
+        item = self._data.pop(key, None)
+        if not item:
+            return
+        for tag in item.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    self._tags.pop(tag, None)
+
+    def _expire(self) -> None:
+        now = self._now()
+        while self._expiry and self._expiry[0][0] <= now:
+            _, seq, key = heapq.heappop(self._expiry)
+            item = self._data.get(key)
+            # la entrada del heap puede ser vieja (key reescrita o ya borrada)
+            if item is not None and item.seq == seq:
+                self._remove(key)
+
+        # el heap acumula entradas viejas si se reescriben keys: compactar de vez en cuando
+        if len(self._expiry) > 2 * len(self._data) + 64:
+            self._expiry = [(v.evict_at, v.seq, k) for k, v in self._data.items()]
+            heapq.heapify(self._expiry)
+
+    def _evict(self) -> None:
+        # LRU: lo menos usado está al principio
+        while len(self._data) > self.max_items:
+            self._remove(next(iter(self._data)))
+
+    def get(self, key: str) -> CacheItem | None:
+        with self._lock:
+            item = self._data.get(key)
+            if not item:
+                return None
+            if item.evict_at <= self._now():
+                self._remove(key)
+                return None
+            self._data.move_to_end(key)
+            return item
+
+    def _changed_since(self, tags: Iterable[str], since: int) -> bool:
+        return any(self._tag_seq.get(t, 0) > since for t in tags)
+
+    def set(self, key: str, item: CacheItem, since: int | None = None) -> bool:
+        with self._lock:
+            if since is not None and self._changed_since(item.tags, since):
+                return False
+            self._expire()
+            self._remove(key)
+            item.seq = next(self._seq)
+            self._data[key] = item
+            heapq.heappush(self._expiry, (item.evict_at, item.seq, key))
+            for tag in item.tags:
+                self._tags.setdefault(tag, set()).add(key)
+            self._evict()
+            return True
+
+    def tag_seq(self) -> int:
+        with self._lock:
+            return self._seq_now
+
+    def tag_seqs(self, tags: Iterable[str]) -> dict[str, int]:
+        with self._lock:
+            return {t: self._tag_seq[t] for t in tags if t in self._tag_seq}
+
+    def delete_prefix(self, prefix: str) -> None:
+        with self._lock:
+            keys = [k for k in self._data.keys() if k.startswith(prefix)]
+            for k in keys:
+                self._remove(k)
+
+    def delete_tags(self, tags: Iterable[str]) -> tuple[int, dict[str, int]]:
+        with self._lock:
+            self._seq_now += 1
+            previous = {}
+            for tag in tags:
+                previous[tag] = self._tag_seq.get(tag, 0)
+                self._tag_seq[tag] = self._seq_now
+                for k in list(self._tags.get(tag, ())):
+                    self._remove(k)
+            if len(self._tag_seq) > TAG_SEQ_WINDOW:
+                floor = self._seq_now - TAG_SEQ_WINDOW
+                self._tag_seq = {t: n for t, n in self._tag_seq.items() if n > floor}
+            return self._seq_now, previous
+
+    def sweep(self) -> None:
+        with self._lock:
+            self._expire()
+
+class SQLiteBackend(CacheBackend):
+    """
+    Cache compartido entre workers del mismo host: un archivo SQLite (WAL).
+    - los valores se guardan con pickle: el archivo y su directorio tienen que ser
+      privados del usuario del proceso (ver _ensure_private)
+    - delete_prefix / delete_tags borran en el archivo, así que la invalidación
+      la ven todos los workers (también las generaciones de tags)
+    - una conexión por hilo (sqlite3 no comparte conexiones entre hilos)
+    """
+
+    SWEEP_EVERY = 256  # escrituras entre limpiezas de vencidos / tope de tamaño
+
+    def __init__(self, path: str, namespace: str = "cache", max_items: int = 2000):
+        self.path = path
+        self.max_items = max_items
+        self._items = f"{namespace}_items"
+        self._tags = f"{namespace}_tags"
+        self._gens = f"{namespace}_tag_gens"  # tag -> seq; la fila tag='' es el contador global
+        self._local = threading.local()
+        self._writes = itertools.count()
+
+        _ensure_private(path)
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self._items} ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL, "
+                "stale_until REAL NOT NULL, evict_at REAL NOT NULL, tags TEXT NOT NULL)"
+            )
+            conn.execute(f"CREATE INDEX IF NOT EXISTS ix_{self._items}_evict ON {self._items} (evict_at)")
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self._tags} (tag TEXT NOT NULL, key TEXT NOT NULL, PRIMARY KEY (tag, key))"
+            )
+            conn.execute(f"CREATE INDEX IF NOT EXISTS ix_{self._tags}_key ON {self._tags} (key)")
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {self._gens} (tag TEXT PRIMARY KEY, seq INTEGER NOT NULL)")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS ix_{self._gens}_seq ON {self._gens} (seq)")
+            conn.execute(f"INSERT OR IGNORE INTO {self._gens} (tag, seq) VALUES ('', 0)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _now(self) -> float:
+        return time.time()
+
+    def _delete_keys(self, conn: sqlite3.Connection, keys: list[str]) -> None:
+        for k in keys:
+            conn.execute(f"DELETE FROM {self._items} WHERE key = ?", (k,))
+            conn.execute(f"DELETE FROM {self._tags} WHERE key = ?", (k,))
+
+    def get(self, key: str) -> CacheItem | None:
+        row = self._conn().execute(
+            f"SELECT value, expires_at, stale_until, tags FROM {self._items} WHERE key = ? AND evict_at > ?",
+            (key, self._now()),
+        ).fetchone()
+        if row is None:
+            return None
+        try:
+            value = pickle.loads(row[0])
+        except Exception:
+            return None
+        tags = tuple(t for t in row[3].split("\n") if t)
+        return CacheItem(value=value, expires_at=row[1], stale_until=row[2], tags=tags)
+
+    def _changed_since(self, conn: sqlite3.Connection, tags: tuple[str, ...], since: int) -> bool:
+        if not tags:
+            return False
+        marks = ",".join("?" * len(tags))
+        return conn.execute(
+            f"SELECT 1 FROM {self._gens} WHERE tag IN ({marks}) AND seq > ? LIMIT 1", (*tags, since)
+        ).fetchone() is not None
+
+    def set(self, key: str, item: CacheItem, since: int | None = None) -> bool:
+        blob = pickle.dumps(item.value, protocol=pickle.HIGHEST_PROTOCOL)
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            # el chequeo va en la misma transacción: una invalidación no se cuela entre medio
+            if since is not None and self._changed_since(conn, item.tags, since):
+                return False
+            conn.execute(f"DELETE FROM {self._tags} WHERE key = ?", (key,))
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self._items} (key, value, expires_at, stale_until, evict_at, tags) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, blob, item.expires_at, item.stale_until, item.evict_at, "\n".join(item.tags)),
+            )
+            conn.executemany(
+                f"INSERT OR IGNORE INTO {self._tags} (tag, key) VALUES (?, ?)",
+                [(tag, key) for tag in item.tags],
+            )
+        if next(self._writes) % self.SWEEP_EVERY == 0:
+            self.sweep()
+        return True
+
+    def tag_seq(self) -> int:
+        return self._conn().execute(f"SELECT seq FROM {self._gens} WHERE tag = ''").fetchone()[0]
+
+    def tag_seqs(self, tags: Iterable[str]) -> dict[str, int]:
+        tags = list(tags)
+        if not tags:
+            return {}
+        marks = ",".join("?" * len(tags))
+        return dict(self._conn().execute(f"SELECT tag, seq FROM {self._gens} WHERE tag IN ({marks})", tags))
+
+    def delete_prefix(self, prefix: str) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            # rango por PK en vez de LIKE (no escanea la tabla)
+            keys = [
+                r[0]
+                for r in conn.execute(
+                    f"SELECT key FROM {self._items} WHERE key >= ? AND key < ?",
+                    (prefix, prefix + "\U0010ffff"),
+                )
+            ]
+            self._delete_keys(conn, keys)
+
+    def delete_tags(self, tags: Iterable[str]) -> tuple[int, dict[str, int]]:
+        tags = list(tags)
+        if not tags:
+            return self.tag_seq(), {}
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            marks = ",".join("?" * len(tags))
+            keys = [r[0] for r in conn.execute(f"SELECT DISTINCT key FROM {self._tags} WHERE tag IN ({marks})", tags)]
+            self._delete_keys(conn, keys)
+            previous = {t: 0 for t in tags}
+            previous.update(conn.execute(f"SELECT tag, seq FROM {self._gens} WHERE tag IN ({marks})", tags))
+            conn.execute(f"UPDATE {self._gens} SET seq = seq + 1 WHERE tag = ''")
+            seq = conn.execute(f"SELECT seq FROM {self._gens} WHERE tag = ''").fetchone()[0]
+            conn.executemany(
+                f"INSERT OR REPLACE INTO {self._gens} (tag, seq) VALUES (?, ?)", [(tag, seq) for tag in tags]
+            )
+        return seq, previous
+
+    def sweep(self) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            keys = [r[0] for r in conn.execute(f"SELECT key FROM {self._items} WHERE evict_at <= ?", (self._now(),))]
+            count = conn.execute(f"SELECT count(*) FROM {self._items}").fetchone()[0] - len(keys)
+            if count > self.max_items:
+                # tope de tamaño: se van primero las que vencen antes
+                keys += [
+                    r[0]
+                    for r in conn.execute(
+                        f"SELECT key FROM {self._items} WHERE evict_at > ? ORDER BY evict_at LIMIT ?",
+                        (self._now(), count - self.max_items),
+                    )
+                ]
+            self._delete_keys(conn, keys)
+            conn.execute(
+                f"DELETE FROM {self._gens} WHERE tag != '' AND seq <= "
+                f"(SELECT seq FROM {self._gens} WHERE tag = '') - ?",
+                (TAG_SEQ_WINDOW,),
+            )
+
+def _ensure_private(path: str) -> None:
+    """
+    pickle.loads ejecuta código: si otro usuario puede escribir el archivo (o el
+    directorio, donde SQLite crea -wal / -shm) puede ejecutar código en la API.
+    Crea el directorio con 0700 y el archivo con 0600; si ya existen tienen que ser
+    del usuario del proceso y no escribibles por grupo / otros.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    if not hasattr(os, "getuid"):
+        return  # Windows: sin dueño / modo POSIX
+    uid = os.getuid()
+    for p in (directory, path):
+        try:
+            st = os.lstat(p)
+        except FileNotFoundError:
+            continue
+        if st.st_uid != uid or st.st_mode & 0o022:
+            raise RuntimeError(f"Cache path {p} must be owned by uid {uid} and not writable by group/others")
+    os.close(os.open(path, os.O_CREAT | os.O_WRONLY, 0o600))
+
+def backend_from_settings(namespace: str, max_items: int) -> CacheBackend:
+    """CACHE_BACKEND=memory (por proceso) | sqlite (compartido entre workers vía CACHE_PATH)."""
+    from app.core.config import settings
+
+    if settings.CACHE_BACKEND == "sqlite":
+        # CACHE_PATH es obligatorio con sqlite (lo valida Settings): nada de /tmp por defecto
+        return SQLiteBackend(settings.CACHE_PATH, namespace=namespace, max_items=max_items)
+    return MemoryBackend(max_items=max_items)
@@ -1,14 +1,26 @@
 import os
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from pydantic import field_validator
+from pydantic import field_validator, model_validator
 
 class Settings(BaseSettings):
     DATABASE_URL: str
+    # Réplica de lectura opcional (dashboard / catálogo público). Sin valor = todo al primario.
+    DATABASE_READ_URL: str | None = None
+    READ_YOUR_WRITES_SECONDS: int = 15  # tras reservar, ese cliente lee del primario
     JWT_SECRET: str
     JWT_ALG: str = "HS256"
     ACCESS_TOKEN_MINUTES: int = 60
 
+    # DB / pool de conexiones (por worker)
+    DB_ECHO: bool = False  # loguea cada SQL: solo para desarrollo
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30  # segundos esperando una conexión libre
+    DB_POOL_RECYCLE: int = 1800  # segundos; evita conexiones cortadas por el servidor/proxy
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_TIMEOUT_MS: int | None = None  # Postgres statement_timeout; None = sin límite
+
     # Business
     TIMEZONE: str = "America/Santo_Domingo"
     CURRENCY: str = "DOP"
@@ -38,11 +50,24 @@ class Settings(BaseSettings):
     MEDIA_ROOT: str = "media"
     MEDIA_URL_PREFIX: str = "/media"  # ruta pública
 
+    # Cache: "memory" (por proceso) | "sqlite" (archivo compartido entre workers)
+    CACHE_BACKEND: str = "memory"
+    CACHE_PATH: str | None = None  # obligatorio con sqlite; directorio privado del usuario de la API
+    # Dashboard: rangos que incluyen hoy vs rangos de días cerrados (se invalidan por escrituras)
+    DASHBOARD_CACHE_LIVE_SECONDS: int = 30
+    DASHBOARD_CACHE_PAST_SECONDS: int = 60 * 60 * 24 * 30
+
     @field_validator("CORS_ORIGINS")
     @classmethod
     def validate_cors(cls, v: str) -> str:
         return v
 
+    @model_validator(mode="after")
+    def validate_cache_path(self) -> "Settings":
+        if self.CACHE_BACKEND == "sqlite" and not self.CACHE_PATH:
+            raise ValueError("CACHE_PATH is required when CACHE_BACKEND=sqlite")
+        return self
+
     def cors_origins_list(self) -> list[str]:
         return [o.strip() for o in self.CORS_ORIGINS.split(",") if o.strip()]
 
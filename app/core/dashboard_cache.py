@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import functools
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Callable, Iterable
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import event
+from sqlalchemy.inspection import inspect
+from sqlalchemy.orm import Session, object_session
+
+from app.core.cache import TTLCache
+from app.core.cache_backends import backend_from_settings
+from app.core.config import settings
+from app.models.appointment import Appointment
+from app.models.cash import CashEntry
+
+# Respuestas del dashboard:
+# - rango solo con días cerrados: no cambian -> TTL largo, tags por mes
+# - rango que incluye hoy (o futuro): TTL corto + tag "live"
+# Escribir un pago / cambiar una cita invalida "live" si el día es hoy o futuro,
+# o el mes del día si es un día pasado (pago con fecha atrasada, cita de ayer marcada DONE).
+# Con réplica (DATABASE_READ_URL) los endpoints leen de ella: durante
+# READ_YOUR_WRITES_SECONDS después de invalidar un tag lo recalculado no se guarda
+# (la réplica puede no tener todavía la escritura).
+dashboard_cache = TTLCache(
+    ttl_seconds=settings.DASHBOARD_CACHE_LIVE_SECONDS,
+    max_items=2000,
+    backend=backend_from_settings("dashboard", 2000),
+)
+
+LIVE_TAG = "dashboard:live"
+ALL_TAG = "dashboard:all"  # en todas las entradas: vaciado completo (p.ej. tras reconstruir el rollup)
+
+_RECENT_PREFIX = "recent:"  # marcas "tag invalidado hace poco" (sin tags, TTL = ventana de la réplica)
+
+_PENDING_DAYS = "dashboard_cache_days"  # session.info: días tocados en la transacción
+
+def _today() -> date:
+    return datetime.now(ZoneInfo(settings.TIMEZONE)).date()
+
+def _local_day(dt: datetime) -> date:
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(ZoneInfo(settings.TIMEZONE)).date()
+
+def month_tag(day: date) -> str:
+    return f"dashboard:month:{day:%Y-%m}"
+
+def _tags_for_range(from_day: date, to_day: date, today: date) -> list[str]:
+    tags = [ALL_TAG] + ([LIVE_TAG] if to_day >= today else [])
+    last_closed = min(to_day, today - timedelta(days=1))
+    y, m = from_day.year, from_day.month
+    while (y, m) <= (last_closed.year, last_closed.month):
+        tags.append(month_tag(date(y, m, 1)))
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    return tags
+
+def _tags_for_days(days: Iterable[date]) -> set[str]:
+    today = _today()
+    return {LIVE_TAG if d >= today else month_tag(d) for d in days}
+
+def _invalidate(tags: set[str]) -> None:
+    if not tags:
+        return
+    dashboard_cache.delete_tags(*tags)
+    if settings.DATABASE_READ_URL:
+        for tag in tags:
+            dashboard_cache.set(_RECENT_PREFIX + tag, True, ttl_seconds=settings.READ_YOUR_WRITES_SECONDS)
+
+def _recently_invalidated(tags: list[str]) -> bool:
+    return bool(settings.DATABASE_READ_URL) and any(
+        dashboard_cache.get(_RECENT_PREFIX + tag) for tag in tags
+    )
+
+def invalidate_dashboard_days(days: Iterable[date]) -> None:
+    _invalidate(_tags_for_days(days))
+
+def invalidate_dashboard_range(from_day: date | None, to_day: date | None) -> None:
+    """Días [from_day, to_day]; sin alguno de los extremos, todo el cache del dashboard."""
+    if from_day is None or to_day is None:
+        _invalidate({ALL_TAG})
+    else:
+        _invalidate(_tags_for_days(from_day + timedelta(days=i) for i in range((to_day - from_day).days + 1)))
+
+def _kwargs_range(kwargs: dict) -> tuple[date, date]:
+    return kwargs["from_day"], kwargs["to_day"]
+
+def dashboard_cached(name: str, day_range: Callable[[dict], tuple[date, date]] = _kwargs_range):
+    """
+    Decorador para endpoints async del dashboard (se pone debajo de @router.get).
+    La key incluye el día de hoy: a medianoche "hoy" pasa a ser día cerrado y se recalcula.
+    Un resultado calculado mientras se invalidaban sus tags no se guarda
+    (generaciones en el backend: vale también con CACHE_BACKEND=sqlite).
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(**kwargs):
+            from_day, to_day = day_range(kwargs)
+            if to_day < from_day:
+                return await fn(**kwargs)  # el endpoint responde el 400
+
+            today = _today()
+            params = {k: v for k, v in kwargs.items() if k not in ("db", "request")}
+            key = f"dash:{name}:{today}:" + "&".join(f"{k}={params[k]}" for k in sorted(params))
+
+            cached = dashboard_cache.get(key)
+            if cached is not None:
+                return cached
+
+            since = dashboard_cache.tag_seq()
+            value = await fn(**kwargs)
+
+            tags = _tags_for_range(from_day, to_day, today)
+            if _recently_invalidated(tags):
+                return value  # la réplica puede estar atrasada: se sirve pero no se guarda
+
+            live = to_day >= today
+            dashboard_cache.set(
+                key,
+                value,
+                ttl_seconds=settings.DASHBOARD_CACHE_LIVE_SECONDS if live else settings.DASHBOARD_CACHE_PAST_SECONDS,
+                tags=tags,
+                since=since,
+            )
+            return value
+
+        return wrapper
+
+    return decorator
+
+# ---------------------------
+# Invalidación por escrituras (después del commit)
+# ---------------------------
+def touch_dashboard_days(db: Session, dts: Iterable[datetime | None]) -> None:
+    """
+    Anota los días locales de `dts` para invalidarlos cuando la transacción haga commit.
+    Los INSERTs masivos (sin listeners del mapper) lo llaman a mano.
+    """
+    db.info.setdefault(_PENDING_DAYS, set()).update(_local_day(dt) for dt in dts if dt is not None)
+
+def _touch(target, *dts: datetime | None) -> None:
+    session = object_session(target)
+    if session is not None:
+        touch_dashboard_days(session, dts)
+
+def _before(target, key: str) -> Any:
+    hist = inspect(target).attrs[key].history
+    return hist.deleted[0] if hist.deleted else getattr(target, key)
+
+def _appointment_written(mapper, connection, target: Appointment):
+    _touch(target, _before(target, "start_at"), target.start_at)
+
+def _appointment_updated(mapper, connection, target: Appointment):
+    insp = inspect(target)
+    if any(insp.attrs[k].history.has_changes() for k in ("status", "start_at", "service_id", "employee_user_id")):
+        _appointment_written(mapper, connection, target)
+
+def _cash_written(mapper, connection, target: CashEntry):
+    # created_at tiene server_default (now()): si el INSERT no lo devolvió, el día es hoy
+    hist = inspect(target).attrs.created_at.history
+    _touch(
+        target,
+        hist.deleted[0] if hist.deleted else None,
+        inspect(target).dict.get("created_at") or datetime.now(timezone.utc),
+    )
+
+def _after_commit(session: Session):
+    days = session.info.pop(_PENDING_DAYS, None)
+    if days:
+        invalidate_dashboard_days(days)
+
+def _after_rollback(session: Session):
+    session.info.pop(_PENDING_DAYS, None)
+
+def register_dashboard_cache_listeners():
+    event.listen(Appointment, "after_insert", _appointment_written)
+    event.listen(Appointment, "after_update", _appointment_updated)
+    event.listen(Appointment, "after_delete", _appointment_written)
+    event.listen(CashEntry, "after_insert", _cash_written)
+    event.listen(CashEntry, "after_update", _cash_written)
+    event.listen(CashEntry, "after_delete", _cash_written)
+    event.listen(Session, "after_commit", _after_commit)
+    event.listen(Session, "after_rollback", _after_rollback)
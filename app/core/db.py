@@ -1,10 +1,64 @@
+import time
+
+from fastapi import Request, Response
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 from app.core.config import settings
+from app.core.db_metrics import InstrumentedQueuePool, InstrumentedAsyncQueuePool
+
+def _engine_kwargs(url: str) -> dict:
+    kwargs = dict(
+        echo=settings.DB_ECHO,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+    )
+    if settings.DB_STATEMENT_TIMEOUT_MS and url.startswith("postgresql"):
+        # se aplica por conexión: corta queries colgadas en el servidor
+        kwargs["connect_args"] = {"options": f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"}
+    return kwargs
+
+def make_engine(url: str, **overrides) -> Engine:
+    """
+    Engine configurado desde Settings (DB_*).
+    `overrides` pisa cualquier kwarg de create_engine (p.ej. scripts con echo=True).
+    """
+    kwargs = dict(_engine_kwargs(url), future=True, poolclass=InstrumentedQueuePool)
+    kwargs.update(overrides)
+    return create_engine(url, **kwargs)
 
-engine = create_engine(settings.DATABASE_URL, echo=True, future=True)
+def make_async_engine(url: str, **overrides) -> AsyncEngine:
+    """
+    Igual que make_engine, para AsyncSession.
+    Con postgresql+psycopg SQLAlchemy usa el modo async de psycopg3 (mismo driver).
+    """
+    kwargs = dict(_engine_kwargs(url), poolclass=InstrumentedAsyncQueuePool)
+    kwargs.update(overrides)
+    return create_async_engine(url, **kwargs)
+
+engine = make_engine(settings.DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = make_async_engine(settings.DATABASE_URL)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+# Réplica de lectura (opcional): si no hay DATABASE_READ_URL se usan los mismos engines
+if settings.DATABASE_READ_URL:
+    read_engine = make_engine(settings.DATABASE_READ_URL)
+    async_read_engine = make_async_engine(settings.DATABASE_READ_URL)
+else:
+    read_engine = engine
+    async_read_engine = async_engine
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+AsyncReadSessionLocal = async_sessionmaker(async_read_engine, autoflush=False, expire_on_commit=False)
+
+READ_YOUR_WRITES_COOKIE = "ryw_until"
+READ_YOUR_WRITES_HEADER = "X-Read-Your-Writes"
+
 class Base(DeclarativeBase):
     pass
 
@@ -13,4 +67,45 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    """Para handlers `async def`: no ocupa un hilo del threadpool mientras espera a Postgres."""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def mark_read_your_writes(response: Response) -> None:
+    """
+    Después de una escritura del cliente (p.ej. reservar): durante
+    READ_YOUR_WRITES_SECONDS sus lecturas van al primario (la réplica puede ir atrasada).
+    """
+    until = int(time.time()) + settings.READ_YOUR_WRITES_SECONDS
+    response.set_cookie(
+        READ_YOUR_WRITES_COOKIE,
+        str(until),
+        max_age=settings.READ_YOUR_WRITES_SECONDS,
+        httponly=True,
+        samesite="lax",
+    )
+
+def wants_primary(request: Request) -> bool:
+    """Header `X-Read-Your-Writes: 1` o cookie de mark_read_your_writes vigente."""
+    if request.headers.get(READ_YOUR_WRITES_HEADER, "").lower() in ("1", "true", "yes"):
+        return True
+    try:
+        return int(request.cookies.get(READ_YOUR_WRITES_COOKIE, "0")) > time.time()
+    except ValueError:
+        return False
+
+def get_read_db(request: Request):
+    """Como get_db, pero contra la réplica (salvo read-your-writes)."""
+    db = SessionLocal() if wants_primary(request) else ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_read_db(request: Request):
+    factory = AsyncSessionLocal if wants_primary(request) else AsyncReadSessionLocal
+    async with factory() as db:
+        yield db
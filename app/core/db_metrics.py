@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool, QueuePool
+
+class PoolMetrics:
+    """
+    Métricas del pool de conexiones (por proceso):
+    - cuánto se espera para obtener una conexión (checkout)
+    - cuántos checkouts terminaron en timeout
+    """
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._waits: deque[float] = deque(maxlen=window)  # últimas esperas (segundos)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record_wait(self, seconds: float) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            self._waits.append(seconds)
+
+    def record_timeout(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self._waits.clear()
+            self.checkouts = 0
+            self.timeouts = 0
+            self.wait_total = 0.0
+            self.wait_max = 0.0
+
+    def snapshot(self, pool: Pool | None = None) -> dict:
+        with self._lock:
+            waits = sorted(self._waits)
+            out = {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_ms_avg": round(self.wait_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "wait_ms_max": round(self.wait_max * 1000, 3),
+                "wait_ms_p95_recent": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 3)
+                if waits
+                else 0.0,
+            }
+
+        if isinstance(pool, QueuePool):
+            out.update(
+                {
+                    "pool_size": pool.size(),
+                    "checked_out": pool.checkedout(),
+                    "checked_in": pool.checkedin(),
+                    "overflow": max(pool.overflow(), 0),
+                    "max_overflow": pool._max_overflow,
+                }
+            )
+        return out
+
+pool_metrics = PoolMetrics()
+async_pool_metrics = PoolMetrics()
+
+class _TimedCheckout:
+    """Mide el tiempo de espera de cada checkout del pool."""
+
+    metrics: PoolMetrics
+
+    def _do_get(self):
+        t0 = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except PoolTimeoutError:
+            self.metrics.record_timeout()
+            raise
+        self.metrics.record_wait(time.perf_counter() - t0)
+        return conn
+
+class InstrumentedQueuePool(_TimedCheckout, QueuePool):
+    metrics = pool_metrics
+
+class InstrumentedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    metrics = async_pool_metrics
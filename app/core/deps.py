@@ -1,16 +1,17 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from fastapi import Request
 from app.core.audit_context import current_actor_user_id
-from app.core.db import get_db
+from app.core.db import get_db, get_async_db
 from app.core.config import settings
 from app.models.user import User
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
-def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)) -> User:
+def _token_user_id(token: str) -> int:
     try:
         payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALG])
         user_id: str | None = payload.get("sub")
@@ -18,8 +19,17 @@ def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_
             raise JWTError("missing sub")
     except JWTError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    return int(user_id)
+
+def _check_role(user: User, roles: tuple[str, ...]) -> None:
+    user_role = user.role.value if hasattr(user.role, "value") else str(user.role)
+    if user_role not in roles:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)) -> User:
+    user_id = _token_user_id(token)
 
-    user = db.get(User, int(user_id))
+    user = db.get(User, user_id)
     if not user or not user.is_active:
         raise HTTPException(status_code=401, detail="User not found or inactive")
 
@@ -31,8 +41,24 @@ def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_
 
 def require_roles(*roles: str):
     def _guard(user: User = Depends(get_current_user)) -> User:
-        user_role = user.role.value if hasattr(user.role, "value") else str(user.role)
-        if user_role not in roles:
-            raise HTTPException(status_code=403, detail="Forbidden")
+        _check_role(user, roles)
+        return user
+    return _guard
+
+# --- versiones async (handlers con get_async_db) ---
+
+async def get_current_user_async(
+    db: AsyncSession = Depends(get_async_db), token: str = Depends(oauth2_scheme)
+) -> User:
+    user = await db.get(User, _token_user_id(token))
+    if not user or not user.is_active:
+        raise HTTPException(status_code=401, detail="User not found or inactive")
+
+    db.info["actor_user_id"] = user.id
+    return user
+
+def require_roles_async(*roles: str):
+    async def _guard(user: User = Depends(get_current_user_async)) -> User:
+        _check_role(user, roles)
         return user
     return _guard
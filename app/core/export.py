@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import csv
+import io
+import re
+import zipfile
+from typing import Iterable, Iterator, Sequence
+from xml.sax.saxutils import escape
+
+from fastapi.responses import StreamingResponse
+
+# Exportes (CSV / XLSX) generados por lotes: cada lote de filas se convierte
+# y se entrega al cliente antes de leer el siguiente (memoria constante).
+Batches = Iterable[Sequence[Sequence]]
+
+CSV_MEDIA_TYPE = "text/csv; charset=utf-8"
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+def full_name(first: str | None, last: str | None) -> str | None:
+    return f"{first or ''} {last or ''}".strip() or None
+
+# una celda de texto que empieza así Excel / Sheets la toma como fórmula (CSV injection)
+_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+def csv_safe(value):
+    """Textos que parecen fórmula van con ' adelante (nombres / notas los escribe el cliente)."""
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+def csv_stream(header: Sequence[str], batches: Batches) -> Iterator[bytes]:
+    """CSV UTF-8 con BOM (Excel lo abre con acentos bien)."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(header)
+    yield ("\ufeff" + buf.getvalue()).encode()
+    for batch in batches:
+        buf.seek(0)
+        buf.truncate()
+        writer.writerows([csv_safe(v) for v in row] for row in batch)
+        yield buf.getvalue().encode()
+
+class _Sink:
+    """Destino no seekable para ZipFile: acumula lo escrito hasta que se drena."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        out = b"".join(self._chunks)
+        self._chunks.clear()
+        return out
+
+# caracteres de control que XML 1.0 no admite (rompen el .xlsx)
+_XML_INVALID = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+def _col_ref(idx: int) -> str:
+    """0 -> A, 25 -> Z, 26 -> AA"""
+    ref = ""
+    idx += 1
+    while idx:
+        idx, rem = divmod(idx - 1, 26)
+        ref = chr(65 + rem) + ref
+    return ref
+
+def _xlsx_row(n: int, values: Sequence) -> str:
+    cells = []
+    for i, v in enumerate(values):
+        ref = f"{_col_ref(i)}{n}"
+        if v is None:
+            continue
+        if isinstance(v, bool):
+            cells.append(f'<c r="{ref}" t="b"><v>{int(v)}</v></c>')
+        elif isinstance(v, (int, float)):
+            cells.append(f'<c r="{ref}"><v>{v}</v></c>')
+        else:
+            cells.append(f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{escape(_XML_INVALID.sub("", str(v)))}</t></is></c>')
+    return f'<row r="{n}">{"".join(cells)}</row>'
+
+_XLSX_STATIC = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+def _workbook_xml(sheet_name: str) -> str:
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        f'<sheets><sheet name="{escape(sheet_name[:31])}" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    )
+
+def xlsx_stream(header: Sequence[str], batches: Batches, sheet_name: str = "Reporte") -> Iterator[bytes]:
+    """
+    XLSX mínimo (una hoja, inline strings, sin estilos) escrito fila por fila
+    dentro de un zip que se va entregando a medida que se comprime.
+    Los textos van como inlineStr, nunca como fórmula (no hace falta csv_safe).
+    """
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for name, body in _XLSX_STATIC.items():
+            zf.writestr(name, body)
+        zf.writestr("xl/workbook.xml", _workbook_xml(sheet_name))
+        yield sink.drain()
+
+        with zf.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            sheet.write(_xlsx_row(1, header).encode())
+            n = 1
+            for batch in batches:
+                rows = []
+                for values in batch:
+                    n += 1
+                    rows.append(_xlsx_row(n, values))
+                sheet.write("".join(rows).encode())
+                yield sink.drain()
+            sheet.write(b"</sheetData></worksheet>")
+    yield sink.drain()
+
+def export_response(fmt: str, filename: str, header: Sequence[str], batches: Batches) -> StreamingResponse:
+    """`filename` sin extensión; se agrega según `fmt` (csv | xlsx)."""
+    if fmt == "xlsx":
+        body, media_type = xlsx_stream(header, batches), XLSX_MEDIA_TYPE
+    else:
+        body, media_type = csv_stream(header, batches), CSV_MEDIA_TYPE
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'},
+    )
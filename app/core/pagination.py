@@ -1,15 +1,183 @@
+import base64
+import hashlib
+import json
+from datetime import date, datetime
+from typing import Literal
+
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import Session
-from sqlalchemy import select, func
+from sqlalchemy import select, func, literal, tuple_
 from sqlalchemy.sql import Select
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from app.core.cache import TTLCache
+
+# ---------------------------
+# Total exacto / estimado / sin total
+# ---------------------------
+
+TotalMode = Literal["exact", "estimate", "none"]
+
+# counts exactos por filtro (misma SQL + mismos params), TTL corto
+count_cache = TTLCache(ttl_seconds=15, max_items=2000)
+
+class ExplainJSON(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, stmt: Select):
+        self.stmt = stmt
+
+@compiles(ExplainJSON, "postgresql")
+def _compile_explain(element, compiler, **kw):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.stmt, **kw)
+
+def _can_estimate(db: Session | AsyncSession) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+def _plan_rows(plan) -> int:
+    """Filas estimadas por el planner (nodo raíz del EXPLAIN)."""
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+def _count_stmt(stmt: Select):
+    return select(func.count()).select_from(stmt.order_by(None).subquery())
+
+def _count_key(db: Session | AsyncSession, stmt: Select) -> str:
+    compiled = stmt.compile(dialect=db.get_bind().dialect)
+    raw = str(compiled) + repr(sorted(compiled.params.items()))
+    return "count:" + hashlib.sha1(raw.encode()).hexdigest()
+
+def _page_out(items, page: int, size: int, total: int | None, total_mode: TotalMode) -> dict:
+    has_next = len(items) > size
+    return {
+        "items": items[:size],
+        "page": page,
+        "size": size,
+        "total": total,
+        "has_next": has_next,
+        "total_is_estimate": total_mode == "estimate" and total is not None,
+    }
+
+def paginate_page(
+    db: Session, stmt: Select, page: int, size: int, total_mode: TotalMode = "exact", mappings: bool = False
+) -> dict:
+    """
+    Página de `stmt` con total configurable:
+    - exact: count(*) (cacheado unos segundos por filtro)
+    - estimate: filas estimadas por el planner de Postgres (EXPLAIN), sin recorrer la tabla
+    - none: sin total
+    Siempre trae size+1 filas para `has_next`. Devuelve los campos de Page.
+    """
+    if total_mode == "estimate" and not _can_estimate(db):
+        total_mode = "exact"
+
+    total = None
+    if total_mode == "exact":
+        total = count_cache.get_or_set(_count_key(db, stmt), lambda: db.execute(_count_stmt(stmt)).scalar_one())
+    elif total_mode == "estimate":
+        total = _plan_rows(db.execute(ExplainJSON(stmt.order_by(None))).scalar_one())
+
+    result = db.execute(stmt.offset((page - 1) * size).limit(size + 1))
+    items = result.mappings().all() if mappings else result.scalars().all()
+    return _page_out(items, page, size, total, total_mode)
 
 def paginate(db: Session, stmt: Select, page: int, size: int):
-    offset = (page - 1) * size
+    """(items, total) con total exacto: interfaz de antes, sobre paginate_page."""
+    out = paginate_page(db, stmt, page, size)
+    return out["items"], out["total"]
+
+async def apaginate_page(
+    db: AsyncSession, stmt: Select, page: int, size: int, total_mode: TotalMode = "exact", mappings: bool = False
+) -> dict:
+    """Versión async de paginate_page."""
+    if total_mode == "estimate" and not _can_estimate(db):
+        total_mode = "exact"
+
+    total = None
+    if total_mode == "exact":
+        key = _count_key(db, stmt)
+        total = count_cache.get(key)
+        if total is None:
+            total = (await db.execute(_count_stmt(stmt))).scalar_one()
+            count_cache.set(key, total)
+    elif total_mode == "estimate":
+        total = _plan_rows((await db.execute(ExplainJSON(stmt.order_by(None)))).scalar_one())
+
+    result = await db.execute(stmt.offset((page - 1) * size).limit(size + 1))
+    items = result.mappings().all() if mappings else result.scalars().all()
+    return _page_out(items, page, size, total, total_mode)
+
+# ---------------------------
+# Keyset (cursor)
+# ---------------------------
+
+def _encode_value(v):
+    if isinstance(v, datetime):
+        return {"dt": v.isoformat()}
+    if isinstance(v, date):
+        return {"d": v.isoformat()}
+    return v
+
+def _decode_value(v):
+    if isinstance(v, dict):
+        if "dt" in v:
+            return datetime.fromisoformat(v["dt"])
+        if "d" in v:
+            return date.fromisoformat(v["d"])
+        raise ValueError("bad cursor value")
+    return v
+
+def encode_cursor(values: list) -> str:
+    raw = json.dumps([_encode_value(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(token: str) -> list:
+    raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+    values = json.loads(raw)
+    if not isinstance(values, list):
+        raise ValueError("bad cursor")
+    return [_decode_value(v) for v in values]
+
+def _python_type(col) -> type:
+    try:
+        return col.type.python_type
+    except NotImplementedError:
+        return object
+
+def keyset_paginate(db: Session, stmt: Select, keys: list, cursor: str | None, size: int, descending: bool = False):
+    """
+    Paginación por cursor (sin OFFSET ni count):
+    - `keys`: columnas del orden, la última debe ser única (p.ej. [start_at, id])
+    - `cursor`: token opaco de la página anterior ("" o None = primera página)
+    Devuelve (items, next_cursor); next_cursor es None en la última página.
+    """
+    stmt = stmt.order_by(None).order_by(*[k.desc() if descending else k.asc() for k in keys])
+
+    if cursor:
+        try:
+            values = decode_cursor(cursor)
+            if len(values) != len(keys) or not all(
+                isinstance(v, _python_type(k)) for k, v in zip(keys, values)
+            ):
+                raise ValueError("bad cursor")
+        except ValueError:
+            raise HTTPException(400, "Invalid cursor")
+        # binds con el tipo de cada columna (tz de timestamps, enums, etc.)
+        values = [literal(v, k.type) for k, v in zip(keys, values)]
+        row_key = tuple_(*keys) if len(keys) > 1 else keys[0]
+        row_val = tuple_(*values) if len(keys) > 1 else values[0]
+        stmt = stmt.where(row_key < row_val if descending else row_key > row_val)
 
-    # total
-    total_stmt = select(func.count()).select_from(stmt.subquery())
-    total = db.execute(total_stmt).scalar_one()
+    # size + 1 para saber si hay otra página
+    items = db.execute(stmt.limit(size + 1)).scalars().all()
 
-    # items
-    items = db.execute(stmt.offset(offset).limit(size)).scalars().all()
+    next_cursor = None
+    if len(items) > size:
+        items = items[:size]
+        last = items[-1]
+        next_cursor = encode_cursor([getattr(last, k.key) for k in keys])
 
-    return items, total
+    return items, next_cursor
@@ -1,4 +1,28 @@
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
+
 from app.core.cache import TTLCache
+from app.core.cache_backends import backend_from_settings
+from app.core.config import settings
 
 # 60s por defecto. Puedes subir a 120 si quieres.
-public_cache = TTLCache(ttl_seconds=60, max_items=5000)
+# Con varios workers usar CACHE_BACKEND=sqlite: se calcula una vez y la invalidación llega a todos.
+public_cache = TTLCache(ttl_seconds=60, max_items=5000, backend=backend_from_settings("public", 5000))
+
+# "no existe" (p.ej. service_id inválido) se cachea poco tiempo
+NEGATIVE_TTL_SECONDS = 15
+
+def availability_tag(day: date, employee_user_id: int) -> str:
+    return f"avail:day={day}:emp={employee_user_id}"
+
+def availability_tags(day: date, employee_user_ids) -> list[str]:
+    return [availability_tag(day, eid) for eid in employee_user_ids]
+
+def invalidate_availability(employee_user_id: int, *starts: datetime) -> None:
+    """
+    Invalida solo las entradas de disponibilidad del empleado en los días
+    (locales) de `starts` (p.ej. fecha vieja y nueva al reprogramar).
+    Un get_or_set que estaba calculando esos días no guarda su resultado.
+    """
+    tz = ZoneInfo(settings.TIMEZONE)
+    public_cache.delete_tags(*{availability_tag(s.astimezone(tz).date(), employee_user_id) for s in starts})
@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import Date, String, cast, delete, event, func, literal, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.inspection import inspect
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.dashboard_cache import invalidate_dashboard_range
+from app.models.appointment import Appointment
+from app.models.cash import CashEntry
+from app.models.daily_metric import DailyMetric, NO_ID, NO_METHOD, NO_STATUS
+
+# (day, method, status, service_id, employee_user_id) -> [revenue, tickets, appointments]
+Key = tuple[date, str, str, int, int]
+
+_KEY_COLS = ("day", "method", "status", "service_id", "employee_user_id")
+
+def _local_day(dt: datetime) -> date:
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(ZoneInfo(settings.TIMEZONE)).date()
+
+def _value(v) -> str:
+    return v.value if hasattr(v, "value") else str(v)
+
+def _before(target, key: str):
+    """Valor de `key` antes del flush actual (o el actual si no cambió)."""
+    hist = inspect(target).attrs[key].history
+    return hist.deleted[0] if hist.deleted else getattr(target, key)
+
+def _changed(target, *keys: str) -> bool:
+    insp = inspect(target)
+    return any(insp.attrs[k].history.has_changes() for k in keys)
+
+def apply_deltas(connection, deltas: dict[Key, list]) -> None:
+    """Suma los deltas al rollup con UN upsert (ON CONFLICT ... DO UPDATE SET x = x + excluded.x)."""
+    rows = [
+        dict(zip(_KEY_COLS, key), revenue=rev, tickets=tickets, appointments=appts)
+        for key, (rev, tickets, appts) in deltas.items()
+        if rev or tickets or appts
+    ]
+    if not rows:
+        return
+    dialect = postgresql if connection.dialect.name == "postgresql" else sqlite
+    table = DailyMetric.__table__
+    ins = dialect.insert(table).values(rows)
+    connection.execute(
+        ins.on_conflict_do_update(
+            index_elements=list(_KEY_COLS),
+            set_={c: table.c[c] + ins.excluded[c] for c in ("revenue", "tickets", "appointments")},
+        )
+    )
+
+# ---------------------------
+# Citas: conteo por estado
+# ---------------------------
+def _appt_key(start_at, status, service_id, employee_user_id) -> Key:
+    return (_local_day(start_at), NO_METHOD, _value(status), service_id or NO_ID, employee_user_id or NO_ID)
+
+def rollup_appointment_rows(connection, rows: list[dict]) -> None:
+    """Para INSERTs masivos de citas (no disparan los listeners del mapper)."""
+    deltas: dict[Key, list] = defaultdict(lambda: [Decimal(0), 0, 0])
+    for r in rows:
+        deltas[_appt_key(r["start_at"], r["status"], r["service_id"], r["employee_user_id"])][2] += 1
+    apply_deltas(connection, deltas)
+
+def _appt_inserted(mapper, connection, target: Appointment):
+    rollup_appointment_rows(connection, [{
+        "start_at": target.start_at,
+        "status": target.status,
+        "service_id": target.service_id,
+        "employee_user_id": target.employee_user_id,
+    }])
+
+def _appt_updated(mapper, connection, target: Appointment):
+    keys = ("start_at", "status", "service_id", "employee_user_id")
+    if not _changed(target, *keys):
+        return
+    old = _appt_key(*(_before(target, k) for k in keys))
+    new = _appt_key(*(getattr(target, k) for k in keys))
+    if old != new:
+        apply_deltas(connection, {old: [Decimal(0), 0, -1], new: [Decimal(0), 0, 1]})
+
+def _appt_deleted(mapper, connection, target: Appointment):
+    key = _appt_key(*(_before(target, k) for k in ("start_at", "status", "service_id", "employee_user_id")))
+    apply_deltas(connection, {key: [Decimal(0), 0, -1]})
+
+# ---------------------------
+# Caja: monto y tickets por método
+# ---------------------------
+def _cash_key(connection, created_at, method, appointment_id) -> Key:
+    service_id = employee_user_id = NO_ID
+    if appointment_id is not None:
+        row = connection.execute(
+            select(Appointment.service_id, Appointment.employee_user_id).where(Appointment.id == appointment_id)
+        ).first()
+        if row:
+            service_id, employee_user_id = row
+    return (_local_day(created_at), _value(method), NO_STATUS, service_id, employee_user_id)
+
+def _created_at(connection, target: CashEntry) -> datetime:
+    # server_default: si el INSERT no lo devolvió hay que leerlo
+    value = inspect(target).dict.get("created_at")
+    if value is None:
+        value = connection.execute(select(CashEntry.created_at).where(CashEntry.id == target.id)).scalar_one()
+    return value
+
+def _cash_inserted(mapper, connection, target: CashEntry):
+    key = _cash_key(connection, _created_at(connection, target), target.method, target.appointment_id)
+    apply_deltas(connection, {key: [Decimal(str(target.amount)), 1, 0]})
+
+def _cash_updated(mapper, connection, target: CashEntry):
+    keys = ("created_at", "method", "appointment_id")
+    if not _changed(target, "amount", *keys):
+        return
+    deltas: dict[Key, list] = defaultdict(lambda: [Decimal(0), 0, 0])
+    old = deltas[_cash_key(connection, *(_before(target, k) for k in keys))]
+    old[0] -= Decimal(str(_before(target, "amount")))
+    old[1] -= 1
+    new = deltas[_cash_key(connection, _created_at(connection, target), target.method, target.appointment_id)]
+    new[0] += Decimal(str(target.amount))
+    new[1] += 1
+    apply_deltas(connection, deltas)
+
+def _cash_deleted(mapper, connection, target: CashEntry):
+    key = _cash_key(connection, *(_before(target, k) for k in ("created_at", "method", "appointment_id")))
+    apply_deltas(connection, {key: [-Decimal(str(_before(target, "amount"))), -1, 0]})
+
+def register_rollup_listeners():
+    event.listen(Appointment, "after_insert", _appt_inserted)
+    event.listen(Appointment, "after_update", _appt_updated)
+    event.listen(Appointment, "after_delete", _appt_deleted)
+    event.listen(CashEntry, "after_insert", _cash_inserted)
+    event.listen(CashEntry, "after_update", _cash_updated)
+    event.listen(CashEntry, "after_delete", _cash_deleted)
+
+# ---------------------------
+# Reconstrucción (Postgres)
+# ---------------------------
+def _raw_day(col):
+    return cast(func.timezone(settings.TIMEZONE, col), Date)
+
+def rebuild_daily_metrics(
+    db: Session, from_day: date | None = None, to_day: date | None = None, commit: bool = True
+) -> int:
+    """
+    Recalcula el rollup desde cash_entries / appointments para [from_day, to_day]
+    (todo si no se pasa rango). Bloquea daily_metrics contra escrituras mientras
+    corre: los upserts concurrentes esperan y se suman después, sin perderse ni duplicarse.
+    Devuelve la cantidad de filas escritas. Con `commit=False` queda en la transacción del caller.
+
+    Después del commit invalida el rango en el cache del dashboard (con CACHE_BACKEND=sqlite
+    lo ven los workers; con memory el cache es de cada proceso y hay que reiniciarlos).
+    Con `commit=False` eso queda a cargo del caller (invalidate_dashboard_range).
+    """
+    tz = ZoneInfo(settings.TIMEZONE)
+    start = datetime.combine(from_day, time.min, tzinfo=tz) if from_day else None
+    end = datetime.combine(to_day + timedelta(days=1), time.min, tzinfo=tz) if to_day else None
+
+    def in_range(col):
+        conds = []
+        if start is not None:
+            conds.append(col >= start)
+        if end is not None:
+            conds.append(col < end)
+        return conds
+
+    db.execute(text("LOCK TABLE daily_metrics IN EXCLUSIVE MODE"))
+
+    wipe = delete(DailyMetric)
+    if from_day:
+        wipe = wipe.where(DailyMetric.day >= from_day)
+    if to_day:
+        wipe = wipe.where(DailyMetric.day <= to_day)
+    db.execute(wipe)
+
+    cash_day = _raw_day(CashEntry.created_at)
+    cash = (
+        select(
+            cash_day,
+            cast(CashEntry.method, String),
+            literal(NO_STATUS),
+            func.coalesce(Appointment.service_id, NO_ID),
+            func.coalesce(Appointment.employee_user_id, NO_ID),
+            func.sum(CashEntry.amount),
+            func.count(CashEntry.id),
+            literal(0),
+        )
+        .select_from(CashEntry)
+        .join(Appointment, Appointment.id == CashEntry.appointment_id, isouter=True)
+        .where(*in_range(CashEntry.created_at))
+        .group_by(cash_day, CashEntry.method, Appointment.service_id, Appointment.employee_user_id)
+    )
+
+    appt_day = _raw_day(Appointment.start_at)
+    appts = (
+        select(
+            appt_day,
+            literal(NO_METHOD),
+            cast(Appointment.status, String),
+            Appointment.service_id,
+            Appointment.employee_user_id,
+            literal(0),
+            literal(0),
+            func.count(Appointment.id),
+        )
+        .where(*in_range(Appointment.start_at))
+        .group_by(appt_day, Appointment.status, Appointment.service_id, Appointment.employee_user_id)
+    )
+
+    cols = list(_KEY_COLS) + ["revenue", "tickets", "appointments"]
+    written = 0
+    for stmt in (cash, appts):
+        written += db.execute(DailyMetric.__table__.insert().from_select(cols, stmt)).rowcount
+    if commit:
+        db.commit()
+        invalidate_dashboard_range(from_day, to_day)
+    return written
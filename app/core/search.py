@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import unicodedata
+
+from sqlalchemy import bindparam, event, select, or_
+from sqlalchemy.orm import aliased
+from sqlalchemy.inspection import inspect
+
+from app.models.appointment import Appointment
+from app.models.service import Service
+from app.models.user import User
+
+def normalize_search(text: str | None) -> str:
+    """
+    Texto para buscar sin acentos ni mayúsculas: "Núñez  José" -> "nunez jose".
+    Se usa igual al guardar (search_text) y al consultar (q).
+    """
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join(stripped.lower().split())
+
+def appointment_search_text(service_name, customer_first, customer_last, employee_first, employee_last) -> str:
+    return normalize_search(
+        " ".join(p or "" for p in (service_name, customer_first, customer_last, employee_first, employee_last))
+    )
+
+def _search_rows_stmt():
+    Employee = aliased(User)
+    Customer = aliased(User)
+    return (
+        select(
+            Appointment.id,
+            Service.name,
+            Customer.first_name,
+            Customer.last_name,
+            Employee.first_name,
+            Employee.last_name,
+        )
+        .select_from(Appointment)
+        .join(Service, Service.id == Appointment.service_id)
+        .join(Customer, Customer.id == Appointment.customer_user_id)
+        .join(Employee, Employee.id == Appointment.employee_user_id)
+    )
+
+def _names_for(connection, target: Appointment) -> str:
+    service_name = connection.execute(select(Service.name).where(Service.id == target.service_id)).scalar()
+    names = dict(
+        (uid, (first, last))
+        for uid, first, last in connection.execute(
+            select(User.id, User.first_name, User.last_name).where(
+                User.id.in_([target.customer_user_id, target.employee_user_id])
+            )
+        )
+    )
+    customer = names.get(target.customer_user_id, (None, None))
+    employee = names.get(target.employee_user_id, (None, None))
+    return appointment_search_text(service_name, *customer, *employee)
+
+def _set_appointment_search(mapper, connection, target: Appointment):
+    if target.search_text and not any(
+        inspect(target).attrs[k].history.has_changes()
+        for k in ("service_id", "customer_user_id", "employee_user_id")
+    ):
+        return
+    target.search_text = _names_for(connection, target)
+
+def refresh_search_text(connection, where) -> None:
+    """Recalcula search_text de las citas que cumplan `where` (cambio de nombres)."""
+    rows = connection.execute(_search_rows_stmt().where(where)).all()
+    if not rows:
+        return
+    table = Appointment.__table__
+    connection.execute(
+        table.update().where(table.c.id == bindparam("_id")).values(search_text=bindparam("_text")),
+        [{"_id": r[0], "_text": appointment_search_text(*r[1:])} for r in rows],
+    )
+
+def _names_changed(target, *keys) -> bool:
+    insp = inspect(target)
+    return any(insp.attrs[k].history.has_changes() for k in keys)
+
+def _user_updated(mapper, connection, target: User):
+    if _names_changed(target, "first_name", "last_name"):
+        refresh_search_text(
+            connection,
+            or_(Appointment.customer_user_id == target.id, Appointment.employee_user_id == target.id),
+        )
+
+def _service_updated(mapper, connection, target: Service):
+    if _names_changed(target, "name"):
+        refresh_search_text(connection, Appointment.service_id == target.id)
+
+def register_search_listeners():
+    event.listen(Appointment, "before_insert", _set_appointment_search)
+    event.listen(Appointment, "before_update", _set_appointment_search)
+    event.listen(User, "after_update", _user_updated)
+    event.listen(Service, "after_update", _service_updated)
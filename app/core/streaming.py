@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+from typing import Callable, Iterator
+
+from sqlalchemy import Row
+from sqlalchemy.orm import Session
+
+from app.core.db import ReadSessionLocal
+
+STREAM_BATCH_SIZE = 1000
+
+def iter_rows(
+    stmt,
+    batch_size: int = STREAM_BATCH_SIZE,
+    session_factory: Callable[[], Session] = ReadSessionLocal,
+) -> Iterator[list[Row]]:
+    """
+    Ejecuta `stmt` con cursor del lado del servidor (yield_per) y entrega los
+    resultados en lotes de `batch_size` filas: la memoria no depende del rango.
+
+    Abre SU propia sesión: el generador lo consume StreamingResponse cuando
+    el request (y su sesión de get_db) ya terminó.
+    """
+    db = session_factory()
+    try:
+        result = db.execute(stmt.execution_options(yield_per=batch_size))
+        for batch in result.partitions():
+            yield batch
+    finally:
+        db.close()
@@ -1,13 +1,27 @@
+from bisect import bisect_left, insort
 from datetime import timedelta
 from zoneinfo import ZoneInfo
 
+from sqlalchemy import bindparam, insert, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from sqlalchemy import select, and_
 
 from app.core.config import settings
-from app.crud.scheduling_rules import assert_slot_is_valid
+from app.core.dashboard_cache import touch_dashboard_days
+from app.core.rollup import rollup_appointment_rows
+from app.core.search import appointment_search_text
+from app.crud.intervals import Interval, merge_intervals
+from app.crud.recurrence import expand_rrule, parse_rrule
+from app.crud.scheduling_rules import (
+    assert_slot_is_valid,
+    check_slot_rules,
+    load_schedule_rules,
+    _weekday_enum,
+)
 from app.models.appointment import Appointment, AppointmentStatus
+from app.models.appointment_series import AppointmentSeries
 from app.models.service import Service
+from app.models.user import User, Role
 
 ACTIVE_STATUSES = {
     AppointmentStatus.REQUESTED,
@@ -15,27 +29,30 @@ ACTIVE_STATUSES = {
     AppointmentStatus.CONFIRMED,
 }
 
-def has_overlap(db: Session, employee_user_id: int, start_at, end_at) -> bool:
-    # solape: start < existing_end AND end > existing_start
-    stmt = select(Appointment.id).where(
-        and_(
-            Appointment.employee_user_id == employee_user_id,
-            Appointment.status.in_(list(ACTIVE_STATUSES)),
-            start_at < Appointment.end_at,
-            end_at > Appointment.start_at,
-        )
-    ).limit(1)
-    return db.execute(stmt).first() is not None
+EXCLUSION_VIOLATION = "23P01"  # sqlstate de Postgres (exclusion constraint)
 
-def create_appointment(
-    db: Session,
-    customer_user_id: int,
-    service_id: int,
-    employee_user_id: int,
-    start_at,
-    notes: str | None,
-    step_minutes: int = 15,
-):
+def db_enforces_no_overlap(db: Session) -> bool:
+    """En Postgres la constraint ex_appt_employee_no_overlap impide el doble booking."""
+    return db.get_bind().dialect.name == "postgresql"
+
+def is_overlap_violation(e: IntegrityError) -> bool:
+    return getattr(e.orig, "sqlstate", None) == EXCLUSION_VIOLATION
+
+def commit_booking(db: Session) -> None:
+    """
+    Commit de una cita nueva / reprogramada.
+    Si choca con otra cita activa del empleado (exclusion constraint), hace rollback
+    y lanza el mismo ValueError que la validación previa.
+    """
+    try:
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        if is_overlap_violation(e):
+            raise ValueError("Time slot not available") from e
+        raise
+
+def _normalize_start(start_at):
     tz = ZoneInfo(settings.TIMEZONE)
 
     # Si viene sin TZ, asígnale la del negocio
@@ -46,7 +63,18 @@ def create_appointment(
         start_at = start_at.astimezone(tz)
 
     # Quita segundos y microsegundos (evita 13:15:00.364)
-    start_at = start_at.replace(second=0, microsecond=0)
+    return start_at.replace(second=0, microsecond=0)
+
+def create_appointment(
+    db: Session,
+    customer_user_id: int,
+    service_id: int,
+    employee_user_id: int,
+    start_at,
+    notes: str | None,
+    step_minutes: int = 15,
+):
+    start_at = _normalize_start(start_at)
 
     service = db.get(Service, service_id)
     if not service or not service.is_active:
@@ -54,13 +82,14 @@ def create_appointment(
 
     end_at = start_at + timedelta(minutes=service.duration_minutes)
 
-    # VALIDACIÓN COMPLETA (horario + breaks + pasado + step + overlap)
+    # VALIDACIÓN (horario + breaks + pasado + step); el overlap lo garantiza la DB si puede
     assert_slot_is_valid(
         db=db,
         employee_user_id=employee_user_id,
         start_at=start_at,
         end_at=end_at,
         step_minutes=step_minutes,
+        check_overlap=not db_enforces_no_overlap(db),
     )
 
     appt = Appointment(
@@ -73,6 +102,216 @@ def create_appointment(
         notes=notes,
     )
     db.add(appt)
-    db.commit()
+    commit_booking(db)
     db.refresh(appt)
     return appt
+
+class _BusyIndex:
+    """Rangos ocupados por empleado, disjuntos y ordenados (overlap en O(log n))."""
+
+    def __init__(self, busy_by_employee: dict[int, list[Interval]]):
+        self._busy = {eid: merge_intervals(r) for eid, r in busy_by_employee.items()}
+
+    def overlaps(self, employee_user_id: int, start_at, end_at) -> bool:
+        busy = self._busy.get(employee_user_id, [])
+        # el último rango que empieza antes de end_at es el único candidato
+        i = bisect_left(busy, (end_at,))
+        return i > 0 and busy[i - 1][1] > start_at
+
+    def add(self, employee_user_id: int, start_at, end_at) -> None:
+        insort(self._busy.setdefault(employee_user_id, []), (start_at, end_at))
+
+def _validate_bulk(db: Session, items: list[dict], step_minutes: int) -> tuple[list[dict], list[dict]]:
+    """
+    Valida el lote en memoria: servicios, usuarios, horario y breaks se cargan una vez,
+    y las citas activas de las empleadas del rango con UNA query.
+    Devuelve (filas a insertar, reporte por fila).
+    """
+    hours_by_wd, breaks_by_wd = load_schedule_rules(db)
+
+    service_ids = {it["service_id"] for it in items}
+    services = {s.id: s for s in db.execute(select(Service).where(Service.id.in_(service_ids))).scalars()}
+
+    user_ids = {it["customer_user_id"] for it in items} | {it["employee_user_id"] for it in items}
+    users = {u.id: u for u in db.execute(select(User).where(User.id.in_(user_ids))).scalars()}
+
+    prepared = []
+    for it in items:
+        start_at = _normalize_start(it["start_at"])
+        service = services.get(it["service_id"])
+        end_at = start_at + timedelta(minutes=service.duration_minutes) if service else start_at
+        prepared.append((start_at, end_at))
+
+    busy: dict[int, list[Interval]] = {}
+    employee_ids = {it["employee_user_id"] for it in items}
+    if prepared:
+        stmt = select(Appointment.employee_user_id, Appointment.start_at, Appointment.end_at).where(
+            Appointment.employee_user_id.in_(employee_ids),
+            Appointment.status.in_(bindparam("active_statuses", sorted(ACTIVE_STATUSES), expanding=True, literal_execute=True)),
+            Appointment.start_at < max(e for _, e in prepared),
+            Appointment.end_at > min(s for s, _ in prepared),
+        )
+        for eid, s, e in db.execute(stmt).all():
+            busy.setdefault(eid, []).append((s, e))
+    busy_index = _BusyIndex(busy)
+
+    rows: list[dict] = []
+    report: list[dict] = []
+    for i, (it, (start_at, end_at)) in enumerate(zip(items, prepared)):
+        try:
+            service = services.get(it["service_id"])
+            if not service or not service.is_active:
+                raise ValueError("Service not found/active")
+            customer = users.get(it["customer_user_id"])
+            if not customer or not customer.is_active or customer.role != Role.CUSTOMER:
+                raise ValueError("Customer not found/inactive")
+            employee = users.get(it["employee_user_id"])
+            if not employee or not employee.is_active or employee.role != Role.EMPLOYEE:
+                raise ValueError("Employee not found/inactive")
+
+            wd = _weekday_enum(start_at.date())
+            check_slot_rules(start_at, end_at, step_minutes, hours_by_wd.get(wd), breaks_by_wd.get(wd, []))
+
+            # contra la DB y contra las filas anteriores del mismo lote
+            if busy_index.overlaps(employee.id, start_at, end_at):
+                raise ValueError("Time slot not available")
+            busy_index.add(employee.id, start_at, end_at)
+        except ValueError as e:
+            report.append({"index": i, "ok": False, "appointment_id": None, "error": str(e)})
+            continue
+
+        report.append({"index": i, "ok": True, "appointment_id": None, "error": None})
+        rows.append({
+            "customer_user_id": customer.id,
+            "employee_user_id": employee.id,
+            "service_id": service.id,
+            "start_at": start_at,
+            "end_at": end_at,
+            "status": AppointmentStatus.REQUESTED,
+            "notes": it.get("notes"),
+            "series_id": it.get("series_id"),
+            # el INSERT masivo no dispara los listeners: search_text se arma aquí
+            "search_text": appointment_search_text(
+                service.name, customer.first_name, customer.last_name, employee.first_name, employee.last_name
+            ),
+        })
+    return rows, report
+
+def create_appointments_bulk(
+    db: Session,
+    items: list[dict],
+    step_minutes: int = 15,
+    all_or_nothing: bool = False,
+    series: AppointmentSeries | None = None,
+) -> tuple[list[dict], list[Appointment]]:
+    """
+    Crea muchas citas de una vez (importación / paquetes).
+    - valida todo en memoria (ver _validate_bulk)
+    - inserta las filas válidas con un INSERT multi-fila y un solo commit
+    - `all_or_nothing`: si alguna fila falla no se inserta ninguna
+    Devuelve (reporte por fila en el orden recibido, citas creadas).
+
+    Si otra reserva entra entre la validación y el commit (exclusion constraint),
+    se revalida y se reintenta una vez; si vuelve a chocar -> ValueError.
+
+    `series`: serie nueva (sin guardar) que se inserta en la misma transacción
+    y queda como series_id de las citas creadas.
+    """
+    for attempt in range(2):
+        rows, report = _validate_bulk(db, items, step_minutes)
+        if not rows or (all_or_nothing and len(rows) != len(items)):
+            for r in report:
+                if r["ok"] and all_or_nothing:
+                    r["ok"], r["error"] = False, "Not created (all_or_nothing)"
+            return report, []
+
+        try:
+            if series is not None:
+                series.occurrences_booked = len(rows)
+                db.add(series)
+                db.flush()
+                for row in rows:
+                    row["series_id"] = series.id
+            ids = db.execute(
+                insert(Appointment).returning(Appointment.id, sort_by_parameter_order=True),
+                rows,
+            ).scalars().all()
+            # el INSERT masivo no dispara los listeners: el rollup del dashboard se suma aquí
+            rollup_appointment_rows(db.connection(), rows)
+            touch_dashboard_days(db, (r["start_at"] for r in rows))
+            db.commit()
+        except IntegrityError as e:
+            db.rollback()
+            if not is_overlap_violation(e):
+                raise
+            if attempt == 0:
+                continue
+            raise ValueError("Time slot not available") from e
+
+        ok_rows = [r for r in report if r["ok"]]
+        for r, appt_id in zip(ok_rows, ids):
+            r["appointment_id"] = appt_id
+        created = db.execute(select(Appointment).where(Appointment.id.in_(ids)).order_by(Appointment.id)).scalars().all()
+        return report, list(created)
+
+def create_appointment_series(
+    db: Session,
+    customer_user_id: int,
+    service_id: int,
+    employee_user_id: int,
+    rrule: str,
+    dtstart,
+    notes: str | None,
+    created_by_user_id: int,
+    step_minutes: int = 15,
+    skip_conflicts: bool = True,
+    dry_run: bool = False,
+) -> tuple[AppointmentSeries | None, list[dict], list[Appointment]]:
+    """
+    Cita recurrente: expande la regla y valida TODAS las ocurrencias de una vez
+    con el validador del bulk (una query de rango + intersección en memoria).
+    - `skip_conflicts`: reserva las que caben y reporta las demás;
+      si es False, o se reservan todas o ninguna
+    - `dry_run`: solo devuelve qué ocurrencias se pueden reservar
+    Devuelve (serie o None si no se creó, reporte por ocurrencia, citas creadas).
+    """
+    rule = parse_rrule(rrule)
+    dtstart = _normalize_start(dtstart)
+    occurrences = expand_rrule(rule, dtstart)
+    if not occurrences:
+        raise ValueError("rrule has no occurrences")
+
+    items = [
+        {
+            "customer_user_id": customer_user_id,
+            "employee_user_id": employee_user_id,
+            "service_id": service_id,
+            "start_at": start_at,
+            "notes": notes,
+        }
+        for start_at in occurrences
+    ]
+
+    if dry_run:
+        _, report = _validate_bulk(db, items, step_minutes)
+        created = []
+        series = None
+    else:
+        series = AppointmentSeries(
+            customer_user_id=customer_user_id,
+            employee_user_id=employee_user_id,
+            service_id=service_id,
+            rrule=rule.to_rrule(),
+            dtstart=dtstart,
+            occurrences_requested=len(occurrences),
+            occurrences_booked=0,
+            notes=notes,
+            created_by_user_id=created_by_user_id,
+        )
+        report, created = create_appointments_bulk(
+            db, items, step_minutes=step_minutes, all_or_nothing=not skip_conflicts, series=series
+        )
+
+    for r in report:
+        r["start_at"] = occurrences[r["index"]]
+    return (series if created else None), report, created
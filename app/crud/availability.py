@@ -1,26 +1,63 @@
-from datetime import datetime, timedelta, date, time
+import heapq
+from datetime import datetime, timedelta, date
+from typing import Iterator
 from zoneinfo import ZoneInfo
 from sqlalchemy.orm import Session
-from sqlalchemy import select, and_
+from sqlalchemy import select
 
 from app.core.config import settings
-from app.models.business_hours import BusinessHours, BreakBlock, Weekday
-from app.models.appointment import Appointment, AppointmentStatus
+from app.crud.availability_index import availability_index
+from app.crud.intervals import Interval, iter_aligned_slots
 from app.models.service import Service
+from app.models.user import User, Role
+
+def slots_from_gaps(
+    gaps: list[Interval],
+    day_open: datetime,
+    duration: timedelta,
+    step: timedelta,
+) -> list[str]:
+    """
+    Motor de disponibilidad: emite slots alineados a `step` (desde la apertura)
+    directamente desde los huecos libres (ventana - breaks - citas).
+    """
+    return [s.isoformat() for s in iter_aligned_slots(gaps, day_open, duration, step)]
+
+def _active_service(db: Session, service_id: int) -> Service:
+    service = db.get(Service, service_id)
+    if not service or not service.is_active:
+        raise ValueError("Service not found/active")
+    return service
 
-ACTIVE_STATUSES = {
-    AppointmentStatus.REQUESTED,
-    AppointmentStatus.VALIDATED,
-    AppointmentStatus.CONFIRMED,
-}
+def get_availability_for_employees(
+    db: Session,
+    employee_user_ids: list[int],
+    day: date,
+    service_id: int,
+    step_minutes: int = 15,
+) -> dict[int, list[str]]:
+    """
+    Disponibilidad de varios empleados para un día.
+    Los huecos libres salen del índice en memoria (availability_index); si falta
+    alguna clave (empleado, día) se carga con una sola query `employee_user_id IN (...)`.
+    """
+    service = _active_service(db, service_id)
+
+    result: dict[int, list[str]] = {eid: [] for eid in employee_user_ids}
+    if not employee_user_ids:
+        return result
+
+    day_free = availability_index.day_free_intervals(db, list(result.keys()), day)
+    if not day_free:
+        return result
+    day_open, gaps_by_employee = day_free
 
-def _weekday_enum(d: date) -> Weekday:
-    # python weekday: Mon=0..Sun=6 -> Weekday: Mon=1..Sun=7
-    return Weekday(d.weekday() + 1)
+    duration = timedelta(minutes=service.duration_minutes)
+    step = timedelta(minutes=step_minutes)
+    for eid in result:
+        result[eid] = slots_from_gaps(gaps_by_employee[eid], day_open, duration, step)
 
-def _parse_hhmm(s: str) -> time:
-    hh, mm = s.split(":")
-    return time(int(hh), int(mm))
+    return result
 
 def get_employee_availability(
     db: Session,
@@ -29,68 +66,103 @@ def get_employee_availability(
     service_id: int,
     step_minutes: int = 15,
 ):
-    tz = ZoneInfo(settings.TIMEZONE)
-    service = db.get(Service, service_id)
-    if not service or not service.is_active:
-        raise ValueError("Service not found/active")
+    return get_availability_for_employees(db, [employee_user_id], day, service_id, step_minutes)[employee_user_id]
 
-    wd = _weekday_enum(day)
-    hours = db.execute(select(BusinessHours).where(BusinessHours.weekday == wd)).scalar_one_or_none()
-    if not hours or hours.is_closed:
-        return []
+def iter_availability_range(
+    db: Session,
+    employee_user_ids: list[int],
+    from_day: date,
+    to_day: date,
+    service_id: int,
+    step_minutes: int = 15,
+) -> Iterator[tuple[date, dict[int, list[str]]]]:
+    """
+    Disponibilidad multi-día:
+    - obtiene los huecos libres de TODO el rango por adelantado (una sola carga de citas)
+    - devuelve un generador que calcula los slots día por día, sin tocar la DB
+      (se puede consumir después de cerrar la sesión, p.ej. en un StreamingResponse)
+    """
+    service = _active_service(db, service_id)
+
+    duration = timedelta(minutes=service.duration_minutes)
+    step = timedelta(minutes=step_minutes)
+    employee_user_ids = list(employee_user_ids)
+
+    free_by_day = availability_index.range_free_intervals(db, employee_user_ids, from_day, to_day)
 
-    open_t = _parse_hhmm(hours.open_time)
-    close_t = _parse_hhmm(hours.close_time)
+    def _days() -> Iterator[tuple[date, dict[int, list[str]]]]:
+        for day, day_free in free_by_day.items():
+            if not day_free:
+                yield day, {eid: [] for eid in employee_user_ids}
+                continue
+            day_open, gaps_by_employee = day_free
+            yield day, {
+                eid: slots_from_gaps(gaps_by_employee[eid], day_open, duration, step)
+                for eid in employee_user_ids
+            }
 
-    day_open = datetime.combine(day, open_t, tzinfo=tz)
-    day_close = datetime.combine(day, close_t, tzinfo=tz)
+    return _days()
+
+def find_next_available(
+    db: Session,
+    service_id: int,
+    after: datetime,
+    employee_user_ids: list[int] | None = None,
+    limit: int = 5,
+    step_minutes: int = 15,
+    horizon_days: int = 60,
+) -> list[tuple[int, datetime, datetime]]:
+    """
+    Próximos `limit` slots libres (de cualquier empleado) a partir de `after`.
+    - avanza día por día; cada día abierto sale del índice o, si falta, de una query
+      de citas de ese día para todos los empleados (`ix_appt_employee_time`)
+    - los slots de cada empleado se generan de forma perezosa y se mezclan por hora
+    - se detiene apenas encuentra `limit` slots
+    Devuelve tuplas (employee_user_id, start_at, end_at) en orden cronológico.
+    """
+    tz = ZoneInfo(settings.TIMEZONE)
+    service = _active_service(db, service_id)
+
+    if after.tzinfo is None:
+        after = after.replace(tzinfo=tz)
+    else:
+        after = after.astimezone(tz)
+
+    if employee_user_ids is None:
+        employee_user_ids = db.execute(
+            select(User.id)
+            .where(User.role == Role.EMPLOYEE)
+            .where(User.is_active == True)  # noqa: E712
+            .order_by(User.id)
+        ).scalars().all()
+    employee_user_ids = list(employee_user_ids)
+    if not employee_user_ids or limit <= 0:
+        return []
 
     duration = timedelta(minutes=service.duration_minutes)
     step = timedelta(minutes=step_minutes)
 
-    # breaks
-    breaks = db.execute(select(BreakBlock).where(BreakBlock.weekday == wd)).scalars().all()
-    break_ranges = []
-    for b in breaks:
-        bs = datetime.combine(day, _parse_hhmm(b.start_time), tzinfo=tz)
-        be = datetime.combine(day, _parse_hhmm(b.end_time), tzinfo=tz)
-        break_ranges.append((bs, be))
-
-    # existing appointments for the day (active statuses)
-    stmt = select(Appointment).where(
-        and_(
-            Appointment.employee_user_id == employee_user_id,
-            Appointment.status.in_(list(ACTIVE_STATUSES)),
-            Appointment.start_at < day_close,
-            Appointment.end_at > day_open,
-        )
-    )
-    appts = db.execute(stmt).scalars().all()
-    appt_ranges = [(a.start_at, a.end_at) for a in appts]
-
-    def overlaps(r1, r2):
-        (s1, e1), (s2, e2) = r1, r2
-        return s1 < e2 and e1 > s2
-
-    slots = []
-    cur = day_open
-    while cur + duration <= day_close:
-        candidate = (cur, cur + duration)
-
-        bad = False
-        for br in break_ranges:
-            if overlaps(candidate, br):
-                bad = True
-                break
-        if not bad:
-            for ar in appt_ranges:
-                if overlaps(candidate, ar):
-                    bad = True
-                    break
-
-        if not bad:
-            slots.append(cur.isoformat())
-
-        cur += step
-
-    return slots
+    found: list[tuple[int, datetime, datetime]] = []
+    day = after.date()
+    last_day = day + timedelta(days=horizon_days)
+    while day <= last_day:
+        day_free = availability_index.day_free_intervals(db, employee_user_ids, day)
+        if not day_free:
+            day += timedelta(days=1)
+            continue
+        day_open, gaps_by_employee = day_free
+
+        def _employee_slots(eid: int) -> Iterator[tuple[datetime, int]]:
+            # no ofrecer nada antes de `after` (manteniendo la alineación desde day_open)
+            gaps = [(max(s, after), e) for s, e in gaps_by_employee[eid] if e > after]
+            for slot in iter_aligned_slots(gaps, day_open, duration, step):
+                yield slot, eid
+
+        for slot, eid in heapq.merge(*(_employee_slots(eid) for eid in employee_user_ids)):
+            found.append((eid, slot, slot + duration))
+            if len(found) >= limit:
+                return found
+
+        day += timedelta(days=1)
+
+    return found
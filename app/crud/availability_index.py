@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+import threading
+import time as _time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, date, time, timedelta
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import select, and_
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.public_cache import availability_tag, public_cache
+from app.crud.intervals import Interval, merge_intervals, free_gaps
+from app.crud.scheduling_rules import ACTIVE_STATUSES, load_schedule_rules, _parse_hhmm, _weekday_enum
+from app.models.business_hours import Weekday
+from app.models.appointment import Appointment
+
+@dataclass
+class _Rules:
+    hours_by_wd: dict[Weekday, tuple[str, str] | None]  # None = cerrado
+    breaks_by_wd: dict[Weekday, list[tuple[str, str]]]
+    loaded_at: float
+
+@dataclass
+class _DayEntry:
+    day_open: datetime
+    day_close: datetime
+    break_ranges: list[Interval]
+    busy: dict[int, Interval] = field(default_factory=dict)  # appointment_id -> (start, end)
+    free: list[Interval] = field(default_factory=list)
+    loaded_at: float = 0.0
+    seq: int = 0  # tag_seq() del cache público antes de leer la DB
+
+    def recompute(self) -> None:
+        busy = merge_intervals(self.break_ranges + list(self.busy.values()))
+        self.free = free_gaps(self.day_open, self.day_close, busy)
+
+class FreeIntervalIndex:
+    """
+    Índice en memoria de huecos libres por (empleado, día local).
+    - se llena desde la DB la primera vez que se consulta una clave
+    - se parchea por cita (apply) al cambiar estado / reprogramar,
+      tocando solo las claves (empleado, día) afectadas
+    - cada entrada se valida contra la generación de su tag de disponibilidad en el
+      backend de public_cache: invalidate_availability() desde cualquier worker
+      (con CACHE_BACKEND=sqlite) la descarta y se recarga de la DB
+    - además caducan a los `max_age_seconds` (escrituras que no invalidan)
+    """
+
+    def __init__(self, max_age_seconds: int = 60, max_entries: int = 5000):
+        self.max_age_seconds = max_age_seconds
+        self.max_entries = max_entries
+        self._lock = threading.RLock()
+        self._days: OrderedDict[tuple[int, date], _DayEntry] = OrderedDict()
+        self._appt_keys: dict[int, tuple[int, date]] = {}
+        self._rules: _Rules | None = None
+
+    def _now(self) -> float:
+        return _time.monotonic()
+
+    def _tz(self) -> ZoneInfo:
+        return ZoneInfo(settings.TIMEZONE)
+
+    def _get_rules(self, db: Session) -> _Rules:
+        with self._lock:
+            rules = self._rules
+        if rules and self._now() - rules.loaded_at < self.max_age_seconds:
+            return rules
+
+        hours_by_wd, breaks_by_wd = load_schedule_rules(db)
+        rules = _Rules(hours_by_wd=hours_by_wd, breaks_by_wd=breaks_by_wd, loaded_at=self._now())
+        with self._lock:
+            self._rules = rules
+        return rules
+
+    def _window(self, rules: _Rules, day: date) -> tuple[datetime, datetime] | None:
+        hours = rules.hours_by_wd.get(_weekday_enum(day))
+        if not hours:
+            return None
+        tz = self._tz()
+        return (
+            datetime.combine(day, _parse_hhmm(hours[0]), tzinfo=tz),
+            datetime.combine(day, _parse_hhmm(hours[1]), tzinfo=tz),
+        )
+
+    def _break_ranges(self, rules: _Rules, day: date) -> list[Interval]:
+        tz = self._tz()
+        return [
+            (
+                datetime.combine(day, _parse_hhmm(start), tzinfo=tz),
+                datetime.combine(day, _parse_hhmm(end), tzinfo=tz),
+            )
+            for start, end in rules.breaks_by_wd.get(_weekday_enum(day), [])
+        ]
+
+    @staticmethod
+    def _tag_seqs(keys: list[tuple[int, date]]) -> dict[tuple[int, date], int]:
+        """Última invalidación de cada clave en el cache compartido (una sola lectura)."""
+        tags = {availability_tag(d, eid): (eid, d) for eid, d in keys}
+        return {tags[t]: seq for t, seq in public_cache.backend.tag_seqs(tags).items()}
+
+    def _fresh(self, key: tuple[int, date], invalidated_at: int) -> _DayEntry | None:
+        entry = self._days.get(key)
+        if entry is None:
+            return None
+        if invalidated_at > entry.seq or self._now() - entry.loaded_at >= self.max_age_seconds:
+            self._drop(key)
+            return None
+        self._days.move_to_end(key)  # LRU: lo usado va al final, se desaloja desde el principio
+        return entry
+
+    def _drop(self, key: tuple[int, date]) -> None:
+        entry = self._days.pop(key, None)
+        if entry:
+            for appt_id in entry.busy:
+                self._appt_keys.pop(appt_id, None)
+
+    def _collect(
+        self, db: Session, rules: _Rules, employee_user_ids: list[int], days: list[date]
+    ) -> dict[tuple[int, date], list[Interval]]:
+        """
+        Huecos libres de cada clave (empleado, día abierto) pedida.
+        Las que falten se cargan de la DB con UNA sola query y quedan en el índice.
+        """
+        keys = [(eid, d) for d in days if self._window(rules, d) for eid in employee_user_ids]
+        invalidated = self._tag_seqs(keys)
+        seq0 = public_cache.tag_seq()
+        found: dict[tuple[int, date], list[Interval]] = {}
+        missing: list[tuple[int, date]] = []
+        with self._lock:
+            for key in keys:
+                entry = self._fresh(key, invalidated.get(key, 0))
+                if entry is not None:
+                    found[key] = list(entry.free)
+                else:
+                    missing.append(key)
+        if not missing:
+            return found
+
+        tz = self._tz()
+        eids = sorted({eid for eid, _ in missing})
+        first_day = min(d for _, d in missing)
+        last_day = max(d for _, d in missing)
+        range_open = datetime.combine(first_day, time.min, tzinfo=tz)
+        range_close = datetime.combine(last_day + timedelta(days=1), time.min, tzinfo=tz)
+
+        stmt = select(Appointment.id, Appointment.employee_user_id, Appointment.start_at, Appointment.end_at).where(
+            and_(
+                Appointment.employee_user_id.in_(eids),
+                Appointment.status.in_(list(ACTIVE_STATUSES)),
+                Appointment.start_at < range_close,
+                Appointment.end_at > range_open,
+            )
+        )
+        busy: dict[tuple[int, date], dict[int, Interval]] = {}
+        for appt_id, eid, s, e in db.execute(stmt).all():
+            busy.setdefault((eid, s.astimezone(tz).date()), {})[appt_id] = (s, e)
+
+        # invalidadas mientras leíamos: se devuelven pero no se guardan (se recargan luego)
+        invalidated = self._tag_seqs(missing)
+        now = self._now()
+        with self._lock:
+            for key in missing:
+                day_open, day_close = self._window(rules, key[1])
+                entry = _DayEntry(
+                    day_open=day_open,
+                    day_close=day_close,
+                    break_ranges=self._break_ranges(rules, key[1]),
+                    busy=busy.get(key, {}),
+                    loaded_at=now,
+                    seq=seq0,
+                )
+                entry.recompute()
+                found[key] = list(entry.free)
+
+                if invalidated.get(key, 0) > seq0:
+                    continue
+                self._drop(key)
+                self._days[key] = entry
+                for appt_id in entry.busy:
+                    self._appt_keys[appt_id] = key
+
+            while len(self._days) > self.max_entries:
+                self._drop(next(iter(self._days)))  # el menos usado
+
+        return found
+
+    def day_free_intervals(
+        self, db: Session, employee_user_ids: list[int], day: date
+    ) -> tuple[datetime, dict[int, list[Interval]]] | None:
+        """
+        Huecos libres de cada empleado en `day`.
+        Devuelve (day_open, {employee_user_id: huecos}) o None si el negocio cierra ese día.
+        """
+        return self.range_free_intervals(db, employee_user_ids, day, day)[day]
+
+    def range_free_intervals(
+        self, db: Session, employee_user_ids: list[int], from_day: date, to_day: date
+    ) -> dict[date, tuple[datetime, dict[int, list[Interval]]] | None]:
+        """Igual que day_free_intervals, para cada día del rango (una sola carga)."""
+        employee_user_ids = list(employee_user_ids)
+        rules = self._get_rules(db)
+        days = [from_day + timedelta(days=i) for i in range((to_day - from_day).days + 1)]
+        found = self._collect(db, rules, employee_user_ids, days)
+
+        out: dict[date, tuple[datetime, dict[int, list[Interval]]] | None] = {}
+        for d in days:
+            window = self._window(rules, d)
+            out[d] = (window[0], {eid: found[(eid, d)] for eid in employee_user_ids}) if window else None
+        return out
+
+    def apply(self, appt: Appointment, *old_starts: datetime) -> None:
+        """
+        Parchea el índice con el estado actual de UNA cita (después del commit) e
+        invalida sus días en public_cache (los demás workers se enteran por la
+        generación del tag). Sirve para crear, validar, cancelar, no-show, done y
+        reprogramar (`old_starts`: inicio anterior).
+        Las entradas parcheadas quedan al día con la nueva generación, salvo que
+        alguien más haya invalidado esa clave desde que se cargaron.
+        """
+        tz = self._tz()
+        new_key = None
+        if appt.status in ACTIVE_STATUSES:
+            new_key = (appt.employee_user_id, appt.start_at.astimezone(tz).date())
+
+        with self._lock:
+            old_key = self._appt_keys.pop(appt.id, None)
+            keys = {(appt.employee_user_id, s.astimezone(tz).date()) for s in (appt.start_at, *old_starts)}
+            keys |= {old_key, new_key} - {None}
+            tags = {availability_tag(d, eid): (eid, d) for eid, d in keys}
+            seq, previous = public_cache.delete_tags(*tags)
+
+            if old_key is not None:
+                entry = self._days.get(old_key)
+                if entry is not None and entry.busy.pop(appt.id, None) is not None:
+                    entry.recompute()
+
+            if new_key is not None:
+                entry = self._days.get(new_key)
+                if entry is not None:
+                    entry.busy[appt.id] = (appt.start_at, appt.end_at)
+                    entry.recompute()
+                    self._appt_keys[appt.id] = new_key
+
+            for tag, key in tags.items():
+                entry = self._days.get(key)
+                if entry is not None and previous.get(tag, 0) <= entry.seq:
+                    entry.seq = seq
+
+    def clear(self) -> None:
+        with self._lock:
+            self._days.clear()
+            self._appt_keys.clear()
+            self._rules = None
+
+availability_index = FreeIntervalIndex()
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from typing import Iterable, Iterator
+
+# rango semiabierto [start, end)
+Interval = tuple[datetime, datetime]
+
+def merge_intervals(ranges: Iterable[Interval]) -> list[Interval]:
+    """
+    Ordena y fusiona rangos ocupados (breaks + citas).
+    Rangos que se solapan o se tocan quedan como uno solo.
+    """
+    merged: list[list[datetime]] = []
+    for start, end in sorted(r for r in ranges if r[1] >= r[0]):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(s, e) for s, e in merged]
+
+def free_gaps(window_start: datetime, window_end: datetime, busy: list[Interval]) -> list[Interval]:
+    """
+    Resta `busy` (ya fusionado y ordenado) de la ventana [window_start, window_end).
+    Un solo recorrido lineal.
+    """
+    gaps: list[Interval] = []
+    cur = window_start
+    for start, end in busy:
+        if end <= cur:
+            continue
+        if start >= window_end:
+            break
+        if start > cur:
+            gaps.append((cur, start))
+        cur = end
+        if cur >= window_end:
+            break
+    if cur < window_end:
+        gaps.append((cur, window_end))
+    return gaps
+
+def iter_aligned_slots(
+    gaps: Iterable[Interval],
+    anchor: datetime,
+    duration: timedelta,
+    step: timedelta,
+) -> Iterator[datetime]:
+    """
+    Genera inicios alineados a `anchor + k*step` donde cabe `duration`
+    completamente dentro de algún hueco libre.
+    """
+    for gap_start, gap_end in gaps:
+        # primer múltiplo de step (desde anchor) que sea >= gap_start
+        k = -((anchor - gap_start) // step)
+        cur = anchor + k * step
+        while cur + duration <= gap_end:
+            yield cur
+            cur += step
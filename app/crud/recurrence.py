@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+# Subconjunto de RRULE (RFC 5545) que usamos para citas recurrentes:
+#   FREQ=DAILY|WEEKLY  INTERVAL=n  BYDAY=MO,TU,...  COUNT=n  UNTIL=YYYYMMDD
+_BYDAY = {"MO": 0, "TU": 1, "WE": 2, "TH": 3, "FR": 4, "SA": 5, "SU": 6}
+
+MAX_OCCURRENCES = 52
+MAX_INTERVAL = {"DAILY": 365, "WEEKLY": 52}  # hasta un año entre ocurrencias
+
+@dataclass(frozen=True)
+class RecurrenceRule:
+    freq: str
+    interval: int = 1
+    byday: tuple[int, ...] = ()
+    count: int | None = None
+    until: date | None = None
+
+    def to_rrule(self) -> str:
+        parts = [f"FREQ={self.freq}"]
+        if self.interval != 1:
+            parts.append(f"INTERVAL={self.interval}")
+        if self.byday:
+            names = {v: k for k, v in _BYDAY.items()}
+            parts.append("BYDAY=" + ",".join(names[d] for d in self.byday))
+        if self.count is not None:
+            parts.append(f"COUNT={self.count}")
+        if self.until is not None:
+            parts.append(f"UNTIL={self.until:%Y%m%d}")
+        return ";".join(parts)
+
+def parse_rrule(text: str) -> RecurrenceRule:
+    """'FREQ=WEEKLY;BYDAY=TU;COUNT=12' -> RecurrenceRule. ValueError si no es válida."""
+    fields: dict[str, str] = {}
+    for part in text.strip().removeprefix("RRULE:").split(";"):
+        if not part:
+            continue
+        key, sep, value = part.partition("=")
+        if not sep or not value:
+            raise ValueError(f"Invalid rrule part: {part}")
+        fields[key.strip().upper()] = value.strip().upper()
+
+    freq = fields.pop("FREQ", None)
+    if freq not in ("DAILY", "WEEKLY"):
+        raise ValueError("rrule FREQ must be DAILY or WEEKLY")
+
+    try:
+        interval = int(fields.pop("INTERVAL", "1"))
+        count = int(fields.pop("COUNT")) if "COUNT" in fields else None
+        until = datetime.strptime(fields.pop("UNTIL")[:8], "%Y%m%d").date() if "UNTIL" in fields else None
+        byday = tuple(sorted({_BYDAY[d] for d in fields.pop("BYDAY").split(",")})) if "BYDAY" in fields else ()
+    except (KeyError, ValueError):
+        raise ValueError("Invalid rrule value")
+
+    if fields:
+        raise ValueError(f"Unsupported rrule fields: {', '.join(sorted(fields))}")
+    if interval < 1 or (count is not None and count < 1):
+        raise ValueError("rrule INTERVAL/COUNT must be >= 1")
+    if interval > MAX_INTERVAL[freq]:
+        raise ValueError(f"rrule INTERVAL must be <= {MAX_INTERVAL[freq]} for FREQ={freq}")
+    if count is not None and count > MAX_OCCURRENCES:
+        raise ValueError(f"rrule COUNT must be <= {MAX_OCCURRENCES}")
+    if count is None and until is None:
+        raise ValueError("rrule needs COUNT or UNTIL")
+    if byday and freq != "WEEKLY":
+        raise ValueError("rrule BYDAY only with FREQ=WEEKLY")
+
+    return RecurrenceRule(freq=freq, interval=interval, byday=byday, count=count, until=until)
+
+def expand_rrule(rule: RecurrenceRule, dtstart: datetime, limit: int = MAX_OCCURRENCES) -> list[datetime]:
+    """
+    Ocurrencias desde `dtstart` (incluida si cae en la regla), misma hora local.
+    Se corta en COUNT, UNTIL (inclusive) o `limit` (ValueError si la regla pide más).
+    El loop nunca pasa de limit + 1 ocurrencias.
+    """
+    wanted = min(rule.count, limit + 1) if rule.count is not None else limit + 1
+    out: list[datetime] = []
+
+    def emit(d: date) -> bool:
+        if rule.until is not None and d > rule.until:
+            return False
+        out.append(datetime.combine(d, dtstart.timetz()))
+        return len(out) < wanted
+
+    start_day = dtstart.date()
+    try:
+        if rule.freq == "DAILY":
+            d = start_day
+            while emit(d):
+                d += timedelta(days=rule.interval)
+        else:
+            weekdays = rule.byday or (start_day.weekday(),)
+            week = start_day - timedelta(days=start_day.weekday())  # lunes de la semana de dtstart
+            go = True
+            while go:
+                for wd in weekdays:
+                    d = week + timedelta(days=wd)
+                    if d < start_day:
+                        continue
+                    go = emit(d)
+                    if not go:
+                        break
+                week += timedelta(weeks=rule.interval)
+    except OverflowError:
+        raise ValueError("rrule goes past the supported date range")
+
+    if len(out) > limit:
+        raise ValueError(f"Too many occurrences (max {limit})")
+    return out
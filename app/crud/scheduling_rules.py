@@ -3,7 +3,7 @@ from __future__ import annotations
 from datetime import datetime, date, time, timedelta
 from zoneinfo import ZoneInfo
 from sqlalchemy.orm import Session
-from sqlalchemy import select
+from sqlalchemy import select, bindparam
 
 from app.core.config import settings
 from app.models.business_hours import BusinessHours, BreakBlock, Weekday
@@ -15,6 +15,22 @@ ACTIVE_STATUSES = {
     AppointmentStatus.CONFIRMED,
 }
 
+def overlap_stmt(employee_user_id: int, start_at: datetime, end_at: datetime, ignore_appointment_id: int | None = None):
+    """
+    Citas activas del empleado que se solapan con [start_at, end_at).
+    Los estados van como literales en la SQL: así el planner puede usar el índice parcial
+    ix_appt_employee_active_time también con planes genéricos (prepared statements).
+    """
+    stmt = select(Appointment).where(
+        Appointment.employee_user_id == employee_user_id,
+        Appointment.status.in_(bindparam("active_statuses", sorted(ACTIVE_STATUSES), expanding=True, literal_execute=True)),
+        Appointment.start_at < end_at,
+        Appointment.end_at > start_at,
+    )
+    if ignore_appointment_id is not None:
+        stmt = stmt.where(Appointment.id != ignore_appointment_id)
+    return stmt
+
 def _weekday_enum(d: date) -> Weekday:
     return Weekday(d.weekday() + 1)  # Mon=1..Sun=7
 
@@ -33,19 +49,29 @@ def _round_up_to_step(dt: datetime, step_minutes: int) -> datetime:
         return dt0
     return dt0 + timedelta(minutes=(step_minutes - remainder))
 
-def assert_slot_is_valid(
-    db: Session,
-    employee_user_id: int,
+def load_schedule_rules(db: Session) -> tuple[dict[Weekday, tuple[str, str] | None], dict[Weekday, list[tuple[str, str]]]]:
+    """
+    Horario y breaks de toda la semana en 2 queries (para validar muchos slots en memoria).
+    Devuelve ({weekday: (open, close) | None si cierra}, {weekday: [(start, end), ...]}).
+    """
+    hours_by_wd: dict[Weekday, tuple[str, str] | None] = {}
+    for h in db.execute(select(BusinessHours)).scalars().all():
+        hours_by_wd[h.weekday] = None if h.is_closed else (h.open_time, h.close_time)
+    breaks_by_wd: dict[Weekday, list[tuple[str, str]]] = {}
+    for b in db.execute(select(BreakBlock)).scalars().all():
+        breaks_by_wd.setdefault(b.weekday, []).append((b.start_time, b.end_time))
+    return hours_by_wd, breaks_by_wd
+
+def check_slot_rules(
     start_at: datetime,
     end_at: datetime,
-    step_minutes: int = 15,
+    step_minutes: int,
+    hours: tuple[str, str] | None,
+    breaks: list[tuple[str, str]],
 ) -> None:
     """
-    Lanza ValueError con mensaje claro si el slot es inválido.
-    - horario negocio + breaks
-    - no en el pasado (si es hoy)
-    - alineación a step
-    - no overlap con citas existentes
+    Validación sin DB (todo menos el overlap con otras citas).
+    `hours` = (open, close) del día o None si cierra; `breaks` = [(start, end)] del día.
     """
     tz = ZoneInfo(settings.TIMEZONE)
 
@@ -73,32 +99,58 @@ def assert_slot_is_valid(
         if start_at < min_start:
             raise ValueError("Cannot book in the past")
 
-    wd = _weekday_enum(day)
-    hours = db.execute(select(BusinessHours).where(BusinessHours.weekday == wd)).scalar_one_or_none()
-    if not hours or hours.is_closed:
+    if not hours:
         raise ValueError("Business is closed that day")
 
-    open_dt = datetime.combine(day, _parse_hhmm(hours.open_time), tzinfo=tz)
-    close_dt = datetime.combine(day, _parse_hhmm(hours.close_time), tzinfo=tz)
+    open_dt = datetime.combine(day, _parse_hhmm(hours[0]), tzinfo=tz)
+    close_dt = datetime.combine(day, _parse_hhmm(hours[1]), tzinfo=tz)
 
     if start_at < open_dt or end_at > close_dt:
         raise ValueError("Outside business hours")
 
     # breaks
-    breaks = db.execute(select(BreakBlock).where(BreakBlock.weekday == wd)).scalars().all()
-    for b in breaks:
-        bs = datetime.combine(day, _parse_hhmm(b.start_time), tzinfo=tz)
-        be = datetime.combine(day, _parse_hhmm(b.end_time), tzinfo=tz)
+    for b_start, b_end in breaks:
+        bs = datetime.combine(day, _parse_hhmm(b_start), tzinfo=tz)
+        be = datetime.combine(day, _parse_hhmm(b_end), tzinfo=tz)
         if _overlaps(start_at, end_at, bs, be):
             raise ValueError("Overlaps with a break block")
 
+def assert_slot_is_valid(
+    db: Session,
+    employee_user_id: int,
+    start_at: datetime,
+    end_at: datetime,
+    step_minutes: int = 15,
+    ignore_appointment_id: int | None = None,
+    check_overlap: bool = True,
+) -> None:
+    """
+    Lanza ValueError con mensaje claro si el slot es inválido.
+    - horario negocio + breaks
+    - no en el pasado (si es hoy)
+    - alineación a step
+    - no overlap con citas existentes (ignorando `ignore_appointment_id`, p.ej. al reprogramar)
+
+    `check_overlap=False` salta la query de overlap: en Postgres lo garantiza
+    la exclusion constraint al hacer commit (ver crud.appointments.commit_booking).
+    """
+    tz = ZoneInfo(settings.TIMEZONE)
+    local_start = start_at.replace(tzinfo=tz) if start_at.tzinfo is None else start_at
+    wd = _weekday_enum(local_start.date())
+
+    hours_row = db.execute(select(BusinessHours).where(BusinessHours.weekday == wd)).scalar_one_or_none()
+    hours = None if not hours_row or hours_row.is_closed else (hours_row.open_time, hours_row.close_time)
+    breaks = [
+        (b.start_time, b.end_time)
+        for b in db.execute(select(BreakBlock).where(BreakBlock.weekday == wd)).scalars().all()
+    ]
+    check_slot_rules(start_at, end_at, step_minutes, hours, breaks)
+
+    if not check_overlap:
+        return
+
     # overlap con citas existentes del empleado (activas)
-    stmt = select(Appointment).where(
-        Appointment.employee_user_id == employee_user_id,
-        Appointment.status.in_(list(ACTIVE_STATUSES)),
-        Appointment.start_at < end_at,
-        Appointment.end_at > start_at,
-    )
+    stmt = overlap_stmt(employee_user_id, start_at, end_at, ignore_appointment_id)
     exists = db.execute(stmt).first()
     if exists:
         raise ValueError("Time slot not available")
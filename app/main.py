@@ -9,6 +9,9 @@ from starlette.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.v1.router import router as v1_router
 from app.core.audit import register_audit_listeners
+from app.core.search import register_search_listeners
+from app.core.rollup import register_rollup_listeners
+from app.core.dashboard_cache import register_dashboard_cache_listeners
 from app.core.config import settings
 from app.middleware.audit_actor import AuditActorMiddleware
 
@@ -17,6 +20,9 @@ def create_app():
     app = FastAPI(title="Spa API")
 
     register_audit_listeners()
+    register_search_listeners()
+    register_rollup_listeners()
+    register_dashboard_cache_listeners()
 
     app.add_middleware(
         CORSMiddleware,
@@ -2,6 +2,7 @@ from app.models.user import User, Role
 from app.models.service import Service
 from app.models.product import Product
 from app.models.appointment import Appointment, AppointmentStatus
+from app.models.appointment_series import AppointmentSeries
 from app.models.cash import CashEntry, PaymentMethod
 from app.models.password_reset import PasswordResetToken
 from app.models.business_hours import BusinessHours, BreakBlock, Weekday
@@ -9,5 +10,6 @@ from app.models.slide import Slide
 from app.models.gallery_image import GalleryImage
 from app.models.testimonial import Testimonial
 from app.models.audit_log import AuditLog
+from app.models.daily_metric import DailyMetric
 from app.models.site_settings import SiteSettings
 from app.models.site_social_link import SiteSocialLink
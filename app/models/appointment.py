@@ -1,6 +1,7 @@
 import enum
 from datetime import datetime, timezone
-from sqlalchemy import DateTime, Enum, ForeignKey, String, Index, Text, func
+from sqlalchemy import DateTime, Enum, ForeignKey, String, Index, Text, func, text
+from sqlalchemy.dialects.postgresql import ExcludeConstraint
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.core.db import Base
 from app.models import User, Service
@@ -16,27 +17,58 @@ class AppointmentStatus(str, enum.Enum):
 
 class Appointment(Base):
     __tablename__ = "appointments"
+    # active_history en status/fecha/servicio/empleada: el rollup (app.core.rollup) necesita el valor anterior
 
     id: Mapped[int] = mapped_column(primary_key=True)
 
     customer_user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
-    employee_user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
-    service_id: Mapped[int] = mapped_column(ForeignKey("services.id"), index=True)
+    employee_user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True, active_history=True)
+    service_id: Mapped[int] = mapped_column(ForeignKey("services.id"), index=True, active_history=True)
+    series_id: Mapped[int | None] = mapped_column(ForeignKey("appointment_series.id"), nullable=True, index=True)
 
-    start_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True)
+    start_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True, active_history=True)
     end_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True)
 
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(),
                                                  onupdate=func.now(), nullable=False)
 
-    status: Mapped[AppointmentStatus] = mapped_column(Enum(AppointmentStatus), default=AppointmentStatus.REQUESTED, index=True)
+    status: Mapped[AppointmentStatus] = mapped_column(
+        Enum(AppointmentStatus), default=AppointmentStatus.REQUESTED, index=True, active_history=True
+    )
     notes: Mapped[str | None] = mapped_column(Text, nullable=True)
 
     cancel_reason: Mapped[str | None] = mapped_column(Text, nullable=True)
 
+    # servicio + cliente + empleada, sin acentos y en minúsculas (ver app/core/search.py)
+    search_text: Mapped[str] = mapped_column(Text, nullable=False, default="", server_default="")
+
     __table_args__ = (
         Index("ix_appt_employee_time", "employee_user_id", "start_at", "end_at"),
+        # overlap / disponibilidad: solo citas activas (parcial, mucho más chico)
+        Index(
+            "ix_appt_employee_active_time",
+            "employee_user_id", "start_at", "end_at",
+            postgresql_where=text("status IN ('REQUESTED', 'VALIDATED', 'CONFIRMED')"),
+        ),
+        # "mis citas" del cliente
+        Index("ix_appt_customer_start", "customer_user_id", "start_at"),
+        # dashboards / stats por estado en un rango
+        Index("ix_appt_status_start", "status", "start_at"),
+        # sin doble booking: una empleada no puede tener dos citas activas que se solapen
+        ExcludeConstraint(
+            ("employee_user_id", "="),
+            (text("tstzrange(start_at, end_at, '[)')"), "&&"),
+            name="ex_appt_employee_no_overlap",
+            using="gist",
+            where=text("status IN ('REQUESTED', 'VALIDATED', 'CONFIRMED')"),
+        ).ddl_if(dialect="postgresql"),
+        Index(
+            "ix_appointments_search_text_trgm",
+            "search_text",
+            postgresql_using="gin",
+            postgresql_ops={"search_text": "gin_trgm_ops"},
+        ),
     )
 
     customer: Mapped[User] = relationship("User", foreign_keys=[customer_user_id])
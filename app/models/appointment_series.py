@@ -0,0 +1,28 @@
+from datetime import datetime
+from sqlalchemy import DateTime, ForeignKey, Integer, String, Text, func
+from sqlalchemy.orm import Mapped, mapped_column
+from app.core.db import Base
+
+class AppointmentSeries(Base):
+    """
+    Cita recurrente ("todos los martes a las 10 por 12 semanas").
+    Cada ocurrencia reservada es un Appointment normal con series_id.
+    """
+    __tablename__ = "appointment_series"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+
+    customer_user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
+    employee_user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
+    service_id: Mapped[int] = mapped_column(ForeignKey("services.id"))
+
+    # RRULE (subconjunto): FREQ=WEEKLY;INTERVAL=1;BYDAY=TU;COUNT=12
+    rrule: Mapped[str] = mapped_column(String(200))
+    dtstart: Mapped[datetime] = mapped_column(DateTime(timezone=True))  # primera ocurrencia (hora local = hora de todas)
+
+    occurrences_requested: Mapped[int] = mapped_column(Integer)
+    occurrences_booked: Mapped[int] = mapped_column(Integer)
+
+    notes: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_by_user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
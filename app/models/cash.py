@@ -10,14 +10,15 @@ class PaymentMethod(str, enum.Enum):
     TRANSFER = "TRANSFER"
 
 class CashEntry(Base):
+    # active_history: el rollup (app.core.rollup) necesita el valor anterior al actualizar
     __tablename__ = "cash_entries"
 
     id: Mapped[int] = mapped_column(primary_key=True)
-    created_at = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    created_at = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False, active_history=True)
     created_by_user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
 
-    method: Mapped[PaymentMethod] = mapped_column(Enum(PaymentMethod), default=PaymentMethod.CASH)
+    method: Mapped[PaymentMethod] = mapped_column(Enum(PaymentMethod), default=PaymentMethod.CASH, active_history=True)
 
-    amount: Mapped[float] = mapped_column(Numeric(12, 2))
+    amount: Mapped[float] = mapped_column(Numeric(12, 2), active_history=True)
     concept: Mapped[str] = mapped_column(Text, nullable=True)
-    appointment_id: Mapped[int | None] = mapped_column(ForeignKey("appointments.id"), nullable=True)
\ No newline at end of file
+    appointment_id: Mapped[int | None] = mapped_column(ForeignKey("appointments.id"), nullable=True, active_history=True)
\ No newline at end of file
@@ -0,0 +1,31 @@
+from datetime import date
+from decimal import Decimal
+from sqlalchemy import Date, Integer, Numeric, String
+from sqlalchemy.orm import Mapped, mapped_column
+from app.core.db import Base
+
+# valores "no aplica" de las dimensiones (la PK no admite NULL)
+NO_METHOD = ""
+NO_STATUS = ""
+NO_ID = 0
+
+class DailyMetric(Base):
+    """
+    Rollup diario para el dashboard (día LOCAL).
+    - filas de caja:  method != '' , status = ''  -> revenue, tickets
+    - filas de citas: method = ''  , status != '' -> appointments
+    service_id / employee_user_id = 0 cuando no hay cita asociada.
+    Se mantiene por listeners (app.core.rollup); se reconstruye con
+    `python -m app.tools.rebuild_daily_metrics`.
+    """
+    __tablename__ = "daily_metrics"
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    method: Mapped[str] = mapped_column(String(20), primary_key=True, default=NO_METHOD)
+    status: Mapped[str] = mapped_column(String(20), primary_key=True, default=NO_STATUS)
+    service_id: Mapped[int] = mapped_column(Integer, primary_key=True, default=NO_ID)
+    employee_user_id: Mapped[int] = mapped_column(Integer, primary_key=True, default=NO_ID)
+
+    revenue: Mapped[Decimal] = mapped_column(Numeric(14, 2), default=0)
+    tickets: Mapped[int] = mapped_column(Integer, default=0)
+    appointments: Mapped[int] = mapped_column(Integer, default=0)
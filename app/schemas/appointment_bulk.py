@@ -0,0 +1,26 @@
+from datetime import datetime
+
+from pydantic import BaseModel, Field
+
+class AppointmentBulkItem(BaseModel):
+    customer_user_id: int
+    service_id: int
+    employee_user_id: int
+    start_at: datetime  # ISO8601
+    notes: str | None = None
+
+class AppointmentBulkCreate(BaseModel):
+    items: list[AppointmentBulkItem] = Field(min_length=1, max_length=500)
+    step_minutes: int = Field(default=15, ge=5, le=120)
+    all_or_nothing: bool = False  # si una fila falla, no se crea ninguna
+
+class AppointmentBulkRowOut(BaseModel):
+    index: int  # posición en `items`
+    ok: bool
+    appointment_id: int | None = None
+    error: str | None = None
+
+class AppointmentBulkOut(BaseModel):
+    created: int
+    failed: int
+    results: list[AppointmentBulkRowOut]
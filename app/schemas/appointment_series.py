@@ -0,0 +1,27 @@
+from datetime import datetime
+
+from pydantic import BaseModel, Field
+
+class AppointmentSeriesCreate(BaseModel):
+    service_id: int
+    employee_user_id: int
+    start_at: datetime  # primera ocurrencia (ISO8601); la hora local se repite
+    rrule: str = Field(max_length=200)  # p.ej. "FREQ=WEEKLY;BYDAY=TU;COUNT=12"
+    notes: str | None = None
+    step_minutes: int = Field(default=15, ge=5, le=120)
+    customer_user_id: int | None = None  # solo staff; el cliente reserva para sí
+    skip_conflicts: bool = True  # False: todas o ninguna
+    dry_run: bool = False  # solo consultar qué ocurrencias caben
+
+class AppointmentSeriesOccurrenceOut(BaseModel):
+    start_at: datetime
+    ok: bool
+    appointment_id: int | None = None
+    error: str | None = None
+
+class AppointmentSeriesOut(BaseModel):
+    series_id: int | None = None  # None en dry_run o si no se creó nada
+    rrule: str
+    requested: int
+    created: int
+    occurrences: list[AppointmentSeriesOccurrenceOut]
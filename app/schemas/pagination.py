@@ -5,6 +5,9 @@ T = TypeVar("T")
 
 class Page(BaseModel, Generic[T]):
     items: list[T]
-    page: int = Field(ge=1)
+    page: int | None = Field(default=None, ge=1)  # None en modo cursor
     size: int = Field(ge=1, le=100)
-    total: int = Field(ge=0)
+    total: int | None = Field(default=None, ge=0)  # None en modo cursor o con total=none
+    total_is_estimate: bool = False  # total=estimate: aproximado del planner
+    has_next: bool | None = None
+    next_cursor: str | None = None
@@ -0,0 +1,14 @@
+from pydantic import BaseModel
+
+class NextSlotOut(BaseModel):
+    employee_user_id: int
+    first_name: str
+    last_name: str
+    start_at: str  # ISO datetime
+    end_at: str    # ISO datetime
+
+class NextAvailabilityOut(BaseModel):
+    service_id: int
+    step_minutes: int
+    after: str
+    slots: list[NextSlotOut]
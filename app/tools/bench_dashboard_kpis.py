@@ -0,0 +1,190 @@
+"""
+Benchmark de los KPIs del dashboard: queries sueltas (antes) vs un solo statement (ahora).
+
+Uso (contra un Postgres local con las migraciones aplicadas):
+    python -m app.tools.bench_dashboard_kpis --days 365 --employees 10 --iterations 50
+
+Siembra datos sintéticos dentro de una transacción (clientes, empleadas, servicios,
+citas sin solaparse y pagos de las citas DONE), reconstruye el rollup, mide cada
+variante y al final hace ROLLBACK: la DB queda como estaba.
+
+Variantes:
+- summary  legacy: 4 queries crudas (revenue, tickets, estados, clientes nuevos)
+- summary  ahora : summary_stmt (CTE + FILTER, rollup + hoy crudo), 1 round-trip
+- cash_stats legacy: 3 queries (total, count, por método)
+- cash_stats ahora : cash_stats_stmt (FILTER), 1 round-trip
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import sys
+import time as _time
+from datetime import date, datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+
+from app.api.v1.cash import cash_stats_stmt
+from app.api.v1.dashboard import summary_stmt, _local_date_range_to_utc
+from app.core.config import settings
+from app.core.db import SessionLocal
+from app.core.rollup import rebuild_daily_metrics
+from app.models import *  # noqa: F401,F403  (registra todos los mappers)
+from app.models.appointment import Appointment, AppointmentStatus
+from app.models.cash import CashEntry, PaymentMethod
+from app.models.service import Service
+from app.models.user import User, Role
+
+SLOTS_PER_DAY = 8  # 9:00 .. 16:00, una hora cada una
+
+def seed(db: Session, days: int, employees: int, customers: int, rnd: random.Random) -> dict:
+    tz = ZoneInfo(settings.TIMEZONE)
+    tag = f"bench{rnd.randrange(10**8)}"
+
+    service_ids = db.execute(
+        insert(Service).returning(Service.id),
+        [
+            {"name": f"{tag} servicio {i}", "duration_minutes": 60, "price": 500 + 100 * i, "is_active": True}
+            for i in range(8)
+        ],
+    ).scalars().all()
+
+    def users(role: Role, n: int) -> list[int]:
+        return db.execute(
+            insert(User).returning(User.id),
+            [
+                {
+                    "email": f"{tag}.{role.value.lower()}{i}@example.com",
+                    "first_name": f"{role.value.title()} {i}",
+                    "last_name": tag,
+                    "hashed_password": "x",
+                    "role": role,
+                    "is_active": True,
+                }
+                for i in range(n)
+            ],
+        ).scalars().all()
+
+    employee_ids = users(Role.EMPLOYEE, employees)
+    customer_ids = users(Role.CUSTOMER, customers)
+
+    statuses = [AppointmentStatus.DONE] * 6 + [AppointmentStatus.CANCELED, AppointmentStatus.NO_SHOW]
+    today = datetime.now(tz).date()
+    appts = []
+    for d in range(days):
+        day = today - timedelta(days=d)
+        for eid in employee_ids:
+            for slot in range(SLOTS_PER_DAY):
+                start = datetime.combine(day, time(9 + slot), tzinfo=tz)
+                appts.append({
+                    "customer_user_id": rnd.choice(customer_ids),
+                    "employee_user_id": eid,
+                    "service_id": rnd.choice(service_ids),
+                    "start_at": start,
+                    "end_at": start + timedelta(hours=1),
+                    "status": rnd.choice(statuses),
+                    "search_text": "",
+                })
+
+    n_cash = 0
+    for i in range(0, len(appts), 5000):
+        chunk = appts[i:i + 5000]
+        ids = db.execute(
+            insert(Appointment).returning(Appointment.id, sort_by_parameter_order=True), chunk
+        ).scalars().all()
+        cash = [
+            {
+                "created_at": a["end_at"],
+                "created_by_user_id": employee_ids[0],
+                "method": rnd.choice(list(PaymentMethod)),
+                "amount": rnd.choice((500, 600, 800, 1200)),
+                "appointment_id": appt_id,
+            }
+            for a, appt_id in zip(chunk, ids)
+            if a["status"] == AppointmentStatus.DONE
+        ]
+        if cash:
+            db.execute(insert(CashEntry), cash)
+            n_cash += len(cash)
+
+    rebuild_daily_metrics(db, today - timedelta(days=days), today, commit=False)
+    return {"appointments": len(appts), "cash_entries": n_cash, "today": today}
+
+def legacy_summary(db: Session, from_day: date, to_day: date) -> None:
+    start_utc, end_utc = _local_date_range_to_utc(from_day, to_day)
+    in_cash = (CashEntry.created_at >= start_utc, CashEntry.created_at < end_utc)
+    db.execute(select(func.coalesce(func.sum(CashEntry.amount), 0.0)).where(*in_cash)).scalar_one()
+    db.execute(select(func.count(CashEntry.id)).where(*in_cash)).scalar_one()
+    db.execute(
+        select(Appointment.status, func.count(Appointment.id))
+        .where(Appointment.start_at >= start_utc, Appointment.start_at < end_utc)
+        .group_by(Appointment.status)
+    ).all()
+    db.execute(
+        select(func.count(User.id))
+        .where(User.role == "CUSTOMER", User.created_at >= start_utc, User.created_at < end_utc)
+    ).scalar_one()
+
+def legacy_cash_stats(db: Session, start_dt: datetime, end_dt: datetime) -> None:
+    # la versión anterior hacía total / count / por método por separado
+    in_range = (CashEntry.created_at >= start_dt, CashEntry.created_at <= end_dt)
+    db.execute(select(func.coalesce(func.sum(CashEntry.amount), 0)).where(*in_range)).scalar_one()
+    db.execute(select(func.count(CashEntry.id)).where(*in_range)).scalar_one()
+    db.execute(
+        select(CashEntry.method, func.coalesce(func.sum(CashEntry.amount), 0)).where(*in_range).group_by(CashEntry.method)
+    ).all()
+
+def timed(fn, iterations: int) -> list[float]:
+    fn()  # warm-up (plan cache, buffers)
+    out = []
+    for _ in range(iterations):
+        t0 = _time.perf_counter()
+        fn()
+        out.append((_time.perf_counter() - t0) * 1000)
+    return out
+
+def report(name: str, ms: list[float]) -> None:
+    ms = sorted(ms)
+    p95 = ms[min(len(ms) - 1, int(len(ms) * 0.95))]
+    print(f"{name:<24} median {statistics.median(ms):8.2f} ms   p95 {p95:8.2f} ms")
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--employees", type=int, default=10)
+    parser.add_argument("--customers", type=int, default=2000)
+    parser.add_argument("--range-days", type=int, default=90, help="rango consultado (termina hoy)")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        t0 = _time.perf_counter()
+        info = seed(db, args.days, args.employees, args.customers, random.Random(args.seed))
+        print(
+            f"seed: {info['appointments']} citas, {info['cash_entries']} pagos "
+            f"({_time.perf_counter() - t0:.1f}s, sin commit)"
+        )
+
+        to_day = info["today"]
+        from_day = to_day - timedelta(days=args.range_days - 1)
+        tz = ZoneInfo(settings.TIMEZONE)
+        start_dt = datetime.combine(from_day, time(0, 0), tzinfo=tz)
+        end_dt = datetime.combine(to_day, time(23, 59, 59), tzinfo=tz)
+        print(f"rango: {from_day} .. {to_day}, {args.iterations} iteraciones\n")
+
+        report("summary legacy (4 q)", timed(lambda: legacy_summary(db, from_day, to_day), args.iterations))
+        report("summary (1 q)", timed(lambda: db.execute(summary_stmt(from_day, to_day)).one(), args.iterations))
+        report("cash_stats legacy (3 q)", timed(lambda: legacy_cash_stats(db, start_dt, end_dt), args.iterations))
+        report("cash_stats (1 q)", timed(lambda: db.execute(cash_stats_stmt(start_dt, end_dt)).one(), args.iterations))
+    finally:
+        db.rollback()
+        db.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""
+Verifica con EXPLAIN que las queries calientes de citas usan su índice.
+
+Uso (contra una DB con las migraciones aplicadas):
+    python -m app.tools.explain_hot_queries
+
+Corre cada query con `enable_seqscan = off` (con tablas chicas el planner
+prefiere seq scan aunque el índice sirva) y revisa que el plan nombre el índice
+esperado. Sale con código 1 si alguna no lo usa.
+"""
+from __future__ import annotations
+
+import json
+import sys
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import Session
+
+from app.core.db import SessionLocal
+from app.core.pagination import ExplainJSON
+from app.crud.scheduling_rules import overlap_stmt
+from app.models import *  # noqa: F401,F403  (registra todos los mappers)
+from app.models.appointment import Appointment, AppointmentStatus
+
+def _index_names(plan: dict) -> set[str]:
+    names = set()
+    if "Index Name" in plan:
+        names.add(plan["Index Name"])
+    for child in plan.get("Plans", []):
+        names |= _index_names(child)
+    return names
+
+def _plan(db: Session, stmt) -> dict:
+    raw = db.execute(ExplainJSON(stmt)).scalar_one()
+    if isinstance(raw, str):
+        raw = json.loads(raw)
+    return raw[0]["Plan"]
+
+def hot_queries() -> list[tuple[str, object, str]]:
+    """(nombre, statement, índice esperado)"""
+    now = datetime.now(timezone.utc)
+    return [
+        (
+            "overlap_stmt (validación sin constraint)",
+            overlap_stmt(1, now, now + timedelta(hours=1)),
+            "ix_appt_employee_active_time",
+        ),
+        (
+            "my_appointments",
+            select(Appointment)
+            .where(Appointment.customer_user_id == 1, Appointment.start_at >= now - timedelta(days=30))
+            .order_by(Appointment.start_at.desc()),
+            "ix_appt_customer_start",
+        ),
+        (
+            "dashboard top-services (status + rango)",
+            select(Appointment.service_id, func.count(Appointment.id))
+            .where(
+                Appointment.status == AppointmentStatus.DONE,
+                Appointment.start_at >= now - timedelta(days=30),
+                Appointment.start_at < now,
+            )
+            .group_by(Appointment.service_id),
+            "ix_appt_status_start",
+        ),
+        (
+            "appointments/list q",
+            select(Appointment.id).where(Appointment.search_text.contains("ana", autoescape=True)),
+            "ix_appointments_search_text_trgm",
+        ),
+    ]
+
+def main() -> int:
+    db = SessionLocal()
+    failed = 0
+    try:
+        db.execute(text("SET LOCAL enable_seqscan = off"))
+        for name, stmt, expected in hot_queries():
+            used = _index_names(_plan(db, stmt))
+            ok = expected in used
+            failed += not ok
+            print(f"[{'OK' if ok else 'FAIL'}] {name}: esperado {expected}, plan usa {sorted(used) or 'ningún índice'}")
+    finally:
+        db.rollback()
+        db.close()
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
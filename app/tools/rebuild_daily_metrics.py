@@ -0,0 +1,44 @@
+"""
+Reconstruye el rollup `daily_metrics` del dashboard desde las tablas crudas.
+
+Uso:
+    python -m app.tools.rebuild_daily_metrics                 # todo
+    python -m app.tools.rebuild_daily_metrics --from 2026-01-01 --to 2026-01-31
+
+Sirve para el backfill inicial, después de correcciones manuales en la DB
+o si se sospecha que el rollup se desvió de los datos.
+
+Al terminar invalida el rango en el cache del dashboard. Eso llega a la API solo con
+CACHE_BACKEND=sqlite (archivo compartido); con CACHE_BACKEND=memory el cache vive en
+cada worker: reiniciar la API después de reconstruir.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+from datetime import date
+
+from app.core.db import SessionLocal
+from app.core.rollup import rebuild_daily_metrics
+from app.models import *  # noqa: F401,F403  (registra todos los mappers)
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--from", dest="from_day", type=date.fromisoformat, default=None)
+    parser.add_argument("--to", dest="to_day", type=date.fromisoformat, default=None)
+    args = parser.parse_args(argv)
+
+    if args.from_day and args.to_day and args.to_day < args.from_day:
+        parser.error("--to must be >= --from")
+
+    db = SessionLocal()
+    try:
+        written = rebuild_daily_metrics(db, args.from_day, args.to_day)
+    finally:
+        db.close()
+
+    print(f"daily_metrics: {written} rows rebuilt ({args.from_day or '-inf'} .. {args.to_day or '+inf'})")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
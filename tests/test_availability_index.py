@@ -0,0 +1,74 @@
+"""
+availability_index: una escritura local (apply) deja la entrada al día sin recargar
+de la DB; una invalidación de otro worker sí obliga a recargar.
+"""
+from datetime import date, datetime
+from types import SimpleNamespace
+from zoneinfo import ZoneInfo
+
+from app.core.config import settings
+from app.core.public_cache import availability_tag, public_cache
+from app.crud.availability_index import FreeIntervalIndex, _Rules
+from app.models.appointment import AppointmentStatus
+from app.models.business_hours import Weekday
+
+DAY = date(2030, 1, 8)
+EMPLOYEE_ID = 7
+TZ = ZoneInfo(settings.TIMEZONE)
+
+class _Result:
+    def all(self):
+        return []
+
+class CountingSession:
+    """Solo la query de citas llega aquí (las reglas van precargadas)."""
+
+    def __init__(self):
+        self.queries = 0
+
+    def execute(self, stmt):
+        self.queries += 1
+        return _Result()
+
+def _index() -> FreeIntervalIndex:
+    index = FreeIntervalIndex()
+    index._rules = _Rules(
+        hours_by_wd={wd: ("09:00", "18:00") for wd in Weekday},
+        breaks_by_wd={},
+        loaded_at=index._now(),
+    )
+    return index
+
+def _at(hour: int) -> datetime:
+    return datetime(DAY.year, DAY.month, DAY.day, hour, tzinfo=TZ)
+
+def _free(index: FreeIntervalIndex, db: CountingSession):
+    return index.day_free_intervals(db, [EMPLOYEE_ID], DAY)[1][EMPLOYEE_ID]
+
+def test_apply_keeps_patched_entry_without_reload():
+    index, db = _index(), CountingSession()
+    assert _free(index, db) == [(_at(9), _at(18))]
+    assert db.queries == 1
+
+    appt = SimpleNamespace(
+        id=1, employee_user_id=EMPLOYEE_ID, start_at=_at(10), end_at=_at(11), status=AppointmentStatus.CONFIRMED
+    )
+    tag = availability_tag(DAY, EMPLOYEE_ID)
+    before = public_cache.backend.tag_seqs([tag]).get(tag, 0)
+    index.apply(appt)  # parchea + invalida el tag del día (para los demás workers)
+    assert public_cache.backend.tag_seqs([tag])[tag] > before
+
+    assert _free(index, db) == [(_at(9), _at(10)), (_at(11), _at(18))]
+    assert db.queries == 1
+
+    appt.status = AppointmentStatus.CANCELED
+    index.apply(appt)
+    assert _free(index, db) == [(_at(9), _at(18))]
+    assert db.queries == 1
+
+def test_foreign_invalidation_forces_reload():
+    index, db = _index(), CountingSession()
+    _free(index, db)
+    public_cache.delete_tags(availability_tag(DAY, EMPLOYEE_ID))  # otro worker
+    _free(index, db)
+    assert db.queries == 2
@@ -0,0 +1,74 @@
+"""
+TTLCache.get_or_set (single-flight): si un tag se invalida mientras corre el vuelo,
+los que lo esperaban no reciben el valor de antes de la escritura.
+"""
+import threading
+
+import pytest
+
+from app.core.cache import TTLCache
+from app.core.cache_backends import MemoryBackend, SQLiteBackend
+
+TAG = "avail:2030-01-08:7"
+
+@pytest.fixture(params=["memory", "sqlite"])
+def cache(request, tmp_path):
+    if request.param == "memory":
+        return TTLCache(ttl_seconds=60, backend=MemoryBackend())
+    return TTLCache(ttl_seconds=60, backend=SQLiteBackend(str(tmp_path / "cache" / "cache.db"), namespace="t"))
+
+class _JoinedEvent(threading.Event):
+    """done del vuelo: avisa cuando alguien empieza a esperarlo."""
+
+    def __init__(self):
+        super().__init__()
+        self.joined = threading.Event()
+
+    def wait(self, timeout=None):
+        self.joined.set()
+        return super().wait(timeout)
+
+def _flight_with_waiter(cache: TTLCache, key: str, invalidate: bool):
+    state = {"value": "old"}
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def factory():
+        value = state["value"]  # lo que "lee de la DB"
+        calls.append(value)
+        if len(calls) == 1:
+            started.set()
+            release.wait(2)
+        return value
+
+    results = {}
+    leader = threading.Thread(target=lambda: results.setdefault("leader", cache.get_or_set(key, factory, tags=[TAG])))
+    leader.start()
+    started.wait(2)
+    done = cache._inflight[key].done = _JoinedEvent()
+    waiter = threading.Thread(target=lambda: results.setdefault("waiter", cache.get_or_set(key, factory, tags=[TAG])))
+    waiter.start()
+    assert done.joined.wait(2)
+
+    if invalidate:
+        state["value"] = "new"  # la escritura que dispara la invalidación
+        cache.delete_tags(TAG)
+    release.set()
+    leader.join(2)
+    waiter.join(2)
+    return results, calls
+
+def test_waiter_recomputes_after_invalidation_during_flight(cache):
+    results, calls = _flight_with_waiter(cache, "k", invalidate=True)
+
+    assert results["leader"] == "old"  # ya estaba calculando: se devuelve pero no se guarda
+    assert results["waiter"] == "new"
+    assert calls == ["old", "new"]
+    assert cache.get("k") == "new"
+
+def test_waiter_shares_flight_without_invalidation(cache):
+    results, calls = _flight_with_waiter(cache, "k", invalidate=False)
+
+    assert results == {"leader": "old", "waiter": "old"}
+    assert calls == ["old"]
+    assert cache.get("k") == "old"
@@ -0,0 +1,52 @@
+"""Exportes CSV / XLSX: textos del cliente que parecen fórmula no llegan como fórmula."""
+import csv
+import io
+import zipfile
+from xml.dom import minidom
+
+import pytest
+
+from app.core.export import csv_safe, csv_stream, xlsx_stream
+
+HEADER = ["Cliente", "Notas", "Monto"]
+ROWS = [
+    ['=HYPERLINK("http://x.example","clic")', "+1 809 555 0000", 1500],
+    ["-2+3", "@SUM(A1:A2)", -20],
+    ["\tTab", "\rCR", 0],
+    ["Ana Núñez", "normal", 12.5],
+]
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("=1+1", "'=1+1"),
+        ("+1", "'+1"),
+        ("-1", "'-1"),
+        ("@x", "'@x"),
+        ("\tx", "'\tx"),
+        ("\rx", "'\rx"),
+        ("Ana", "Ana"),
+        ("", ""),
+        (-20, -20),
+        (None, None),
+    ],
+)
+def test_csv_safe(value, expected):
+    assert csv_safe(value) == expected
+
+def test_csv_stream_neutralizes_formulas():
+    body = b"".join(csv_stream(HEADER, [ROWS])).decode("utf-8-sig")
+    rows = list(csv.reader(io.StringIO(body, newline="")))
+    assert rows[0] == HEADER
+    assert rows[1][:2] == ['\'=HYPERLINK("http://x.example","clic")', "'+1 809 555 0000"]
+    assert rows[2] == ["'-2+3", "'@SUM(A1:A2)", "-20"]  # el número negativo queda número
+    assert rows[3][:2] == ["'\tTab", "'\rCR"]
+    assert rows[4] == ["Ana Núñez", "normal", "12.5"]
+
+def test_xlsx_writes_text_as_inline_strings():
+    data = b"".join(xlsx_stream(HEADER, [ROWS]))
+    sheet = minidom.parseString(zipfile.ZipFile(io.BytesIO(data)).read("xl/worksheets/sheet1.xml"))
+    assert not sheet.getElementsByTagName("f")  # ninguna fórmula
+    first = sheet.getElementsByTagName("row")[1].getElementsByTagName("c")[0]
+    assert first.getAttribute("t") == "inlineStr"
+    assert first.getElementsByTagName("t")[0].firstChild.data.startswith("=HYPERLINK")